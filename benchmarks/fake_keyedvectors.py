@@ -0,0 +1,80 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: A small local fake of gensim KeyedVectors for benchmarks.
+
+import logging
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class FakeKeyedVectors:
+    """Random unit vectors with the subset of KeyedVectors API used by KeyGenerator"""
+
+    def __init__(
+        self,
+        words: Iterable[str],
+        vocab_size: int = 50000,
+        vector_size: int = 250,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            `words`      : Words that must be in vocabulary, e.g. seed keywords.
+            `vocab_size` : Total size of vocabulary. Other words are made up.
+            `vector_size`: Dimension of vectors (250 as the real model).
+            `seed`       : Random seed.
+        """
+
+        words = list(dict.fromkeys(words))
+        self.index_to_key = words + [
+            f"w{i}" for i in range(max(0, vocab_size - len(words)))
+        ]
+        self.key_to_index = {word: i for i, word in enumerate(self.index_to_key)}
+
+        rng = np.random.default_rng(seed)
+        self.vectors = rng.standard_normal(
+            (len(self.index_to_key), vector_size), dtype=np.float32
+        )
+        self.norms = None
+        self.fill_norms()
+        self._normed = self.vectors / self.norms[:, None]
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.key_to_index
+
+    def __len__(self) -> int:
+        return len(self.index_to_key)
+
+    def fill_norms(self, force: bool = False):
+        if self.norms is None or force:
+            self.norms = np.linalg.norm(self.vectors, axis=1)
+
+    def get_index(self, key: str) -> int:
+        return self.key_to_index[key]
+
+    def get_vector(self, key: str, norm: bool = False) -> np.ndarray:
+        return (self._normed if norm else self.vectors)[self.key_to_index[key]]
+
+    def get_normed_vectors(self) -> np.ndarray:
+        return self._normed
+
+    def most_similar(
+        self,
+        positive: List[str],
+        negative: Optional[List[str]] = None,
+        topn: int = 10,
+        restrict_vocab: Optional[int] = None,
+    ) -> List[Tuple[str, float]]:
+        ## Same as gensim: mean of unit vectors of positive words, excluding themselves.
+        indices = [self.key_to_index[word] for word in positive]
+        mean = self._normed[indices].mean(axis=0)
+        mean /= np.linalg.norm(mean)
+        end = restrict_vocab or len(self.vectors)
+        dists = self.vectors[:end] @ mean / self.norms[:end]
+        best = np.argsort(-dists)[: topn + len(indices)]
+        return [
+            (self.index_to_key[i], float(dists[i])) for i in best if i not in indices
+        ][:topn]
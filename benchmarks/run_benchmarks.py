@@ -0,0 +1,410 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Benchmarks of classification and keyword generation hot paths.
+#              e.g. python -m benchmarks.run_benchmarks --sizes 10000 100000 --output bench.json
+#                   python -m benchmarks.run_benchmarks --compare old.json new.json
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.batch import WorkerPool
+from src.FusedComparator import FusedComparator
+from src.SimpleComparator import SimpleComparator
+from src.utils.corpus import iter_articles
+from src.utils.keywords import keywords as ke
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+ROOTDIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DJROOT = os.path.join(ROOTDIR, "data", "dowjones")
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[i]
+
+
+def latency_metrics(latencies: array, elapsed: float) -> Dict[str, float]:
+    values = sorted(latencies)
+    return {
+        "n": len(values),
+        "elapsed_s": elapsed,
+        "throughput_per_s": len(values) / elapsed if elapsed else 0.0,
+        "latency_mean_ms": 1e3 * sum(values) / len(values) if values else 0.0,
+        "latency_p50_ms": 1e3 * percentile(values, 50),
+        "latency_p90_ms": 1e3 * percentile(values, 90),
+        "latency_p99_ms": 1e3 * percentile(values, 99),
+        "latency_max_ms": 1e3 * values[-1] if values else 0.0,
+    }
+
+
+""" Corpus """
+
+
+def dowjones_corpus() -> List[Tuple[str, str]]:
+    return [(a.Headline, a.BodyHtml) for a in iter_articles(DJROOT)]
+
+
+def synthetic_corpus(
+    size: int,
+    keywords: List[str],
+    samples: List[Tuple[str, str]],
+    keyword_rate: float = 0.02,
+    seed: int = 0,
+) -> Iterator[Tuple[str, str]]:
+    """
+    Generate news lazily, so that even 1M news never live in memory at once.
+    Sentences are sampled from the Dow Jones samples and keywords are inserted at random.
+    """
+
+    rng = random.Random(seed)
+    sentences = [
+        s + "。"
+        for _, body in samples
+        for s in body.replace("</p>", "").split("。")
+        if s
+    ]
+    titles = [title for title, _ in samples]
+    for _ in range(size):
+        title = rng.choice(titles)
+        body = list()
+        for _ in range(rng.randint(5, 40)):
+            sent = rng.choice(sentences)
+            if rng.random() < keyword_rate * 10:
+                pos = rng.randint(0, len(sent))
+                sent = sent[:pos] + rng.choice(keywords) + sent[pos:]
+            body.append(sent)
+        yield title, "".join(body)
+
+
+def synthetic_keywords(base: List[str], n: int, seed: int = 0) -> List[str]:
+    """
+    Keywords of size n. Extra keywords are made from bigrams of characters of base keywords.
+    """
+
+    if n <= len(base):
+        return base[:n]
+    rng = random.Random(seed)
+    chars = sorted(set("".join(base)))
+    ret = list(dict.fromkeys(base))
+    seen = set(ret)
+    while len(ret) < n:
+        word = "".join(rng.choice(chars) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            ret.append(word)
+    return ret
+
+
+""" Benchmarks """
+
+
+def bench_classify(
+    name: str,
+    make_reader: Callable[[], Any],
+    corpus: Iterator[Tuple[str, str]],
+) -> Dict[str, float]:
+    reader = make_reader()
+    latencies = array("d")
+    start = time.perf_counter()
+    for title, body in corpus:
+        t = time.perf_counter()
+        reader.classify(title, body)
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    metrics = latency_metrics(latencies, elapsed)
+    logger.info(
+        f"{name}: {metrics['throughput_per_s']:.1f} news/s, "
+        f"p50 {metrics['latency_p50_ms']:.3f} ms, p99 {metrics['latency_p99_ms']:.3f} ms"
+    )
+    return metrics
+
+
+def bench_construction(name: str, make_reader: Callable[[], Any], repeat: int = 5):
+    latencies = array("d")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        make_reader()
+        latencies.append(time.perf_counter() - t)
+    metrics = latency_metrics(latencies, sum(latencies))
+    logger.info(f"{name}: p50 {metrics['latency_p50_ms']:.3f} ms")
+    return metrics
+
+
+def bench_workers(
+    name: str,
+    processes: int,
+    shared_tables: bool,
+    corpus: List[Tuple[str, str]],
+) -> Dict[str, float]:
+    """
+    Throughput of a WorkerPool and resident memory of each worker after classification.
+    """
+
+    items = [(i, title, body) for i, (title, body) in enumerate(corpus)]
+    with WorkerPool(processes, shared_tables=shared_tables) as pool:
+        start = time.perf_counter()
+        for _ in pool.classify_iter(items, chunksize=16):
+            pass
+        elapsed = time.perf_counter() - start
+        memory = pool.memory()
+
+    metrics = {"workers": len(memory), "elapsed_s": elapsed}
+    metrics["throughput_per_s"] = len(items) / elapsed if elapsed else 0.0
+    for key in ("rss", "pss", "shared", "private"):
+        values = [m[key] for m in memory if m[key] is not None]
+        if values:
+            metrics[f"{key}_mb_per_worker"] = sum(values) / len(values) / 2**20
+    logger.info(
+        f"{name}: {metrics['throughput_per_s']:.1f} news/s, "
+        + ", ".join(
+            f"{key} {metrics[f'{key}_mb_per_worker']:.1f} MB"
+            for key in ("rss", "pss", "private")
+            if f"{key}_mb_per_worker" in metrics
+        )
+        + " per worker"
+    )
+    return metrics
+
+
+def bench_infer_a_file(seeds: List[str], vocab_size: int, topn: int = 10):
+    try:
+        from benchmarks.fake_keyedvectors import FakeKeyedVectors
+        from src.KeyGenerator.KeyGenerator import Word2VecKeyGenerator
+    except ImportError as e:
+        logger.warning(f"Skip infer_a_file benchmark: {e}")
+        return {"skipped": str(e)}
+
+    ## Build the generator around a local fake model instead of loading the real one.
+    w2v = Word2VecKeyGenerator.__new__(Word2VecKeyGenerator)
+    w2v.modelkey = "fake"
+    w2v.use_fast = True
+    w2v.wv = FakeKeyedVectors(seeds, vocab_size=vocab_size)
+    w2v.ann = None
+    w2v.init_results()
+
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=".txt", encoding="utf-8", delete=False
+    ) as f:
+        f.write("\n".join(seeds) + "\n")
+    try:
+        start = time.perf_counter()
+        results = w2v.infer_a_file(f.name, topn=topn, threshold=0.0)
+        elapsed = time.perf_counter() - start
+    finally:
+        os.remove(f.name)
+
+    logger.info(f"infer_a_file: {len(seeds)} words in {elapsed:.3f} s")
+    return {
+        "n": len(seeds),
+        "elapsed_s": elapsed,
+        "words_per_s": len(seeds) / elapsed,
+        "related": sum(len(r.related) for r in results.values()),
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+
+    results = list()
+
+    def record(name: str, params: Dict[str, Any], metrics: Dict[str, Any]):
+        results.append({"name": name, "params": params, "metrics": metrics})
+
+    samples = dowjones_corpus()
+    nn_keywords = list(ke.KeywordsFactory("Negative_News").keywords)
+
+    ## Construction
+    for use_artifact in (False, True):
+        for category in ("Negative_News", "ESG_News"):
+            record(
+                "construct.SimpleComparator",
+                {"category": category, "use_artifact": use_artifact},
+                bench_construction(
+                    f"construct {category} (use_artifact={use_artifact})",
+                    lambda: SimpleComparator(category, use_artifact=use_artifact),
+                ),
+            )
+        record(
+            "construct.FusedComparator",
+            {"use_artifact": use_artifact},
+            bench_construction(
+                f"construct Fused (use_artifact={use_artifact})",
+                lambda: FusedComparator(use_artifact=use_artifact),
+            ),
+        )
+
+    ## Classification on Dow Jones samples (repeated to get stable numbers)
+    readers = {
+        "SimpleComparator.Negative_News": lambda: SimpleComparator(
+            "Negative_News", debug=args.debug
+        ),
+        "SimpleComparator.ESG_News": lambda: SimpleComparator(
+            "ESG_News", debug=args.debug
+        ),
+        "FusedComparator": lambda: FusedComparator(debug=args.debug),
+    }
+    for name, make_reader in readers.items():
+        record(
+            f"classify.{name}",
+            {"corpus": "dowjones", "repeat": args.repeat, "debug": args.debug},
+            bench_classify(f"{name} on dowjones", make_reader, samples * args.repeat),
+        )
+
+    ## Worker pools with or without shared matcher tables
+    for processes in args.workers:
+        for shared_tables in (False, True):
+            record(
+                "WorkerPool",
+                {"processes": processes, "shared_tables": shared_tables},
+                bench_workers(
+                    f"WorkerPool processes={processes} shared_tables={shared_tables}",
+                    processes,
+                    shared_tables,
+                    samples * args.repeat,
+                ),
+            )
+
+    ## Classification on synthetic corpus with different sizes and keyword counts
+    for n_keywords in args.keyword_counts:
+        keywords = synthetic_keywords(nn_keywords, n_keywords)
+        for size in args.sizes:
+            corpus = synthetic_corpus(size, keywords, samples)
+            record(
+                "classify.SimpleComparator.synthetic",
+                {"size": size, "keywords": n_keywords, "debug": args.debug},
+                bench_classify(
+                    f"synthetic size={size} keywords={n_keywords}",
+                    lambda: SimpleComparator(
+                        "Negative_News",
+                        keywords=keywords,
+                        load_default=False,
+                        debug=args.debug,
+                    ),
+                    corpus,
+                ),
+            )
+
+    ## Keyword generation
+    seeds = list(ke.KeywordsFactory("Negative_News").keywords)[: args.seeds]
+    record(
+        "KeyGenerator.infer_a_file",
+        {"seeds": len(seeds), "vocab_size": args.vocab_size},
+        bench_infer_a_file(seeds, args.vocab_size),
+    )
+
+    return {"meta": meta(), "results": results}
+
+
+def meta() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOTDIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "createtime": datetime.now().strftime("%Y/%m/%d %H:%M:%S"),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(old_file: str, new_file: str):
+    """
+    Print ratio new / old of main metrics of benchmarks with the same name and params.
+    """
+
+    def key(result):
+        return result["name"], json.dumps(result["params"], sort_keys=True)
+
+    old = {
+        key(r): r["metrics"]
+        for r in json.load(open(old_file, encoding="utf-8"))["results"]
+    }
+    new = {
+        key(r): r["metrics"]
+        for r in json.load(open(new_file, encoding="utf-8"))["results"]
+    }
+    for k in new:
+        if k not in old:
+            continue
+        for metric in (
+            "throughput_per_s",
+            "latency_p50_ms",
+            "latency_p99_ms",
+            "elapsed_s",
+        ):
+            if metric in old[k] and metric in new[k] and old[k][metric]:
+                print(
+                    f"{k[0]} {k[1]} {metric}: {old[k][metric]:.4f} -> {new[k][metric]:.4f} "
+                    f"(x{new[k][metric] / old[k][metric]:.2f})"
+                )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmarks of news classifier.")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10000],
+        help="Sizes of synthetic corpus, e.g. 10000 100000 1000000.",
+    )
+    parser.add_argument(
+        "--keyword_counts", type=int, nargs="+", default=[100, 1000, 5000]
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=10, help="Repeat of Dow Jones samples."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="*",
+        default=[4],
+        help="Numbers of processes of WorkerPool to measure memory per worker.",
+    )
+    parser.add_argument("--debug", action="store_true")
+    parser.add_argument("--seeds", type=int, default=390)
+    parser.add_argument("--vocab_size", type=int, default=50000)
+    parser.add_argument("--output", "-o", default="bench_output.json")
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two outputs."
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    ret = run(args)
+    with open(args.output, "w", encoding="utf-8") as fo:
+        json.dump(ret, fo, ensure_ascii=False, indent=4)
+    logger.info(f"Save results into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
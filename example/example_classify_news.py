@@ -5,16 +5,14 @@
 import json
 import os
 
-from src.SimpleComparator import SimpleComparator
-from src.utils import struct as st
+from src.FusedComparator import FusedComparator
 
 DJROOT = r"data/dowjones"
 files = os.listdir(DJROOT)
 
-## SimpleComparator
+## FusedComparator (NN + ESG in a single pass)
 debug = False
-nn_reader = SimpleComparator(category="Negative_News", debug=debug)
-esg_reader = SimpleComparator(category="ESG_News", debug=debug)
+reader = FusedComparator(debug=debug)
 
 for fn in files:
     newsfn = "{}/{}".format(DJROOT, fn)
@@ -30,23 +28,6 @@ for fn in files:
         print(f"[  BODY ]: {news_body}")
         print("---")
 
-        """ NN """
-        nn_res = nn_reader.classify(news_title, news_body)
-
-        """ ESG """
-        esg_res = esg_reader.classify(news_title, news_body)
-
-        """ DEBUG DETAILS """
-        debug_details = {"NN": nn_res.debug, "ESG": esg_res.debug} if debug else None
-
-        """ Format """
-        sc_ret = st.SpecStruct(
-            NN=True if nn_res.news_category == st.NewsCategory.NN else False,
-            NN_SCORE=nn_res.score,
-            NN_KEYWORDS=nn_res.keywords,
-            ESG=True if esg_res.news_category == st.NewsCategory.ESG else False,
-            ESG_SCORE=esg_res.score,
-            ESG_KEYWORDS=esg_res.keywords,
-            DEBUG=debug_details,
-        )
+        """ NN + ESG """
+        sc_ret = reader.classify(news_title, news_body)
         print(sc_ret)
@@ -0,0 +1,521 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: FusedComparator identifies negative and esg news in a single pass.
+
+import hashlib
+import logging
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from src.base import EVALUATE_FORMAT, BaseComparator, KeywordsSnapshot
+from src.utils import segmentation as sg
+from src.utils import struct as st
+from src.utils.cache import ResultCache
+from src.utils.keywords import artifact as ar
+from src.utils.keywords import keywords as ke
+from src.utils.matcher import AhoCorasickMatcher
+from src.utils.metrics import ComparatorMetrics, MetricsRegistry
+from src.utils.neardup import NearDuplicateIndex
+from src.utils.normalization import TextNormalizer
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class FusedComparator(BaseComparator):
+    """A Fused Comparator for Business-related News"""
+
+    CATEGORIES = (st.NewsCategory.NN, st.NewsCategory.ESG)
+
+    def __init__(
+        self,
+        keywords: Optional[Dict[str, Union[str, List[str]]]] = None,
+        load_default: Optional[bool] = True,
+        debug: Optional[bool] = False,
+        use_artifact: Optional[bool] = True,
+        metrics: Optional[MetricsRegistry] = None,
+        cache: Optional[ResultCache] = None,
+        neardup: Optional[NearDuplicateIndex] = None,
+        watch_interval: Optional[float] = None,
+        normalizer: Optional[TextNormalizer] = None,
+        keep_counts: Optional[bool] = False,
+        shared_tables: Optional[bool] = False,
+    ):
+        """
+        Init FusedComparator.
+        FusedComparator holds keywords of both "Negative_News" and "ESG_News".
+        News is split into sentences once and scanned once by a combined matcher,
+        whose hits are tagged with their categories.
+        It gives the same results as two SimpleComparators.
+
+        Args:
+            `keywords`: Keywords of each category, keyed by "Negative_News" or "ESG_News".
+                        Value can be "KEYWORDS", ["KEYWORDS1", "KEYWORDS2", ..],
+                        "DIR/KEYWORDS.txt" or ["DIR/KEYWORDS.txt", ...] as SimpleComparator.
+            `load_default`: Whether to load default keywords of both categories.
+            `debug`: Whether to use debug mode to make sure which sentence contains keywords.
+            `use_artifact`: Whether to load keywords and matcher from a precompiled artifact.
+            `metrics`: Please Check in the `SimpleComparator.__init__` function.
+            `cache`: Please Check in the `SimpleComparator.__init__` function.
+            `neardup`: Please Check in the `SimpleComparator.__init__` function.
+            `watch_interval`: Please Check in the `SimpleComparator.__init__` function.
+            `normalizer`: Please Check in the `SimpleComparator.__init__` function.
+            `keep_counts`: Please Check in the `SimpleComparator.__init__` function.
+            `shared_tables`: Please Check in the `SimpleComparator.__init__` function.
+                             Tags of keywords are scanned from the artifact as well.
+        Type:
+            `keywords`: dict [string, string or list of string]
+            `load_default`: bool
+            `debug`: bool
+            `use_artifact`: bool
+            `metrics`: MetricsRegistry
+            `cache`: ResultCache
+            `neardup`: NearDuplicateIndex
+            `watch_interval`: float
+            `normalizer`: TextNormalizer
+            `keep_counts`: bool
+            `shared_tables`: bool
+        Return:
+            None
+        """
+
+        keywords = keywords or dict()
+        for category in keywords:
+            if category not in [cate.value for cate in self.CATEGORIES]:
+                raise ValueError(
+                    "Only support either 'Negative_News' or 'ESG_News' category, "
+                    f"but got {category}"
+                )
+
+        if shared_tables and not use_artifact:
+            raise ValueError(
+                "shared_tables needs use_artifact to map tables from a file."
+            )
+
+        self._sources = (keywords, load_default)
+        self.use_artifact = use_artifact
+        self.shared_tables = shared_tables
+        self.normalizer = normalizer
+        self._init_keywords(watch_interval)
+
+        self.debug = debug
+        self.keep_counts = keep_counts
+        self.metrics = (
+            ComparatorMetrics(metrics, type(self).__name__, "Fused")
+            if metrics is not None
+            else None
+        )
+        self.cache = cache
+        self.neardup = neardup
+
+    def classify(
+        self,
+        news_title: str,
+        news_body: str,
+        threshold: float = 0.50,
+        title_weight: float = 0.3,
+        body_weight: float = 0.1,
+    ) -> st.SpecStruct:
+        """
+        Classify News and return classify results of all categories.
+
+        Args:
+            `news_title`  : Title of news.
+            `news_body`   : Content of news.
+            `threshold`   : Threshold score to determine if the news belongs to the news category.
+            `title_weight`: Weight of news title.
+            `body_weight` : Weight of news body.
+        Type:
+            `news_title`  : string
+            `news_body`   : string
+            `threshold`   : float
+            `title_weight`: float
+            `body_weight` : float
+        Return:
+            A classify result about news
+            rtype: st.SpecStruct
+        """
+
+        snapshot = self._snapshot
+        nn_ret, esg_ret = self._cached_evaluate(
+            news_title, news_body, title_weight, body_weight, snapshot=snapshot
+        )
+        nn_score, nn_keywords, nn_debug, nn_counts = nn_ret
+        esg_score, esg_keywords, esg_debug, esg_counts = esg_ret
+
+        return st.SpecStruct(
+            NN=nn_score > threshold,
+            NN_SCORE=nn_score,
+            NN_KEYWORDS=list(nn_keywords),
+            ESG=esg_score > threshold,
+            ESG_SCORE=esg_score,
+            ESG_KEYWORDS=list(esg_keywords),
+            DEBUG={"NN": nn_debug, "ESG": esg_debug} if self.debug else None,
+            KEYWORDS_VERSION=snapshot.version,
+            COUNTS=(
+                self._counts(
+                    [cate.value for cate in self.CATEGORIES],
+                    [nn_counts, esg_counts],
+                    snapshot.version,
+                )
+                if self.keep_counts
+                else None
+            ),
+        )
+
+    def classify_compact(
+        self,
+        news_title: str,
+        news_body: str,
+        threshold: float = 0.50,
+        title_weight: float = 0.3,
+        body_weight: float = 0.1,
+    ) -> st.CompactSpecStruct:
+        """
+        Classify News as the `classify` function, but return a compact result,
+        which keeps matched keywords as ids into keyword tables of the comparator.
+        It's for collecting lots of results in memory.
+
+        Args:
+            Please Check in the `classify` function.
+        Return:
+            A classify result about news
+            rtype: st.CompactSpecStruct
+        """
+
+        snapshot = self._snapshot
+        nn_ret, esg_ret = self._cached_evaluate(
+            news_title, news_body, title_weight, body_weight, snapshot=snapshot
+        )
+        nn_score, _, nn_debug, nn_counts = nn_ret
+        esg_score, _, esg_debug, esg_counts = esg_ret
+
+        return st.CompactSpecStruct(
+            NN=nn_score > threshold,
+            NN_SCORE=nn_score,
+            ESG=esg_score > threshold,
+            ESG_SCORE=esg_score,
+            NN_KEYWORD_IDS=self._ordered_ids(nn_counts[2]),
+            ESG_KEYWORD_IDS=self._ordered_ids(esg_counts[2]),
+            keyword_tables=snapshot.extra["category_keywords"],
+            DEBUG={"NN": nn_debug, "ESG": esg_debug} if self.debug else None,
+            KEYWORDS_VERSION=snapshot.version,
+            COUNTS=(
+                self._counts(
+                    [cate.value for cate in self.CATEGORIES],
+                    [nn_counts, esg_counts],
+                    snapshot.version,
+                )
+                if self.keep_counts
+                else None
+            ),
+        )
+
+    def _evaluate(
+        self,
+        news_title: str,
+        news_body: str,
+        title_weight: float = 0.3,
+        body_weight: float = 0.1,
+        snapshot: Optional[KeywordsSnapshot] = None,
+    ) -> List[Tuple[float, List[str], st.DebugSpans, Tuple[int, int, Dict[int, int]]]]:
+        """
+        Find matched keywords and calculate score of each category.
+
+        Args:
+            `news_title`  : Title of news.
+            `news_body`   : Content of news.
+            `title_weight`: Weight of news title.
+            `body_weight` : Weight of news body.
+            `snapshot`    : Keywords to use. Default is the current one.
+        Type:
+            `news_title`  : string
+            `news_body`   : string
+            `title_weight`: float
+            `body_weight` : float
+            `snapshot`    : KeywordsSnapshot
+        Return:
+            score, matched keywords, debug details and counts (title count, body count,
+            count of each matched keyword by position) of each category in order of CATEGORIES
+            rtype: list of Tuple[float, list of string, st.DebugSpans (list if not in debug mode),
+                                 Tuple[int, int, dict [integer, integer]]]
+        """
+
+        n = len(self.CATEGORIES)
+        snapshot = snapshot or self._snapshot
+        category_keywords = snapshot.extra["category_keywords"]
+        metrics = self.metrics
+        if metrics is not None:
+            clocks = [time.perf_counter()]
+
+        """ Near-duplicate Lookup """
+        ## Debug details point into the news, so they can't be reused.
+        signature, body_match = None, None
+        namespace = self._neardup_namespace(snapshot.version)
+        if self.neardup is not None and not self.debug:
+            signature = self.neardup.signature(news_body)
+            body_match = self.neardup.query(signature, namespace)
+
+        """ Sentence Splitting """
+        starts, ends = sg.sentence_spans(news_body)
+        if metrics is not None:
+            clocks.append(time.perf_counter())
+
+        """ Keywords Matching """
+        ## news_title
+        title_counts = self._split(snapshot.matcher.count(news_title), snapshot)
+        title_total_cnt = [sum(counts.values()) for counts in title_counts]
+
+        ## news_body
+        ## Match once over the whole body and assign hits to sentences by their offsets.
+        ## Sentences shared with a near-duplicate reuse its counts, and others are scanned.
+        sentence_counts = sg.count_by_sentence(
+            snapshot.matcher,
+            news_body,
+            (starts, ends),
+            known=None if body_match is None else body_match[1],
+        )
+        body_kid_counts = dict()
+        for counts in sentence_counts.values():
+            for kid, cnt in counts.items():
+                body_kid_counts[kid] = body_kid_counts.get(kid, 0) + cnt
+        body_counts = self._split(body_kid_counts, snapshot)
+        if signature is not None and body_match is None:
+            self.neardup.add(
+                signature,
+                sg.sentence_table(news_body, (starts, ends), sentence_counts),
+                namespace,
+            )
+        body_total_cnt = [sum(counts.values()) for counts in body_counts]
+
+        ## Count of each matched keyword in title and body.
+        keyword_counts = [dict(counts) for counts in body_counts]
+        for cidx, counts in enumerate(title_counts):
+            for pos, cnt in counts.items():
+                keyword_counts[cidx][pos] = keyword_counts[cidx].get(pos, 0) + cnt
+        if metrics is not None:
+            clocks.append(time.perf_counter())
+
+        """ Debug """
+        ## Keep spans of sentences only. Strings are built when debug details are accessed.
+        debug = [list() for _ in range(n)]
+        if self.debug:
+            sentence_counts = {
+                i: self._split(counts, snapshot)
+                for i, counts in sentence_counts.items()
+            }
+            debug = [
+                st.DebugSpans(
+                    title=news_title,
+                    body=news_body,
+                    keywords=category_keywords[cidx],
+                    title_keyword_ids=(
+                        self._ordered_ids(title_counts[cidx])
+                        if title_total_cnt[cidx] > 0
+                        else None
+                    ),
+                    spans=[
+                        (starts[i], ends[i], self._ordered_ids(category_counts[cidx]))
+                        for i, category_counts in sentence_counts.items()
+                        if category_counts[cidx]
+                    ],
+                )
+                for cidx in range(n)
+            ]
+        if metrics is not None:
+            clocks.append(time.perf_counter())
+
+        """ Scoring """
+        weight = round(title_weight / body_weight, 2)
+        ret = [
+            (
+                self.score_func(weight * title_total_cnt[cidx] + body_total_cnt[cidx]),
+                [
+                    category_keywords[cidx][pos]
+                    for pos in self._ordered_ids(keyword_counts[cidx])
+                ],
+                debug[cidx],
+                (title_total_cnt[cidx], body_total_cnt[cidx], keyword_counts[cidx]),
+            )
+            for cidx in range(n)
+        ]
+        if metrics is not None:
+            clocks.append(time.perf_counter())
+            metrics.observe(
+                clocks,
+                sentences=len(starts),
+                chars=len(news_title) + len(news_body),
+                hits=sum(title_total_cnt) + sum(body_total_cnt),
+            )
+
+        return ret
+
+    def find_keywords(
+        self, text: str
+    ) -> List[Union[List[Tuple[str, int]], List[str], int]]:
+        """
+        Details of finding keywords of each category.
+
+        Args:
+            `text`: Input text.
+        Type:
+            `text`: string
+        Return:
+            details, matched keywords, count of each category in order of CATEGORIES
+            rtype: list of Tuple[list of Tuple[str, int], list of string, integer]
+        """
+
+        ret = list()
+        snapshot = self._snapshot
+        if self.normalizer is not None:
+            text = self.normalizer(text)
+        category_counts = self._split(snapshot.matcher.count(text), snapshot)
+        for category_keywords, counts in zip(
+            snapshot.extra["category_keywords"], category_counts
+        ):
+            cnt_drafts = [
+                (category_keywords[pos], counts[pos]) for pos in sorted(counts)
+            ]
+            cnt_drafts = sorted(cnt_drafts, key=lambda x: (x[1]), reverse=True)
+            matched_keywords = [cnt[0] for cnt in cnt_drafts]
+            total_cnt = sum([cnt[1] for cnt in cnt_drafts])
+            ret.append((cnt_drafts, matched_keywords, total_cnt))
+        return ret
+
+    def _split(
+        self, counts: Dict[int, int], snapshot: KeywordsSnapshot
+    ) -> List[Dict[int, int]]:
+        """
+        Spread counts of the combined matcher into categories by tags of the snapshot.
+        Count of each category is keyed by position in keywords of the category.
+        """
+
+        tag_start, tag_cidx, tag_pos = snapshot.extra["tags"]
+        category_counts = [dict() for _ in self.CATEGORIES]
+        for kid, cnt in counts.items():
+            for i in range(tag_start[kid], tag_start[kid + 1]):
+                category_counts[tag_cidx[i]][tag_pos[i]] = cnt
+        return category_counts
+
+    @staticmethod
+    def _union(
+        category_keywords: Sequence[Sequence[str]],
+    ) -> Tuple[List[str], Dict[str, array]]:
+        """
+        Union of keywords of all categories and tags of each keyword as flat tables.
+        Tags of keyword i are (tag_cidx, tag_pos)[tag_start[i]:tag_start[i + 1]].
+        """
+
+        union_keywords = list()
+        tags = list()
+        kids = dict()
+        for cidx, kws in enumerate(category_keywords):
+            for pos, keyword in enumerate(kws):
+                if keyword not in kids:
+                    kids[keyword] = len(union_keywords)
+                    union_keywords.append(keyword)
+                    tags.append(list())
+                tags[kids[keyword]].append((cidx, pos))
+
+        extra = {name: array("I") for name in ("tag_start", "tag_cidx", "tag_pos")}
+        extra["tag_start"].append(0)
+        for keyword_tags in tags:
+            for cidx, pos in keyword_tags:
+                extra["tag_cidx"].append(cidx)
+                extra["tag_pos"].append(pos)
+            extra["tag_start"].append(len(extra["tag_cidx"]))
+        return union_keywords, extra
+
+    def _sources_version(self) -> str:
+        keywords, load_default = self._sources
+        versions = [
+            ke.KeywordsVersion(cate.value, keywords.get(cate.value), load_default)
+            for cate in self.CATEGORIES
+        ]
+        return self._normalized_version(
+            hashlib.sha1("|".join(versions).encode("utf-8")).hexdigest()[:16]
+        )
+
+    def _source_files(self) -> List[str]:
+        keywords, load_default = self._sources
+        return [
+            file
+            for cate in self.CATEGORIES
+            for file in ke.KeywordsSourceFiles(
+                cate.value, keywords.get(cate.value), load_default
+            )
+        ]
+
+    def _compile(self, version: str) -> KeywordsSnapshot:
+        keywords, load_default = self._sources
+
+        def load(cate: st.NewsCategory) -> Tuple[str]:
+            ret = ke.KeywordsFactory(
+                name=cate.value,
+                keywords=keywords.get(cate.value),
+                load_default=load_default,
+            ).keywords
+            if self.normalizer is None:
+                return ret
+            return tuple(self.normalizer.normalize_keywords(ret))
+
+        def build():
+            return self._union([load(cate) for cate in self.CATEGORIES])
+
+        if self.use_artifact:
+            compiled = ar.load_or_compile(
+                "Fused", version, build, flat=self.shared_tables
+            )
+        else:
+            union_keywords, extra = build()
+            compiled = ar.CompiledKeywords(
+                version,
+                tuple(union_keywords),
+                AhoCorasickMatcher(union_keywords),
+                extra,
+            )
+
+        ## A keyword is tagged with (category index, position in keywords of the category).
+        ## Tag tables are kept flat, so they're shared pages of the artifact if shared_tables.
+        tags = tuple(
+            compiled.extra[name] for name in ("tag_start", "tag_cidx", "tag_pos")
+        )
+        tag_start, tag_cidx, tag_pos = tags
+        category_keywords = [dict() for _ in self.CATEGORIES]
+        for kid, keyword in enumerate(compiled.keywords):
+            for i in range(tag_start[kid], tag_start[kid + 1]):
+                category_keywords[tag_cidx[i]][tag_pos[i]] = keyword
+
+        return KeywordsSnapshot(
+            version,
+            tuple(compiled.keywords),
+            compiled.matcher,
+            {
+                "tags": tags,
+                "category_keywords": tuple(
+                    tuple(kws[pos] for pos in range(len(kws)))
+                    for kws in category_keywords
+                ),
+            },
+        )
+
+    def _category_keywords(self, snapshot: KeywordsSnapshot) -> Dict[str, Tuple[str]]:
+        return {
+            cate.value: keywords
+            for cate, keywords in zip(
+                self.CATEGORIES, snapshot.extra["category_keywords"]
+            )
+        }
+
+    def _neardup_namespace(self, version: str) -> Tuple[str, str, int]:
+        return (type(self).__name__, version, EVALUATE_FORMAT)
+
+    @property
+    def keywords(self) -> Tuple[str]:
+        """
+        Keywords of all news categories.
+        """
+
+        return tuple(self._snapshot.keywords)
@@ -6,12 +6,20 @@ import json
 import logging
 import os
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
+import numpy as np
+from gensim import matutils
 from gensim.models import KeyedVectors, word2vec
 from tqdm import tqdm
 
 from src.base import BaseGenerator
+from src.KeyGenerator import ann as an
+from src.KeyGenerator.compact import CompactKeyedVectors
+from src.KeyGenerator.graph import RelatedWordGraph
+from src.KeyGenerator.memo import ExpansionMemo
+from src.KeyGenerator.model_store import ModelStore
+from src.KeyGenerator.similarity import most_similar_batch
 from src.utils import struct as st
 
 logging.basicConfig()
@@ -19,14 +27,6 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
 
-MODEL_PATH = {
-    "20210603040434": {
-        "normal": "model/word2vec/word2vec_20210603040434_v250_c5_e5_s1.model",
-        "fast": "model/word2vec/word2vec_20210603040434_v250_c5_e5_s1.wordvectors",  # recommend
-    }
-}
-
-
 class Word2VecKeyGenerator(BaseGenerator):
     """A Word2Vec-based KeyGenerator"""
 
@@ -34,17 +34,47 @@ class Word2VecKeyGenerator(BaseGenerator):
         self,
         modelkey: str,
         use_fast: Optional[bool] = True,
+        ann: Optional[bool] = False,
+        nprobe: Optional[int] = 16,
+        store: Optional[ModelStore] = None,
+        compact: Optional[str] = None,
+        restrict_vocab: Optional[int] = None,
+        memo: Optional[ExpansionMemo] = None,
     ):
         """
         Init Word2VecKeyGenerator.
         It can generate words that are related to a given words by using a Word2Vec trained model.
+        The model is downloaded and extracted on first use if it doesn't exist.
 
         Args:
             `modelkey`: A key to choose a specific Word2Vec model.
             `use_fast`: Whether to use fast mode. It's a special function in the gensim library.
+            `ann`     : Whether to search related words by an approximate nearest neighbour
+                        (IVF) index instead of scanning the whole vocabulary.
+                        The index is built once and saved next to the model ("MODEL.ivf").
+                        It can be seen from src/KeyGenerator/ann.py.
+            `nprobe`  : Number of clusters searched for a word if `ann` is True.
+                        Larger is more accurate but slower.
+                        If it covers all clusters, it's the same as exact search.
+            `store`   : Where models are resolved. Default is `ModelStore()`.
+                        It can be seen from src/KeyGenerator/model_store.py.
+            `compact` : Directory of compact vectors exported by src/KeyGenerator/compact.py,
+                        which are loaded by memory mapping instead of the model.
+                        They're pruned and quantized, so related words may differ slightly.
+            `restrict_vocab`: Only the first (most frequent) `restrict_vocab` words are
+                              candidates of related words. None to search all words.
+            `memo`    : Persistent memo of related words, which is checked before the model,
+                        so that only new words are searched when a file is inferred again.
+                        It can be seen from src/KeyGenerator/memo.py.
         Type:
             `modelkey`: string
             `use_fast`: bool (default = True)
+            `ann`     : bool (default = False)
+            `nprobe`  : integer (default = 16)
+            `store`   : ModelStore
+            `compact` : string
+            `restrict_vocab`: integer
+            `memo`    : ExpansionMemo
         Return:
             None
         """
@@ -52,13 +82,41 @@ class Word2VecKeyGenerator(BaseGenerator):
         logger.debug(f"Init model (use_fast: {use_fast}) & results.")
         self.modelkey = modelkey
         self.use_fast = use_fast
-
-        if use_fast:
-            wv = KeyedVectors.load(MODEL_PATH[modelkey]["fast"], mmap="r")
+        self.store = store or ModelStore()
+        self.restrict_vocab = restrict_vocab
+
+        if compact:
+            model_path = compact
+            wv = CompactKeyedVectors.load(compact, mmap="r")
+        elif use_fast:
+            model_path = self.store.resolve(modelkey, "fast")
+            wv = KeyedVectors.load(model_path, mmap="r")
         else:
-            model = word2vec.Word2Vec.load(MODEL_PATH[modelkey]["normal"])
+            model_path = self.store.resolve(modelkey, "normal")
+            model = word2vec.Word2Vec.load(model_path)
             wv = model.wv
         self.wv = wv
+
+        self.ann = None
+        if ann:
+            self.wv.fill_norms()
+            n = restrict_vocab or len(self.wv.vectors)
+            ann_path = (
+                f"{model_path}.{n}.ivf" if restrict_vocab else f"{model_path}.ivf"
+            )
+            self.ann = an.load_or_build(
+                ann_path,
+                self.wv.vectors[:n],
+                self.wv.norms[:n],
+                nprobe,
+            )
+
+        ## Related words depend on the model and how it's searched.
+        self.memo = memo
+        self.memo_namespace = (
+            f"{modelkey}/{os.path.basename(model_path)}"
+            f"/restrict_vocab={restrict_vocab}/nprobe={nprobe if ann else None}"
+        )
         self.init_results()
 
     def infer(
@@ -123,6 +181,8 @@ class Word2VecKeyGenerator(BaseGenerator):
             logger.debug(f"Processing {input} as A SINGLE WORD.")
             self.results.results.update(self.infer_a_word(input, topn, threshold))
 
+        if self.memo is not None:
+            logger.debug(f"Memo: {self.memo.stats()}")
         return self.results
 
     def infer_a_file(
@@ -131,6 +191,7 @@ class Word2VecKeyGenerator(BaseGenerator):
         topn: Optional[int] = 10,
         threshold: Optional[float] = 0.70,
         force_info: Optional[Dict[str, Dict[str, float]]] = None,
+        vectorized: Optional[bool] = True,
     ) -> Dict[str, st.KeyGenerator_WordStruct]:
         """
         Infer a txt file that contains lots of words.
@@ -143,15 +204,26 @@ class Word2VecKeyGenerator(BaseGenerator):
             不肖
             ...
 
-        Args: Please Check in the `infer` function.
-        Type: Please Check in the `infer` function.
+        Args:
+            `vectorized`: Whether to search related words of all words at once
+                          by blocked matrix multiplication instead of one word at a time.
+                          Results are the same.
+            Others: Please Check in the `infer` function.
+        Type:
+            `vectorized`: bool
+            Others: Please Check in the `infer` function.
         Return:
             Inference results of all words in a given txt file.
             rtype: dict [string, st.KeyGenerator_WordStruct]
         """
 
-        ret = dict()
         lines = open(file, "r", encoding="utf-8-sig").readlines()
+        if vectorized:
+            return self._infer_words(
+                [word.strip() for word in lines], topn, threshold, force_info
+            )
+
+        ret = dict()
         for word in tqdm(lines, total=(len(lines)), desc="Inference"):
             word = word.strip()
 
@@ -189,20 +261,167 @@ class Word2VecKeyGenerator(BaseGenerator):
             rtype: dict [string, st.KeyGenerator_WordStruct]
         """
 
-        ret = {word: st.KeyGenerator_WordStruct(topn=topn, threshold=threshold)}
-
         ## Protection mode
         ## Another api: site-packages/gensim/models/keyedvectors.py, line 396, in get_index
         if word not in self.wv:
+            return self._word_result(word, topn, threshold, None)
+
+        similar = None
+        if self.memo is not None:
+            similar = self.memo.get(self.memo_namespace, word, topn)
+        if similar is None:
+            if self.ann is not None:
+                similar = self._search([word], topn)[0]
+            else:
+                similar = self.wv.most_similar(
+                    positive=[word],
+                    negative=None,
+                    topn=topn,
+                    restrict_vocab=self.restrict_vocab,
+                )
+            if self.memo is not None:
+                self.memo.put(self.memo_namespace, word, topn, similar)
+        return self._word_result(word, topn, threshold, similar)
+
+    def _infer_words(
+        self,
+        words: List[str],
+        topn: Optional[int] = 10,
+        threshold: Optional[float] = 0.70,
+        force_info: Optional[Dict[str, Dict[str, float]]] = None,
+    ) -> Dict[str, st.KeyGenerator_WordStruct]:
+        """
+        Infer lots of words at once. Duplicate words are inferred once.
+
+        Args: Please Check in the `infer` function.
+        Type: Please Check in the `infer` function.
+        Return:
+            Inference results of all words.
+            rtype: dict [string, st.KeyGenerator_WordStruct]
+        """
+
+        ## If word exists in force_info dict,
+        ## it means we need to use custom topn and threshold for this word.
+        params = dict()
+        for word in words:
+            if force_info and word in force_info:
+                params[word] = (force_info[word]["topn"], force_info[word]["threshold"])
+            else:
+                params[word] = (topn, threshold)
+
+        known = [word for word in params if word in self.wv]
+        similars = dict(
+            zip(known, self.most_similar_batch(known, [params[w][0] for w in known]))
+        )
+
+        ret = dict()
+        for word, (word_topn, word_threshold) in params.items():
+            ret.update(
+                self._word_result(word, word_topn, word_threshold, similars.get(word))
+            )
+        return ret
+
+    def most_similar_batch(
+        self,
+        words: Sequence[str],
+        topn: Union[int, Sequence[int]] = 10,
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Same as `self.wv.most_similar(positive=[word], topn=topn)` of each word,
+        but all words are searched by blocked matrix multiplication at once,
+        or by the approximate nearest neighbour index if any.
+        Words in the memo, if any, aren't searched again.
+
+        Args:
+            `words`: Words in vocabulary.
+            `topn` : Top n words for all words or for each word.
+        Type:
+            `words`: sequence of string
+            `topn` : integer or sequence of integer
+        Return:
+            (related word, cosine similarity) of each word.
+            rtype: list of list of Tuple[str, float]
+        """
+
+        if self.memo is None:
+            return self._search(words, topn)
+
+        topn = np.broadcast_to(np.asarray(topn, dtype=np.int64), (len(words),))
+        ret = [self.memo.get(self.memo_namespace, w, n) for w, n in zip(words, topn)]
+        missed = [i for i, similar in enumerate(ret) if similar is None]
+        if missed:
+            results = self._search([words[i] for i in missed], topn[missed])
+            for i, similar in zip(missed, results):
+                self.memo.put(self.memo_namespace, words[i], int(topn[i]), similar)
+                ret[i] = similar
+        return ret
+
+    def _search(
+        self,
+        words: Sequence[str],
+        topn: Union[int, Sequence[int]] = 10,
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Search related words of all words at once without the memo.
+        Please Check in the `most_similar_batch` function.
+        """
+
+        if not words:
+            return list()
+
+        ## Query vectors are built in the same way as `most_similar`.
+        self.wv.fill_norms()
+        queries = np.stack(
+            [
+                matutils.unitvec(self.wv.get_vector(word, norm=True)).astype(
+                    np.result_type(self.wv.vectors.dtype, np.float32)
+                )
+                for word in words
+            ]
+        )
+        exclude = [self.wv.get_index(word) for word in words]
+        if self.ann is not None:
+            ## The index only contains candidates of `restrict_vocab`.
+            n = self.restrict_vocab or len(self.wv.vectors)
+            results = self.ann.search(
+                self.wv.vectors[:n], self.wv.norms[:n], queries, exclude, topn
+            )
+        else:
+            results = most_similar_batch(
+                self.wv.vectors,
+                self.wv.norms,
+                queries,
+                exclude,
+                topn,
+                restrict_vocab=self.restrict_vocab,
+                progress=True,
+            )
+        index_to_key = self.wv.index_to_key
+        return [
+            [(index_to_key[i], score) for i, score in related] for related in results
+        ]
+
+    def _word_result(
+        self,
+        word: str,
+        topn: int,
+        threshold: float,
+        similar: Optional[List[Tuple[str, float]]],
+    ) -> Dict[str, st.KeyGenerator_WordStruct]:
+        """
+        Inference result of a word from its most similar words.
+        `similar` is None if the word never appeared before.
+        """
+
+        ret = {word: st.KeyGenerator_WordStruct(topn=topn, threshold=threshold)}
+        if similar is None:
             ret[word].debug = f"{word} never appeared before."
             return ret
 
         ## Be careful for list (call for value/reference).
         [
             ret[word].related.append((relatedword, round(cs_score, 2)))
-            for (relatedword, cs_score) in self.wv.most_similar(
-                positive=[word], negative=None, topn=topn
-            )
+            for (relatedword, cs_score) in similar
             if cs_score >= threshold
         ]
 
@@ -215,7 +434,8 @@ class Word2VecKeyGenerator(BaseGenerator):
 
     def save(self, outfile: str):
         """
-        Save inference results into outfile. Support extension of .txt and .json.
+        Save inference results into outfile.
+        Support extension of .txt, .json, and .graphml or .tsv for the graph.
 
         Args:
             `outfile`: A output file to store inference results.
@@ -240,9 +460,14 @@ class Word2VecKeyGenerator(BaseGenerator):
             logger.debug(f"Save2Json: {outfile}")
             self.save2json(outfile)
 
+        elif filename.endswith((".graphml", ".tsv", ".edgelist")):
+            logger.debug(f"Save2Graph: {outfile}")
+            self.save2graph(outfile)
+
         else:
             raise ValueError(
-                f"{filename} is NOT supported. Only support either .txt or .json."
+                f"{filename} is NOT supported. "
+                "Only support .txt, .json, .graphml or .tsv."
             )
 
     def save2txt(self, outfile: str):
@@ -284,8 +509,66 @@ class Word2VecKeyGenerator(BaseGenerator):
             json.dump(self.results.__2dict__(), fo, ensure_ascii=False, indent=4)
             fo.close()
 
-    def save2graph(self):
-        pass
+    def build_graph(
+        self,
+        input: Union[str, Sequence[str]],
+        depth: Optional[int] = 2,
+        topn: Optional[int] = 10,
+        threshold: Optional[float] = 0.70,
+        max_nodes: Optional[int] = None,
+    ) -> RelatedWordGraph:
+        """
+        Build a k-NN graph of seed words and their related words to a given depth.
+        Each level is searched by one call of `most_similar_batch`.
+        The graph is kept in `self.graph` for `save2graph`.
+
+        Args:
+            `input`    : A txt file of seed words (one word per line) or a list of words.
+            `depth`    : Number of expansions. 1 is the same as `infer`.
+            `topn`     : Please Check in the `infer` function.
+            `threshold`: Please Check in the `infer` function.
+            `max_nodes`: Expansion stops once the graph has `max_nodes` nodes.
+        Type:
+            `input`    : string or list of string
+            `depth`    : integer
+            `topn`     : integer
+            `threshold`: float
+            `max_nodes`: integer
+        Return:
+            The graph. It can be seen from src/KeyGenerator/graph.py.
+            rtype: RelatedWordGraph
+        """
+
+        if isinstance(input, str):
+            input = open(input, "r", encoding="utf-8-sig").readlines()
+
+        self.graph = RelatedWordGraph.build(
+            self.most_similar_batch,
+            input,
+            depth=depth,
+            topn=topn,
+            threshold=threshold,
+            max_nodes=max_nodes,
+            vocab=lambda word: word in self.wv,
+        )
+        logger.debug(f"Build {self.graph}")
+        return self.graph
+
+    def save2graph(self, outfile: str):
+        """
+        Save the graph into outfile whose extension is .graphml or .tsv (edge list).
+        It's the graph of `build_graph` if any, or the graph of inference results.
+
+        Args:
+            `outfile`: A output file to store the graph.
+        Type:
+            `outfile`: string
+        Return:
+            None
+        """
+
+        graph = self.graph or RelatedWordGraph.from_results(self.results.results)
+        graph.save(outfile)
 
     def relatedwords(self, word) -> st.KeyGenerator_WordStruct:
         """
@@ -304,9 +587,10 @@ class Word2VecKeyGenerator(BaseGenerator):
 
     def init_results(self):
         """
-        Init results.
+        Init results and the graph.
         """
 
+        self.graph = None
         self.results = st.KeyGeneratorStruct(
             createtime=datetime.now().strftime("%Y/%m/%d %H:%M:%S"),
             modelkey=self.modelkey,
@@ -343,3 +627,8 @@ if __name__ == "__main__":
     w2v.infer(esg_file, topn, threshold, force_info=None, init_results=True)
     w2v.save2json(outfile=esg_outfile_json)
     w2v.save2txt(outfile=esg_outfile_txt)
+
+    ## Generated lists aren't active until they're promoted into the manifest, e.g.
+    ## python -m src.utils.keywords.manifest promote Negative_News NN_keywords_XXX.txt \
+    ##     --retire NN_keywords_YYY.txt
+    logger.info(f"Promote {nn_outfile_txt} and {esg_outfile_txt} to make them active.")
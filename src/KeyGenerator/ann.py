@@ -0,0 +1,291 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Inverted file (IVF) index for approximate nearest neighbour search of words.
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from src.KeyGenerator.similarity import BLOCK_ELEMENTS, most_similar_batch
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+
+class IVFIndex:
+    """An inverted file index over word vectors, clustered by spherical k-means"""
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        list_start: np.ndarray,
+        list_index: np.ndarray,
+        nprobe: Optional[int] = 16,
+    ):
+        """
+        Init IVFIndex. Please use `IVFIndex.build` or `IVFIndex.load` instead.
+
+        Args:
+            `centroids` : Unit centroid of each list.
+            `list_start`: Words of list i are list_index[list_start[i]:list_start[i + 1]].
+            `list_index`: Index of words grouped by list.
+            `nprobe`    : Default number of lists searched for a query.
+        Type:
+            `centroids` : np.ndarray (nlist, vector_size)
+            `list_start`: np.ndarray (nlist + 1,)
+            `list_index`: np.ndarray (vocab_size,)
+            `nprobe`    : integer
+        Return:
+            None
+        """
+
+        self.centroids = centroids
+        self.list_start = list_start
+        self.list_index = list_index
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        norms: np.ndarray,
+        nlist: Optional[int] = None,
+        niter: Optional[int] = 10,
+        sample: Optional[int] = 100000,
+        nprobe: Optional[int] = 16,
+        seed: Optional[int] = 0,
+    ) -> "IVFIndex":
+        """
+        Cluster unit word vectors by spherical k-means and group words by their clusters.
+
+        Args:
+            `vectors`: Word vectors (not normalized), e.g. `KeyedVectors.vectors`.
+            `norms`  : L2 norm of each word vector, e.g. `KeyedVectors.norms`.
+            `nlist`  : Number of clusters. Default is sqrt(vocab_size).
+            `niter`  : Number of iterations of k-means.
+            `sample` : Number of words sampled to train centroids.
+            `nprobe` : Please Check in the `IVFIndex.__init__` function.
+            `seed`   : Random seed.
+        Type:
+            `vectors`: np.ndarray (vocab_size, vector_size)
+            `norms`  : np.ndarray (vocab_size,)
+            `nlist`  : integer
+            `niter`  : integer
+            `sample` : integer
+            `nprobe` : integer
+            `seed`   : integer
+        Return:
+            The index
+            rtype: IVFIndex
+        """
+
+        n = len(vectors)
+        nlist = min(nlist or max(1, int(np.sqrt(n))), n)
+        rng = np.random.default_rng(seed)
+
+        sample_index = np.sort(
+            rng.choice(n, size=min(n, max(sample, nlist)), replace=False)
+        )
+        train = vectors[sample_index] / norms[sample_index, None]
+        centroids = train[rng.choice(len(train), size=nlist, replace=False)]
+        for i in range(niter):
+            assign = _assign(train, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, train)
+            lengths = np.linalg.norm(sums, axis=1)
+            ## Empty clusters keep their centroids.
+            filled = lengths > 0
+            centroids[filled] = sums[filled] / lengths[filled, None]
+            logger.debug(f"k-means iteration {i + 1}/{niter} of {nlist} lists.")
+
+        ## Norms don't change the closest centroid.
+        assign = _assign(vectors, centroids)
+        list_index = np.argsort(assign, kind="stable")
+        list_start = np.searchsorted(assign[list_index], np.arange(nlist + 1))
+        return cls(
+            centroids.astype(np.float32),
+            list_start.astype(np.int64),
+            list_index.astype(np.int64),
+            nprobe,
+        )
+
+    def search(
+        self,
+        vectors: np.ndarray,
+        norms: np.ndarray,
+        queries: np.ndarray,
+        exclude: Sequence[int],
+        topn: Union[int, Sequence[int]],
+        nprobe: Optional[int] = None,
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Approximate top n most similar words of each query.
+        Only words in the `nprobe` lists whose centroids are closest to the query are scored.
+        More lists give higher recall and higher latency.
+        If `nprobe` covers all lists, it falls back to exact search.
+
+        Args:
+            `nprobe`: Number of lists searched for a query. Default is self.nprobe.
+            Others: Please Check in the `most_similar_batch` function.
+        Type:
+            `nprobe`: integer
+            Others: Please Check in the `most_similar_batch` function.
+        Return:
+            (index of word, score) in descending order of score for each query.
+            rtype: list of list of Tuple[int, float]
+        """
+
+        nprobe = nprobe or self.nprobe
+        if nprobe >= self.nlist:
+            return most_similar_batch(vectors, norms, queries, exclude, topn)
+
+        m = len(queries)
+        topn = np.broadcast_to(np.asarray(topn, dtype=np.int64), (m,))
+        if m == 0:
+            return list()
+        ## One more candidate in case the excluded word is found.
+        k = int(topn.max()) + 1
+
+        centroid_scores = queries @ self.centroids.T
+        probes = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+
+        ## Queries are grouped by lists, so that each list is scored against all of
+        ## its queries by one matrix multiplication.
+        pairs = np.argsort(probes.ravel(), kind="stable")
+        pair_lists = probes.ravel()[pairs]
+        pair_queries, pair_slots = np.divmod(pairs, nprobe)
+        bounds = np.searchsorted(pair_lists, np.arange(self.nlist + 1))
+
+        cand_index = np.full((m, nprobe, k), -1, dtype=np.int64)
+        for p in np.flatnonzero(np.diff(bounds)):
+            members = self.list_index[self.list_start[p] : self.list_start[p + 1]]
+            if len(members) == 0:
+                continue
+            qs = pair_queries[bounds[p] : bounds[p + 1]]
+            scores = queries[qs] @ vectors[members].astype(queries.dtype, copy=False).T
+            scores /= norms[members]
+            kk = min(k, len(members))
+            part = np.argpartition(scores, -kk, axis=1)[:, -kk:]
+            cand_index[qs, pair_slots[bounds[p] : bounds[p + 1]], :kk] = members[part]
+
+        ## Candidates are rescored one query at a time in the same way as exact search.
+        ret = list()
+        for query, index, excluded, n in zip(
+            queries, cand_index.reshape(m, -1), exclude, topn
+        ):
+            ## Sorted, so that scores don't depend on the order candidates are found.
+            index = np.unique(index[index >= 0])
+            scores = np.dot(vectors[index], query) / norms[index]
+            order = np.argsort(-scores)
+            related = [
+                (int(index[j]), float(scores[j])) for j in order if index[j] != excluded
+            ]
+            ret.append(related[:n])
+        return ret
+
+    def save(self, path: str):
+        """
+        Save the index into a directory atomically, e.g. next to the model.
+        """
+
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent, suffix=".tmp")
+        try:
+            for name in ("centroids", "list_start", "list_index"):
+                np.save(os.path.join(tmp, f"{name}.npy"), getattr(self, name))
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as fo:
+                json.dump({"format_version": FORMAT_VERSION, "nprobe": self.nprobe}, fo)
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            os.replace(tmp, path)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(cls, path: str, nprobe: Optional[int] = None) -> "IVFIndex":
+        """
+        Load the index by memory mapping.
+        """
+
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["format_version"] != FORMAT_VERSION:
+            raise ValueError(
+                f"{path} is not an index of format version {FORMAT_VERSION}."
+            )
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in ("centroids", "list_start", "list_index")
+        }
+        return cls(**arrays, nprobe=nprobe or meta["nprobe"])
+
+
+def load_or_build(
+    path: str,
+    vectors: np.ndarray,
+    norms: np.ndarray,
+    nprobe: Optional[int] = None,
+    **kwargs,
+) -> IVFIndex:
+    """
+    Load the index of a model, or build and save it if it doesn't exist.
+
+    Args:
+        `path`   : Directory of the index, e.g. "MODEL_PATH.ivf".
+        `vectors`: Please Check in the `IVFIndex.build` function.
+        `norms`  : Please Check in the `IVFIndex.build` function.
+        `nprobe` : Please Check in the `IVFIndex.__init__` function.
+        `kwargs` : Please Check in the `IVFIndex.build` function.
+    Type:
+        `path`   : string
+        `vectors`: np.ndarray
+        `norms`  : np.ndarray
+        `nprobe` : integer
+    Return:
+        The index
+        rtype: IVFIndex
+    """
+
+    if os.path.exists(path):
+        try:
+            index = IVFIndex.load(path, nprobe)
+            if len(index.list_index) == len(vectors):
+                return index
+            logger.warning(f"Rebuild {path}: it doesn't match the model.")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Rebuild {path}: {e}")
+
+    logger.debug(f"Build IVF index of {len(vectors)} words into {path}.")
+    index = IVFIndex.build(vectors, norms, **kwargs)
+    if nprobe:
+        index.nprobe = nprobe
+    try:
+        index.save(path)
+    except OSError as e:
+        logger.warning(f"Failed to save {path}, so use the index in memory: {e}")
+    return index
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Closest centroid (by cosine similarity) of each vector, computed block by block.
+    """
+
+    ret = np.empty(len(vectors), dtype=np.int64)
+    block = max(1, BLOCK_ELEMENTS // len(centroids))
+    for start in range(0, len(vectors), block):
+        end = min(start + block, len(vectors))
+        ret[start:end] = np.argmax(vectors[start:end] @ centroids.T, axis=1)
+    return ret
@@ -0,0 +1,388 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Pruned, quantized and pre-normalized word vectors, which are memory mapped.
+#              e.g. python -m src.KeyGenerator.compact --output model/word2vec/compact-int8 \
+#                       --dtype int8 --max_vocab 300000 --keep NN_keywords.txt ESG_keywords.txt
+
+import argparse
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+from collections.abc import Sequence
+from typing import Iterable, List, Optional, Pattern, Tuple, Union
+
+import numpy as np
+
+from src.KeyGenerator.similarity import most_similar_batch
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+FORMAT_VERSION = 1
+
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+## Words with any CJK ideograph are kept by default.
+CJK_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+
+## Number of words normalized and quantized at once.
+BLOCK_SIZE = 65536
+
+
+class Vocabulary(Sequence):
+    """Words stored as one utf-8 buffer, which can be looked up by binary search"""
+
+    def __init__(self, buffer: np.ndarray, offsets: np.ndarray, order: np.ndarray):
+        """
+        Init Vocabulary. Please use `Vocabulary.from_words` or `CompactKeyedVectors.load`.
+
+        Args:
+            `buffer` : Utf-8 bytes of all words.
+            `offsets`: Word i is buffer[offsets[i]:offsets[i + 1]].
+            `order`  : Index of words in ascending order of their utf-8 bytes.
+        Type:
+            `buffer` : np.ndarray of uint8
+            `offsets`: np.ndarray of int64 (vocab_size + 1,)
+            `order`  : np.ndarray of int64 (vocab_size,)
+        Return:
+            None
+        """
+
+        self.buffer = buffer
+        self.offsets = offsets
+        self.order = order
+
+    @classmethod
+    def from_words(cls, words: Iterable[str]) -> "Vocabulary":
+        encoded = [word.encode("utf-8") for word in words]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        order = np.array(
+            sorted(range(len(encoded)), key=encoded.__getitem__), dtype=np.int64
+        )
+        return cls(buffer, offsets, order)
+
+    def _bytes(self, index: int) -> bytes:
+        return self.buffer[self.offsets[index] : self.offsets[index + 1]].tobytes()
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __getitem__(self, index: int) -> str:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Index {index} is out of vocabulary.")
+        return self._bytes(index).decode("utf-8")
+
+    def get(self, word: str, default: Optional[int] = None) -> Optional[int]:
+        """
+        Index of a word, or `default` if it's not in vocabulary.
+        """
+
+        target = word.encode("utf-8")
+        lo, hi = 0, len(self.order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(self.order[mid]) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.order) and self._bytes(self.order[lo]) == target:
+            return int(self.order[lo])
+        return default
+
+    def __contains__(self, word: str) -> bool:
+        return self.get(word) is not None
+
+
+class CompactKeyedVectors:
+    """Read-only word vectors with the subset of KeyedVectors API used by KeyGenerator"""
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        norms: np.ndarray,
+        vocab: Vocabulary,
+        source: Optional[str] = None,
+    ):
+        """
+        Init CompactKeyedVectors.
+        Please use `CompactKeyedVectors.from_keyedvectors` or `CompactKeyedVectors.load`.
+
+        Args:
+            `vectors`: Pre-normalized (float) or quantized (int8) word vectors.
+            `norms`  : L2 norm of each stored vector, so dot(vectors, query) / norms
+                       is the cosine similarity.
+            `vocab`  : Words of vectors.
+            `source` : Where vectors come from.
+        Type:
+            `vectors`: np.ndarray (vocab_size, vector_size)
+            `norms`  : np.ndarray of float32 (vocab_size,)
+            `vocab`  : Vocabulary
+            `source` : string
+        Return:
+            None
+        """
+
+        self.vectors = vectors
+        self.norms = norms
+        self.index_to_key = vocab
+        self.source = source
+
+    def __repr__(self):
+        return (
+            f"CompactKeyedVectors(vocab_size={len(self)}, vector_size={self.vector_size}, "
+            f"dtype={self.vectors.dtype})"
+        )
+
+    @property
+    def vector_size(self) -> int:
+        return self.vectors.shape[1]
+
+    def __len__(self) -> int:
+        return len(self.index_to_key)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.index_to_key
+
+    def get_index(self, word: str) -> int:
+        index = self.index_to_key.get(word)
+        if index is None:
+            raise KeyError(f"Key '{word}' not present")
+        return index
+
+    def get_vector(self, word: str, norm: Optional[bool] = False) -> np.ndarray:
+        """
+        Unit vector of a word as float32.
+        Vectors are stored pre-normalized, so `norm` makes no difference.
+        """
+
+        index = self.get_index(word)
+        return self.vectors[index].astype(np.float32) / self.norms[index]
+
+    def fill_norms(self, force: Optional[bool] = False):
+        """
+        Norms are stored with vectors, so there is nothing to fill.
+        """
+
+    def most_similar(
+        self,
+        positive: Union[str, List[str]],
+        negative: Optional[List[str]] = None,
+        topn: Optional[int] = 10,
+        restrict_vocab: Optional[int] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Same as `KeyedVectors.most_similar` for positive words.
+        """
+
+        if negative:
+            raise NotImplementedError("Negative words are not supported.")
+        if isinstance(positive, str):
+            positive = [positive]
+
+        mean = np.mean([self.get_vector(word) for word in positive], axis=0)
+        query = (mean / np.linalg.norm(mean)).astype(np.float32)
+        excluded = {self.get_index(word) for word in positive}
+        related = most_similar_batch(
+            self.vectors,
+            self.norms,
+            query[None, :],
+            [-1],
+            topn + len(excluded),
+            restrict_vocab=restrict_vocab,
+        )[0]
+        return [
+            (self.index_to_key[i], score) for i, score in related if i not in excluded
+        ][:topn]
+
+    @classmethod
+    def from_keyedvectors(
+        cls,
+        wv,
+        dtype: Optional[str] = "float16",
+        max_vocab: Optional[int] = None,
+        min_count: Optional[int] = None,
+        pattern: Optional[Pattern] = CJK_PATTERN,
+        keep: Optional[Iterable[str]] = None,
+    ) -> "CompactKeyedVectors":
+        """
+        Prune, normalize and quantize word vectors of a gensim model.
+        Order of words is kept, so the most frequent words are still first,
+        and `restrict_vocab` works in the same way.
+
+        Args:
+            `wv`       : Word vectors, e.g. `KeyedVectors.load(path, mmap="r")`.
+            `dtype`    : "float32", "float16" (1/2 of memory) or "int8" (1/4 of memory).
+            `max_vocab`: Only the first (most frequent) `max_vocab` words are kept.
+            `min_count`: Only words seen at least `min_count` times in training are kept.
+            `pattern`  : Only words matching the pattern are kept. None to keep all.
+            `keep`     : Words always kept, e.g. keywords to be expanded.
+        Type:
+            `wv`       : gensim.models.KeyedVectors
+            `dtype`    : string
+            `max_vocab`: integer
+            `min_count`: integer
+            `pattern`  : re.Pattern
+            `keep`     : iterable of string
+        Return:
+            Compact word vectors.
+            rtype: CompactKeyedVectors
+        """
+
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype should be one of {list(DTYPES)}, but got {dtype}")
+
+        keep = set(keep or ())
+        selected = list()
+        for i, word in enumerate(wv.index_to_key):
+            if word not in keep:
+                if max_vocab is not None and i >= max_vocab:
+                    continue
+                if min_count is not None and wv.get_vecattr(word, "count") < min_count:
+                    continue
+                if pattern is not None and not pattern.search(word):
+                    continue
+            selected.append(i)
+        selected = np.asarray(selected, dtype=np.int64)
+
+        vectors = np.empty((len(selected), wv.vector_size), dtype=DTYPES[dtype])
+        norms = np.empty(len(selected), dtype=np.float32)
+        for start in range(0, len(selected), BLOCK_SIZE):
+            index = selected[start : start + BLOCK_SIZE]
+            block = np.asarray(wv.vectors[index], dtype=np.float32)
+            block /= np.linalg.norm(block, axis=1, keepdims=True)
+            if dtype == "int8":
+                ## Symmetric quantization of each vector. Its scale cancels out in cosine.
+                scale = np.abs(block).max(axis=1, keepdims=True) / 127
+                block = np.rint(block / scale)
+            stored = block.astype(vectors.dtype)
+            vectors[start : start + len(index)] = stored
+            norms[start : start + len(index)] = np.linalg.norm(
+                stored.astype(np.float32), axis=1
+            )
+
+        words = (wv.index_to_key[i] for i in selected)
+        logger.info(f"Keep {len(selected)} of {len(wv.index_to_key)} words as {dtype}.")
+        return cls(vectors, norms, Vocabulary.from_words(words))
+
+    def save(self, path: str):
+        """
+        Save vectors into a directory atomically, so that they can be memory mapped.
+        """
+
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent, suffix=".tmp")
+        try:
+            arrays = {
+                "vectors": self.vectors,
+                "norms": self.norms,
+                "buffer": self.index_to_key.buffer,
+                "offsets": self.index_to_key.offsets,
+                "order": self.index_to_key.order,
+            }
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp, f"{name}.npy"), array)
+            meta = {
+                "format_version": FORMAT_VERSION,
+                "dtype": str(self.vectors.dtype),
+                "vocab_size": len(self),
+                "vector_size": self.vector_size,
+                "source": self.source,
+            }
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as fo:
+                json.dump(meta, fo, ensure_ascii=False, indent=4)
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            os.replace(tmp, path)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(cls, path: str, mmap: Optional[str] = "r") -> "CompactKeyedVectors":
+        """
+        Load vectors saved by `save`. Arrays are memory mapped unless `mmap` is None.
+        """
+
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["format_version"] != FORMAT_VERSION:
+            raise ValueError(
+                f"{path} is not compact vectors of format version {FORMAT_VERSION}."
+            )
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap)
+            for name in ("vectors", "norms", "buffer", "offsets", "order")
+        }
+        vocab = Vocabulary(arrays["buffer"], arrays["offsets"], arrays["order"])
+        return cls(arrays["vectors"], arrays["norms"], vocab, meta.get("source"))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Export compact word vectors for Word2VecKeyGenerator."
+    )
+    parser.add_argument("--modelkey", default="20210603040434")
+    parser.add_argument("--output", "-o", required=True, help="Output directory.")
+    parser.add_argument("--dtype", choices=list(DTYPES), default="float16")
+    parser.add_argument("--max_vocab", type=int, default=None)
+    parser.add_argument("--min_count", type=int, default=None)
+    parser.add_argument(
+        "--all_words",
+        action="store_true",
+        help="Keep words without CJK ideographs as well.",
+    )
+    parser.add_argument(
+        "--keep",
+        nargs="*",
+        default=[],
+        help="Txt files of words (one word per line) which are always kept.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+
+    from gensim.models import KeyedVectors
+
+    from src.KeyGenerator.model_store import ModelStore
+
+    args = parse_args(argv)
+    keep = set()
+    for file in args.keep:
+        with open(file, "r", encoding="utf-8-sig") as f:
+            keep.update(line.strip() for line in f if line.strip())
+
+    model_path = ModelStore().resolve(args.modelkey, "fast")
+    wv = KeyedVectors.load(model_path, mmap="r")
+    compact = CompactKeyedVectors.from_keyedvectors(
+        wv,
+        dtype=args.dtype,
+        max_vocab=args.max_vocab,
+        min_count=args.min_count,
+        pattern=None if args.all_words else CJK_PATTERN,
+        keep=keep,
+    )
+    compact.source = os.path.basename(model_path)
+    compact.save(args.output)
+
+    before = wv.vectors.nbytes
+    after = compact.vectors.nbytes + compact.norms.nbytes
+    logger.info(
+        f"Saved {compact} into {args.output}: "
+        f"{before / 2 ** 20:.1f}MB -> {after / 2 ** 20:.1f}MB of vectors."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: k-NN graph of seed words and their related words, built level by level
+#              from batched similarity search, to review keyword drift.
+
+import logging
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+## search(words, topn) -> (related word, score) of each word,
+## e.g. `Word2VecKeyGenerator.most_similar_batch`.
+SearchFunc = Callable[[Sequence[str], int], List[List[Tuple[str, float]]]]
+
+
+class RelatedWordGraph:
+    """A directed graph whose edges point from a word to its related words"""
+
+    def __init__(
+        self,
+        words: List[str],
+        depths: Sequence[int],
+        sources: Sequence[int],
+        targets: Sequence[int],
+        weights: Sequence[float],
+    ):
+        """
+        Init RelatedWordGraph. Please use `RelatedWordGraph.build` or `from_results`.
+
+        Args:
+            `words`  : Word of each node.
+            `depths` : Number of expansions from the nearest seed word to each node.
+                       Seed words are 0.
+            `sources`: Node of each edge, whose related word is the target.
+            `targets`: Node of related word of each edge.
+            `weights`: Cosine similarity of each edge.
+        Type:
+            `words`  : list of string
+            `depths` : sequence of integer
+            `sources`: sequence of integer
+            `targets`: sequence of integer
+            `weights`: sequence of float
+        Return:
+            None
+        """
+
+        self.words = words
+        self.word_to_node = {word: i for i, word in enumerate(words)}
+        self.depths = np.asarray(depths, dtype=np.int32)
+        self.sources = np.asarray(sources, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self._components = None
+
+    def __repr__(self):
+        return (
+            f"RelatedWordGraph(nodes={self.number_of_nodes}, "
+            f"edges={self.number_of_edges}, seeds={int(np.sum(self.depths == 0))})"
+        )
+
+    @property
+    def number_of_nodes(self) -> int:
+        return len(self.words)
+
+    @property
+    def number_of_edges(self) -> int:
+        return len(self.sources)
+
+    @classmethod
+    def build(
+        cls,
+        search: SearchFunc,
+        seeds: Iterable[str],
+        depth: Optional[int] = 1,
+        topn: Optional[int] = 10,
+        threshold: Optional[float] = 0.70,
+        max_nodes: Optional[int] = None,
+        vocab: Optional[Callable[[str], bool]] = None,
+    ) -> "RelatedWordGraph":
+        """
+        Expand seed words level by level.
+        All words of a level are searched by one batched call,
+        and related words which aren't in the graph yet form the next level.
+
+        Args:
+            `search`   : Please Check in the `SearchFunc`.
+            `seeds`    : Seed words, e.g. keywords.
+            `depth`    : Number of expansions. 1 is seed words and their related words.
+            `topn`     : Top n related words of each word.
+            `threshold`: Min cosine similarity of an edge.
+            `max_nodes`: Expansion stops once the graph has `max_nodes` nodes.
+            `vocab`    : Whether a word can be searched. Words which can't are kept as
+                         isolated nodes. Default is all words.
+        Type:
+            `search`   : Callable
+            `seeds`    : iterable of string
+            `depth`    : integer
+            `topn`     : integer
+            `threshold`: float
+            `max_nodes`: integer
+            `vocab`    : Callable
+        Return:
+            The graph.
+            rtype: RelatedWordGraph
+        """
+
+        words, depths = list(), list()
+        word_to_node = dict()
+        sources, targets, weights = list(), list(), list()
+
+        def add_node(word: str, level: int) -> int:
+            if word not in word_to_node:
+                word_to_node[word] = len(words)
+                words.append(word)
+                depths.append(level)
+            return word_to_node[word]
+
+        for seed in seeds:
+            if seed.strip():
+                add_node(seed.strip(), 0)
+        frontier = list(words)
+        for level in range(1, depth + 1):
+            queries = [word for word in frontier if vocab is None or vocab(word)]
+            if not queries:
+                break
+            frontier = list()
+            for word, related in zip(queries, search(queries, topn)):
+                source = word_to_node[word]
+                for related_word, score in related:
+                    if score < threshold:
+                        continue
+                    if related_word not in word_to_node:
+                        if max_nodes is not None and len(words) >= max_nodes:
+                            continue
+                        frontier.append(related_word)
+                    sources.append(source)
+                    targets.append(add_node(related_word, level))
+                    weights.append(score)
+            logger.debug(
+                f"Level {level}: {len(queries)} words searched, {len(words)} nodes, "
+                f"{len(sources)} edges."
+            )
+
+        return cls(words, depths, sources, targets, weights)
+
+    @classmethod
+    def from_results(cls, results: Dict) -> "RelatedWordGraph":
+        """
+        Graph of depth 1 from inference results of `Word2VecKeyGenerator.infer`.
+
+        Args:
+            `results`: `Word2VecKeyGenerator.results.results`.
+        Type:
+            `results`: dict [string, st.KeyGenerator_WordStruct]
+        Return:
+            The graph.
+            rtype: RelatedWordGraph
+        """
+
+        ## Related words are already filtered by their own topn and threshold.
+        related = {word: wordstruct.related for word, wordstruct in results.items()}
+        return cls.build(
+            lambda words, topn: [related[word] for word in words],
+            related,
+            threshold=float("-inf"),
+        )
+
+    def components(self) -> np.ndarray:
+        """
+        Weakly connected component of each node by union-find.
+        Components are numbered in descending order of size.
+
+        Return:
+            Component of each node.
+            rtype: np.ndarray of int64 (number_of_nodes,)
+        """
+
+        if self._components is not None:
+            return self._components
+
+        parent = list(range(self.number_of_nodes))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                ## Path halving.
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for source, target in zip(self.sources.tolist(), self.targets.tolist()):
+            a, b = find(source), find(target)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+        roots = np.array([find(i) for i in range(self.number_of_nodes)], dtype=np.int64)
+        _, inverse, counts = np.unique(roots, return_inverse=True, return_counts=True)
+        ## Larger components first, and ties by their first node.
+        order = np.lexsort((np.arange(len(counts)), -counts))
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        self._components = rank[inverse.reshape(-1)]
+        return self._components
+
+    def component_words(self) -> List[List[str]]:
+        """
+        Words of each weakly connected component, larger components first.
+        """
+
+        ret = [list() for _ in range(int(self.components().max(initial=-1)) + 1)]
+        for word, component in zip(self.words, self.components().tolist()):
+            ret[component].append(word)
+        return ret
+
+    def in_degrees(self) -> np.ndarray:
+        return np.bincount(self.targets, minlength=self.number_of_nodes)
+
+    def hubs(self, topn: Optional[int] = 20) -> List[Tuple[str, int, float]]:
+        """
+        Words which are related words of the most words.
+        They're where expansion drifts from one topic to another.
+
+        Args:
+            `topn`: Number of hubs.
+        Type:
+            `topn`: integer
+        Return:
+            (word, in-degree, sum of similarity of incoming edges) in descending order.
+            rtype: list of Tuple[str, int, float]
+        """
+
+        degrees = self.in_degrees()
+        strengths = np.bincount(
+            self.targets, weights=self.weights, minlength=self.number_of_nodes
+        )
+        order = np.lexsort((-strengths, -degrees))[:topn]
+        return [
+            (self.words[i], int(degrees[i]), float(strengths[i]))
+            for i in order
+            if degrees[i] > 0
+        ]
+
+    def summary(self, topn: Optional[int] = 20) -> Dict:
+        """
+        Number of nodes and edges, sizes of components and hubs.
+        """
+
+        return {
+            "nodes": self.number_of_nodes,
+            "edges": self.number_of_edges,
+            "components": [len(c) for c in self.component_words()[:topn]],
+            "hubs": self.hubs(topn),
+        }
+
+    def save(self, outfile: str):
+        """
+        Save the graph into outfile. Support extension of .graphml and .tsv (edge list).
+        """
+
+        dirname = os.path.dirname(os.path.abspath(outfile))
+        os.makedirs(dirname, exist_ok=True)
+
+        if outfile.endswith(".graphml"):
+            self.save2graphml(outfile)
+        elif outfile.endswith((".tsv", ".edgelist")):
+            self.save2edgelist(outfile)
+        else:
+            raise ValueError(
+                f"{outfile} is NOT supported. Only support either .graphml or .tsv."
+            )
+
+    def save2edgelist(self, outfile: str):
+        """
+        Save edges into a tab-separated file: source, target and weight per line.
+        Isolated nodes are not written.
+        """
+
+        with open(outfile, "w", encoding="utf-8") as fo:
+            for source, target, weight in zip(
+                self.sources.tolist(), self.targets.tolist(), self.weights.tolist()
+            ):
+                fo.write(f"{self.words[source]}\t{self.words[target]}\t{weight:.6f}\n")
+
+    def save2graphml(self, outfile: str):
+        """
+        Save the graph as GraphML, which can be opened by networkx, Gephi or Cytoscape.
+        Nodes have depth, component and in-degree, and edges have weight.
+        """
+
+        components = self.components().tolist()
+        degrees = self.in_degrees().tolist()
+        with open(outfile, "w", encoding="utf-8") as fo:
+            fo.write(
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                '  <key id="depth" for="node" attr.name="depth" attr.type="int"/>\n'
+                '  <key id="component" for="node" attr.name="component" '
+                'attr.type="int"/>\n'
+                '  <key id="in_degree" for="node" attr.name="in_degree" '
+                'attr.type="int"/>\n'
+                '  <key id="weight" for="edge" attr.name="weight" attr.type="double"/>\n'
+                '  <graph id="G" edgedefault="directed">\n'
+            )
+            for word, depth, component, degree in zip(
+                self.words, self.depths.tolist(), components, degrees
+            ):
+                fo.write(
+                    f"    <node id={quoteattr(word)}>"
+                    f'<data key="depth">{depth}</data>'
+                    f'<data key="component">{component}</data>'
+                    f'<data key="in_degree">{degree}</data></node>\n'
+                )
+            for source, target, weight in zip(
+                self.sources.tolist(), self.targets.tolist(), self.weights.tolist()
+            ):
+                fo.write(
+                    f"    <edge source={quoteattr(self.words[source])} "
+                    f"target={quoteattr(self.words[target])}>"
+                    f'<data key="weight">{escape(repr(weight))}</data></edge>\n'
+                )
+            fo.write("  </graph>\n</graphml>\n")
+
+    def to_networkx(self):
+        """
+        The graph as networkx.DiGraph. networkx is required.
+        """
+
+        import networkx as nx
+
+        graph = nx.DiGraph()
+        for word, depth in zip(self.words, self.depths.tolist()):
+            graph.add_node(word, depth=depth)
+        graph.add_weighted_edges_from(
+            (self.words[s], self.words[t], w)
+            for s, t, w in zip(
+                self.sources.tolist(), self.targets.tolist(), self.weights.tolist()
+            )
+        )
+        return graph
+
+    def drift(self, other: "RelatedWordGraph") -> Dict[str, List[str]]:
+        """
+        Words added into or removed from the graph compared with an older graph,
+        e.g. after keywords or the model are updated.
+        """
+
+        words, other_words = set(self.words), set(other.words)
+        return {
+            "added": sorted(words - other_words),
+            "removed": sorted(other_words - words),
+        }
+
+    def __2dict__(self):
+        return {
+            "words": self.words,
+            "depths": self.depths.tolist(),
+            "edges": [
+                [s, t, w]
+                for s, t, w in zip(
+                    self.sources.tolist(),
+                    self.targets.tolist(),
+                    self.weights.tolist(),
+                )
+            ],
+        }
@@ -0,0 +1,177 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Persistent memo of related words of each word, shared by infer calls and runs.
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ExpansionMemo:
+    """Unfiltered top n related words (with raw scores) of words, stored in sqlite"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Init ExpansionMemo.
+        Related words of a word never change for the same model, so they're searched once.
+        Raw scores of top n words are stored before threshold is applied,
+        so an entry answers any threshold and any topn not larger than its topn.
+
+        Args:
+            `path`: Sqlite file of the memo. None to keep it in memory only.
+        Type:
+            `path`: string
+        Return:
+            None
+        """
+
+        self.path = path
+        self._init()
+
+    def _init(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(
+            self.path or ":memory:",
+            timeout=30,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        if self.path:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS expansions "
+            "(namespace TEXT NOT NULL, word TEXT NOT NULL, topn INTEGER NOT NULL, "
+            "related TEXT NOT NULL, mtime REAL NOT NULL, PRIMARY KEY (namespace, word))"
+        )
+
+    def get(
+        self, namespace: str, word: str, topn: int
+    ) -> Optional[List[Tuple[str, float]]]:
+        """
+        Top n related words of a word, or None if they're not memoized for `topn`.
+
+        Args:
+            `namespace`: Model and search settings results depend on,
+                         e.g. `Word2VecKeyGenerator.memo_namespace`.
+            `word`     : A word in vocabulary.
+            `topn`     : Number of related words.
+        Type:
+            `namespace`: string
+            `word`     : string
+            `topn`     : integer
+        Return:
+            (related word, cosine similarity) in descending order of similarity.
+            rtype: list of Tuple[str, float]
+        """
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT topn, related FROM expansions WHERE namespace = ? AND word = ?",
+                (namespace, word),
+            ).fetchone()
+            if row is None or row[0] < topn:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return [(w, score) for w, score in json.loads(row[1])[:topn]]
+
+    def put(
+        self,
+        namespace: str,
+        word: str,
+        topn: int,
+        related: List[Tuple[str, float]],
+    ):
+        """
+        Memoize top n related words of a word.
+        An entry of larger topn is never replaced by an entry of smaller topn.
+
+        Args:
+            `related`: Unfiltered top n related words and their raw scores.
+            Others: Please Check in the `get` function.
+        Type:
+            `related`: list of Tuple[str, float]
+            Others: Please Check in the `get` function.
+        Return:
+            None
+        """
+
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO expansions (namespace, word, topn, related, mtime) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (namespace, word) DO UPDATE SET "
+                "topn = excluded.topn, related = excluded.related, mtime = excluded.mtime "
+                "WHERE excluded.topn > expansions.topn",
+                (
+                    namespace,
+                    word,
+                    topn,
+                    json.dumps(
+                        [[w, float(score)] for w, score in related], ensure_ascii=False
+                    ),
+                    time.time(),
+                ),
+            )
+
+    def stats(self) -> dict:
+        """
+        Hits, misses and hit rate since the memo is opened.
+        """
+
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def clear(self, namespace: Optional[str] = None):
+        """
+        Remove entries of a namespace, or all entries if it's None.
+        """
+
+        with self._lock:
+            if namespace is None:
+                self._db.execute("DELETE FROM expansions")
+            else:
+                self._db.execute(
+                    "DELETE FROM expansions WHERE namespace = ?", (namespace,)
+                )
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            (n,) = self._db.execute("SELECT COUNT(*) FROM expansions").fetchone()
+        return n
+
+    def __repr__(self):
+        return (
+            f"ExpansionMemo(entries={len(self)}, hits={self.hits}, "
+            f"misses={self.misses}, path={self.path})"
+        )
+
+    def __getstate__(self):
+        ## Only settings are sent to other processes, which open their own connections.
+        return self.path
+
+    def __setstate__(self, state):
+        self.path = state
+        self._init()
@@ -0,0 +1,374 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Resolve Word2Vec models lazily, and provision them by streaming extraction.
+
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import tarfile
+import urllib.request
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ROOTDIR = os.path.abspath(os.path.join(__file__, "..", "..", ".."))
+
+DEFAULT_MODEL_DIR = os.environ.get(
+    "NEWS_CLASSIFIER_MODEL_DIR", os.path.join(ROOTDIR, "model", "word2vec")
+)
+
+## A local archive, a local directory of model files or an url, which replaces the
+## url of every model, e.g. for offline machines.
+DEFAULT_SOURCE = os.environ.get("NEWS_CLASSIFIER_MODEL_SOURCE")
+
+## Whether an archive without a known checksum may be downloaded from its url.
+## Local archives and directories are trusted.
+DEFAULT_ALLOW_UNVERIFIED = os.environ.get("NEWS_CLASSIFIER_ALLOW_UNVERIFIED", "") == "1"
+
+## `sha256` of an archive is verified while it's streamed. Downloading an archive whose
+## `sha256` is None is refused unless unverified downloads are allowed.
+MODELS = {
+    "20210603040434": {
+        "url": (
+            "https://drive.usercontent.google.com/download"
+            "?id=1B0Vqsl5YyIJIvaCy1_iuxhgaochcaas5&export=download&confirm=t"
+        ),
+        "sha256": None,
+        "size": "1.05GB",
+        "files": {
+            "normal": "word2vec_20210603040434_v250_c5_e5_s1.model",
+            "fast": "word2vec_20210603040434_v250_c5_e5_s1.wordvectors",  # recommend
+        },
+    }
+}
+
+CHUNK_SIZE = 1 << 20
+
+
+class ModelStore:
+    """A directory of Word2Vec models, which are provisioned on first use"""
+
+    def __init__(
+        self,
+        root: Optional[str] = DEFAULT_MODEL_DIR,
+        source: Optional[str] = DEFAULT_SOURCE,
+        models: Optional[Dict[str, Dict]] = None,
+        allow_unverified: Optional[bool] = DEFAULT_ALLOW_UNVERIFIED,
+    ):
+        """
+        Init ModelStore. Nothing is checked or downloaded until a model is resolved.
+
+        Args:
+            `root`            : Directory where models are extracted.
+            `source`          : Where models come from instead of their urls.
+                                A local directory is used in place,
+                                and a local archive (.tar.gz) is extracted into `root`.
+            `models`          : Registry of models. Default is `MODELS`.
+            `allow_unverified`: Whether to download an archive without checksum from its url.
+                                Default is $NEWS_CLASSIFIER_ALLOW_UNVERIFIED == "1".
+        Type:
+            `root`            : string
+            `source`          : string
+            `models`          : dict
+            `allow_unverified`: bool
+        Return:
+            None
+        """
+
+        self.root = root
+        self.source = source
+        self.models = MODELS if models is None else models
+        self.allow_unverified = allow_unverified
+
+    def __repr__(self):
+        return f"ModelStore(root={self.root}, source={self.source})"
+
+    def _model(self, modelkey: str) -> Dict:
+        if modelkey not in self.models:
+            raise KeyError(
+                f"Unknown model {modelkey}. Please choose from {list(self.models)}."
+            )
+        return self.models[modelkey]
+
+    def _manifest_path(self, modelkey: str) -> str:
+        return os.path.join(self.root, f".{modelkey}.sha256.json")
+
+    def _incomplete_path(self, modelkey: str) -> str:
+        return os.path.join(self.root, f".{modelkey}.incomplete")
+
+    def path(self, modelkey: str, kind: Optional[str] = "fast") -> str:
+        """
+        Path of a model file, which may not exist yet.
+
+        Args:
+            `modelkey`: A key to choose a specific Word2Vec model.
+            `kind`    : "fast" (KeyedVectors) or "normal" (full Word2Vec model).
+        Type:
+            `modelkey`: string
+            `kind`    : string
+        Return:
+            Path of the model file.
+            rtype: string
+        """
+
+        filename = self._model(modelkey)["files"][kind]
+        if self.source and os.path.isdir(self.source):
+            return os.path.join(self.source, filename)
+        return os.path.join(self.root, filename)
+
+    def is_ready(self, modelkey: str, kind: Optional[str] = "fast") -> bool:
+        """
+        Whether a model file exists and, if it's provisioned by the store,
+        its extraction has completed.
+        """
+
+        path = self.path(modelkey, kind)
+        if self.source and os.path.isdir(self.source):
+            return os.path.exists(path)
+        ## The marker is left if a process is killed during extraction.
+        return os.path.exists(path) and not os.path.exists(
+            self._incomplete_path(modelkey)
+        )
+
+    def resolve(
+        self,
+        modelkey: str,
+        kind: Optional[str] = "fast",
+        verify: Optional[bool] = False,
+    ) -> str:
+        """
+        Path of a model file, provisioning the model if it doesn't exist.
+
+        Args:
+            `modelkey`: Please Check in the `path` function.
+            `kind`    : Please Check in the `path` function.
+            `verify`  : Whether to verify checksums of extracted files again.
+        Type:
+            `modelkey`: string
+            `kind`    : string
+            `verify`  : bool
+        Return:
+            Path of the model file.
+            rtype: string
+        """
+
+        path = self.path(modelkey, kind)
+        if not self.is_ready(modelkey, kind):
+            if self.source and os.path.isdir(self.source):
+                raise FileNotFoundError(f"{path} doesn't exist in {self.source}.")
+            with self._lock(modelkey):
+                ## Another process may have provisioned it while waiting for the lock.
+                if not self.is_ready(modelkey, kind):
+                    self.provision(modelkey)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"{path} isn't in the archive of {modelkey}.")
+        if verify:
+            self.verify(modelkey)
+        return path
+
+    def provision(
+        self,
+        modelkey: str,
+        sha256: Optional[str] = None,
+        allow_unverified: Optional[bool] = None,
+    ):
+        """
+        Download (or read) the archive of a model and extract it into `root`.
+        Members are streamed into their final location one by one,
+        so the archive is never staged on disk.
+        Downloading an archive without checksum raises ValueError unless it's allowed.
+
+        Args:
+            `modelkey`        : Please Check in the `path` function.
+            `sha256`          : Expected checksum of the archive.
+                                Default is the one of registry.
+            `allow_unverified`: Please Check in the `__init__` function.
+                                Default is the one of the store.
+        Type:
+            `modelkey`        : string
+            `sha256`          : string
+            `allow_unverified`: bool
+        Return:
+            None
+        """
+
+        model = self._model(modelkey)
+        source = self.source or model["url"]
+        sha256 = sha256 or model.get("sha256")
+        if allow_unverified is None:
+            allow_unverified = self.allow_unverified
+        if not sha256 and not os.path.isfile(source) and not allow_unverified:
+            raise ValueError(
+                f"No checksum to verify the archive of {modelkey} downloaded from {source}. "
+                "Please give its sha256, a local source, or allow unverified downloads by "
+                'ModelStore(allow_unverified=True) or NEWS_CLASSIFIER_ALLOW_UNVERIFIED="1".'
+            )
+        logger.info(f"Provision model {modelkey} ({model.get('size')}) from {source}")
+
+        os.makedirs(self.root, exist_ok=True)
+        open(self._incomplete_path(modelkey), "w").close()
+        with _open_source(source) as fileobj:
+            sums = extract_stream(fileobj, self.root, sha256=sha256)
+
+        with open(self._manifest_path(modelkey), "w", encoding="utf-8") as fo:
+            json.dump(sums, fo, ensure_ascii=False, indent=4)
+        os.remove(self._incomplete_path(modelkey))
+        logger.info(f"Model {modelkey} is extracted into {self.root}")
+
+    def verify(self, modelkey: str):
+        """
+        Verify checksums of files extracted by `provision`.
+        It raises ValueError if any file is changed.
+        Models which aren't provisioned by the store have nothing to verify.
+        """
+
+        manifest_path = self._manifest_path(modelkey)
+        if not os.path.exists(manifest_path):
+            logger.warning(f"No checksums of {modelkey} to verify.")
+            return
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            sums = json.load(f)
+        for name, expected in sums.items():
+            with open(os.path.join(self.root, name), "rb") as f:
+                actual = _sha256(f)
+            if actual != expected:
+                raise ValueError(f"Checksum of {name} is {actual}, not {expected}.")
+
+    @contextmanager
+    def _lock(self, modelkey: str):
+        os.makedirs(self.root, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.root, f".{modelkey}.lock"), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class _HashingReader:
+    """A file object which hashes bytes while they're read"""
+
+    def __init__(self, fileobj: BinaryIO):
+        self.fileobj = fileobj
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.fileobj.read(size)
+        self.hash.update(data)
+        self.size += len(data)
+        return data
+
+
+def extract_stream(
+    fileobj: BinaryIO, root: str, sha256: Optional[str] = None
+) -> Dict[str, str]:
+    """
+    Extract a (compressed) tar stream into a directory member by member.
+    Each member is written to "NAME.part" and renamed when it's complete,
+    so an interrupted extraction never leaves a truncated model behind.
+    If the checksum of the archive doesn't match, extracted files are removed.
+
+    Args:
+        `fileobj`: A readable binary stream of the archive, e.g. a http response.
+        `root`   : Directory to extract into.
+        `sha256` : Expected checksum of the archive. None to skip the check.
+    Type:
+        `fileobj`: file object
+        `root`   : string
+        `sha256` : string
+    Return:
+        Checksum of each extracted file, keyed by its path relative to root.
+        rtype: dict
+    """
+
+    os.makedirs(root, exist_ok=True)
+    reader = _HashingReader(fileobj)
+    sums = dict()
+    part = None
+    try:
+        with tarfile.open(fileobj=reader, mode="r|*") as tar:
+            for member in tar:
+                name = _safe_name(member.name)
+                dest = os.path.join(root, name)
+                if member.isdir():
+                    os.makedirs(dest, exist_ok=True)
+                    continue
+                if not member.isfile():
+                    logger.warning(f"Skip {member.name}: it isn't a regular file.")
+                    continue
+
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                hash = hashlib.sha256()
+                src = tar.extractfile(member)
+                part = f"{dest}.part"
+                with open(part, "wb") as fo:
+                    for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                        hash.update(chunk)
+                        fo.write(chunk)
+                os.replace(part, dest)
+                part = None
+                sums[name] = hash.hexdigest()
+                logger.debug(f"Extracted {name} ({member.size} bytes)")
+
+        ## Padding after the end of archive is part of the checksum.
+        while reader.read(CHUNK_SIZE):
+            pass
+        if sha256 and reader.hash.hexdigest() != sha256.lower():
+            raise ValueError(
+                f"Checksum of archive is {reader.hash.hexdigest()}, not {sha256}."
+            )
+    except BaseException:
+        for name in sums:
+            os.remove(os.path.join(root, name))
+        if part and os.path.exists(part):
+            os.remove(part)
+        raise
+    return sums
+
+
+def _safe_name(name: str) -> str:
+    """
+    Normalized member name, which can't escape the directory to extract into.
+    """
+
+    normalized = posixpath.normpath(name)
+    if (
+        posixpath.isabs(normalized)
+        or normalized == ".."
+        or normalized.startswith("../")
+    ):
+        raise ValueError(f"Unsafe member {name} in archive.")
+    return normalized
+
+
+@contextmanager
+def _open_source(source: str):
+    """
+    Open a local archive or an url as a binary stream.
+    """
+
+    if os.path.isfile(source):
+        with open(source, "rb") as f:
+            yield f
+    else:
+        with urllib.request.urlopen(source) as response:
+            yield response
+
+
+def _sha256(fileobj: BinaryIO) -> str:
+    hash = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+        hash.update(chunk)
+    return hash.hexdigest()
@@ -0,0 +1,108 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Batched cosine similarity search over word vectors.
+
+import logging
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from tqdm import tqdm
+
+logger = logging.getLogger(__name__)
+
+## Max number of scores computed at once (vocabulary rows x queries), about 64MB of float32.
+BLOCK_ELEMENTS = 2**24
+
+## Extra candidates of each query that are rescored one query at a time.
+## Scores of matrix multiplication may differ from `most_similar` in the last bit,
+## so candidates near the cut are rescored in the same way as `most_similar`.
+RESCORE_MARGIN = 8
+
+
+def most_similar_batch(
+    vectors: np.ndarray,
+    norms: np.ndarray,
+    queries: np.ndarray,
+    exclude: Sequence[int],
+    topn: Union[int, Sequence[int]],
+    restrict_vocab: Optional[int] = None,
+    block_elements: Optional[int] = BLOCK_ELEMENTS,
+    progress: Optional[bool] = False,
+) -> List[List[Tuple[int, float]]]:
+    """
+    Top n most similar words of many queries at once.
+    Vocabulary is scanned block by block, and each block is multiplied with all queries
+    by one matrix multiplication. Only the best candidates of each query are kept between
+    blocks by argpartition, so memory doesn't grow with vocabulary.
+    Scores are the same as `KeyedVectors.most_similar`: dot(vectors, query) / norms.
+
+    Args:
+        `vectors`       : Word vectors (not normalized), e.g. `KeyedVectors.vectors`.
+        `norms`         : L2 norm of each word vector, e.g. `KeyedVectors.norms`.
+        `queries`       : Unit query vectors, one query per row.
+        `exclude`       : Index of a word that is not returned for each query,
+                          e.g. the query word itself. -1 to exclude nothing.
+        `topn`          : Number of words returned for all queries or for each query.
+        `restrict_vocab`: Only search the first `restrict_vocab` words.
+        `block_elements`: Max number of scores computed at once.
+        `progress`      : Whether to show a progress bar.
+    Type:
+        `vectors`       : np.ndarray (vocab_size, vector_size)
+        `norms`         : np.ndarray (vocab_size,)
+        `queries`       : np.ndarray (number of queries, vector_size)
+        `exclude`       : sequence of integer
+        `topn`          : integer or sequence of integer
+        `restrict_vocab`: integer
+        `block_elements`: integer
+        `progress`      : bool
+    Return:
+        (index of word, score) in descending order of score for each query.
+        rtype: list of list of Tuple[int, float]
+    """
+
+    m = len(queries)
+    n = min(restrict_vocab, len(vectors)) if restrict_vocab else len(vectors)
+    topn = np.broadcast_to(np.asarray(topn, dtype=np.int64), (m,))
+    if m == 0:
+        return list()
+
+    ## One more candidate in case the excluded word is found.
+    k = max(1, min(int(topn.max()) + 1 + RESCORE_MARGIN, n))
+    best_scores = np.full((m, k), -np.inf, dtype=np.float32)
+    best_index = np.full((m, k), -1, dtype=np.int64)
+
+    block = max(1, block_elements // m)
+    for start in tqdm(
+        range(0, n, block),
+        total=(n + block - 1) // block,
+        desc="Inference",
+        disable=not progress,
+    ):
+        end = min(start + block, n)
+        ## Compact (float16 or int8) vectors are scored in the precision of queries.
+        block_vectors = vectors[start:end].astype(queries.dtype, copy=False)
+        scores = queries @ block_vectors.T
+        scores /= norms[start:end]
+        ## Best candidates of the block first, then merged with the best so far,
+        ## so that the large block of scores isn't copied.
+        kk = min(k, end - start)
+        part = np.argpartition(scores, -kk, axis=1)[:, -kk:]
+        cand_scores = np.concatenate(
+            [best_scores, np.take_along_axis(scores, part, axis=1)], axis=1
+        )
+        cand_index = np.concatenate([best_index, part + start], axis=1)
+        part = np.argpartition(cand_scores, -k, axis=1)[:, -k:]
+        best_scores = np.take_along_axis(cand_scores, part, axis=1)
+        best_index = np.take_along_axis(cand_index, part, axis=1)
+
+    ret = list()
+    for i in range(m):
+        ## Sorted, so that scores don't depend on the order candidates are found.
+        index = np.sort(best_index[i][best_index[i] >= 0])
+        scores = np.dot(vectors[index], queries[i]) / norms[index]
+        order = np.argsort(-scores)
+        related = [
+            (int(index[j]), float(scores[j])) for j in order if index[j] != exclude[i]
+        ]
+        ret.append(related[: topn[i]])
+    return ret
@@ -3,12 +3,19 @@
 # Description: SimpleComparator uses keywords to identify negative/esg news.
 
 import logging
-import re
+import time
 from typing import Dict, List, Optional, Tuple, Union
 
-from src.base import BaseComparator
+from src.base import EVALUATE_FORMAT, BaseComparator, KeywordsSnapshot
+from src.utils import segmentation as sg
 from src.utils import struct as st
+from src.utils.cache import ResultCache
+from src.utils.keywords import artifact as ar
 from src.utils.keywords import keywords as ke
+from src.utils.matcher import AhoCorasickMatcher
+from src.utils.metrics import ComparatorMetrics, MetricsRegistry
+from src.utils.neardup import NearDuplicateIndex
+from src.utils.normalization import TextNormalizer
 
 logging.basicConfig()
 logger = logging.getLogger(__name__)
@@ -24,6 +31,14 @@ class SimpleComparator(BaseComparator):
         keywords: Optional[Union[str, List[str]]] = None,
         load_default: Optional[bool] = True,
         debug: Optional[bool] = False,
+        use_artifact: Optional[bool] = True,
+        metrics: Optional[MetricsRegistry] = None,
+        cache: Optional[ResultCache] = None,
+        neardup: Optional[NearDuplicateIndex] = None,
+        watch_interval: Optional[float] = None,
+        normalizer: Optional[TextNormalizer] = None,
+        keep_counts: Optional[bool] = False,
+        shared_tables: Optional[bool] = False,
     ):
         """
         Init SimpleComparator.
@@ -40,11 +55,50 @@ class SimpleComparator(BaseComparator):
             `load_default`: Whether to load default keywords of the category.
                             It can be seen from src/utils/keywords/keywords.py.
             `debug`: Whether to use debug mode to make sure which sentence contains keywords.
+            `use_artifact`: Whether to load keywords and matcher from a precompiled artifact,
+                            which is compiled only when keyword sources change.
+                            It can be seen from src/utils/keywords/artifact.py.
+            `metrics`: A registry to record wall time of stages (split, match, debug, score)
+                       and sizes (sentences, chars, hits) of every classification.
+                       None to disable it, which costs nothing.
+                       It can be seen from src/utils/metrics.py.
+            `cache`: A cache of results, so that repeated news is answered without scanning.
+                     None to disable it. It can be seen from src/utils/cache.py.
+            `neardup`: An index of near-duplicate news bodies. If a body is similar enough
+                       to a body already classified, counts of its sentences are reused,
+                       and only the title and sentences that aren't in that body
+                       (e.g. added or edited paragraphs) are scanned, so counts are
+                       the news' own. It's ignored in debug mode.
+                       None to disable it. It can be seen from src/utils/neardup.py.
+            `watch_interval`: Seconds between checks of keyword files. Once they change,
+                              keywords are reloaded in the background without restart.
+                              None to disable it. Please Check in the `reload` function.
+            `normalizer`: A stage to normalize title and body before they're matched,
+                          e.g. strip html and fold full-width characters.
+                          Keywords are normalized by it as well.
+                          None to disable it. It can be seen from src/utils/normalization.py.
+            `keep_counts`: Whether to keep raw counts of matched keywords in results,
+                           so that they can be stored and scored again under other
+                           thresholds and weights without scanning.
+                           It can be seen from src/utils/counts.py.
+            `shared_tables`: Whether to scan directly over matcher tables memory-mapped
+                             from the artifact instead of copying them into the process,
+                             so that all processes on a node share a single copy of them.
+                             It scans a bit slower. It needs use_artifact.
+                             It can be seen from src/batch.py.
         Type:
             `category`: string.
             `keywords`: string or list of string.
             `load_default`: bool
             `debug`: bool
+            `use_artifact`: bool
+            `metrics`: MetricsRegistry
+            `cache`: ResultCache
+            `neardup`: NearDuplicateIndex
+            `watch_interval`: float
+            `normalizer`: TextNormalizer
+            `keep_counts`: bool
+            `shared_tables`: bool
         Return:
             None
         """
@@ -58,11 +112,26 @@ class SimpleComparator(BaseComparator):
                 f"Only support either 'Negative_News' or 'ESG_News' category, but got {category}"
             )
 
-        self._keywords = ke.KeywordsFactory(
-            name=category, keywords=keywords, load_default=load_default
-        ).keywords
+        if shared_tables and not use_artifact:
+            raise ValueError(
+                "shared_tables needs use_artifact to map tables from a file."
+            )
+
+        self._sources = (keywords, load_default)
+        self.use_artifact = use_artifact
+        self.shared_tables = shared_tables
+        self.normalizer = normalizer
+        self._init_keywords(watch_interval)
 
         self.debug = debug
+        self.keep_counts = keep_counts
+        self.metrics = (
+            ComparatorMetrics(metrics, type(self).__name__, category)
+            if metrics is not None
+            else None
+        )
+        self.cache = cache
+        self.neardup = neardup
         self.id = 0  # Generate id
 
     def classify(
@@ -93,8 +162,14 @@ class SimpleComparator(BaseComparator):
             rtype: st.SimpleComparatorStruct
         """
 
-        score, matched_keywords, debug = self._evaluate(
-            news_title, news_body, title_weight, body_weight
+        snapshot = self._snapshot
+        score, matched_keywords, debug, counts = self._cached_evaluate(
+            news_title,
+            news_body,
+            title_weight,
+            body_weight,
+            (self.news_category.value,),
+            snapshot,
         )
 
         ret = st.SimpleComparatorStruct(
@@ -103,8 +178,63 @@ class SimpleComparator(BaseComparator):
                 self.news_category if score > threshold else st.NewsCategory.OTHER
             ),
             score=score,
-            keywords=matched_keywords,
+            keywords=list(matched_keywords),
             debug=debug if self.debug else None,
+            keywords_version=snapshot.version,
+            counts=(
+                self._counts([self.news_category.value], [counts], snapshot.version)
+                if self.keep_counts
+                else None
+            ),
+        )
+        self.id += 1
+        return ret
+
+    def classify_compact(
+        self,
+        news_title: str,
+        news_body: str,
+        threshold: float = 0.50,
+        title_weight: float = 0.3,
+        body_weight: float = 0.1,
+    ) -> st.CompactComparatorStruct:
+        """
+        Classify News as the `classify` function, but return a compact result,
+        which keeps matched keywords as ids into the keyword table of the comparator.
+        It's for collecting lots of results in memory.
+
+        Args:
+            Please Check in the `classify` function.
+        Return:
+            A classify result about news
+            rtype: st.CompactComparatorStruct
+        """
+
+        snapshot = self._snapshot
+        score, _, debug, counts = self._cached_evaluate(
+            news_title,
+            news_body,
+            title_weight,
+            body_weight,
+            (self.news_category.value,),
+            snapshot,
+        )
+
+        ret = st.CompactComparatorStruct(
+            id=self.id,
+            news_category=(
+                self.news_category if score > threshold else st.NewsCategory.OTHER
+            ),
+            score=score,
+            keyword_ids=self._ordered_ids(counts[2]),
+            keyword_table=snapshot.keywords,
+            debug=debug if self.debug else None,
+            keywords_version=snapshot.version,
+            counts=(
+                self._counts([self.news_category.value], [counts], snapshot.version)
+                if self.keep_counts
+                else None
+            ),
         )
         self.id += 1
         return ret
@@ -115,7 +245,8 @@ class SimpleComparator(BaseComparator):
         news_body: str,
         title_weight: float = 0.3,
         body_weight: float = 0.1,
-    ) -> Union[float, List[str], List[Dict[str, str]]]:
+        snapshot: Optional[KeywordsSnapshot] = None,
+    ) -> Union[float, List[str], st.DebugSpans, Tuple[int, int, Dict[int, int]]]:
         """
         Find matched keywords and calculate score.
 
@@ -124,73 +255,111 @@ class SimpleComparator(BaseComparator):
             `news_body`   : Content of news.
             `title_weight`: Weight of news title.
             `body_weight` : Weight of news body.
+            `snapshot`    : Keywords to use. Default is the current one.
         Type:
             `news_title`  : string
             `news_body`   : string
             `title_weight`: float
             `body_weight` : float
+            `snapshot`    : KeywordsSnapshot
         Return:
-            score, matched keywords, debug details
+            score, matched keywords, debug details,
+            counts (title count, body count, count of each matched keyword by id)
             rtype1: float
             rtype2: list of string
-            rtype3: list of Dict[str, str]
+            rtype3: st.DebugSpans (list if not in debug mode)
+            rtype4: Tuple[int, int, dict [integer, integer]]
         """
 
-        debug = list()
+        snapshot = snapshot or self._snapshot
+        matcher = snapshot.matcher
+        metrics = self.metrics
+        if metrics is not None:
+            clocks = [time.perf_counter()]
+
+        """ Near-duplicate Lookup """
+        ## Debug details point into the news, so they can't be reused.
+        signature, body_match = None, None
+        namespace = self._neardup_namespace(snapshot.version)
+        if self.neardup is not None and not self.debug:
+            signature = self.neardup.signature(news_body)
+            body_match = self.neardup.query(signature, namespace)
+
+        """ Sentence Splitting """
+        starts, ends = sg.sentence_spans(news_body)
+        if metrics is not None:
+            clocks.append(time.perf_counter())
 
         """ Keywords Matching """
-        matched_keywords = list()
-
         ## news_title
-        _, title_matched_keywords, title_total_cnt = self.find_keywords(news_title)
-        matched_keywords.extend(title_matched_keywords)
-        if title_total_cnt > 0:
-            debug.append(
-                {
-                    "keywords": title_matched_keywords,
-                    "text": news_title,
-                }
-            )
+        title_counts = matcher.count(news_title)
+        title_total_cnt = sum(title_counts.values())
 
         ## news_body
-        body_total_cnt = 0
-        for sent in re.findall(r"[^!?。\.\!\?]+[!?。\.\!\?]?", news_body, flags=re.U):
-
-            _, sent_matched_keywords, sent_total_cnt = self.find_keywords(sent)
-            matched_keywords.extend(sent_matched_keywords)
-            body_total_cnt += sent_total_cnt
-            if sent_total_cnt > 0:
-                debug.append(
-                    {
-                        "keywords": sent_matched_keywords,
-                        "text": sent,
-                    }
-                )
+        ## Match once over the whole body and assign hits to sentences by their offsets.
+        ## Sentences shared with a near-duplicate reuse its counts, and others are scanned.
+        sentence_counts = sg.count_by_sentence(
+            matcher,
+            news_body,
+            (starts, ends),
+            known=None if body_match is None else body_match[1],
+        )
+        body_counts = dict()
+        for counts in sentence_counts.values():
+            for kid, cnt in counts.items():
+                body_counts[kid] = body_counts.get(kid, 0) + cnt
+        if signature is not None and body_match is None:
+            self.neardup.add(
+                signature,
+                sg.sentence_table(news_body, (starts, ends), sentence_counts),
+                namespace,
+            )
+        body_total_cnt = sum(body_counts.values())
+
+        ## Count of each matched keyword in title and body.
+        keyword_counts = dict(body_counts)
+        for kid, cnt in title_counts.items():
+            keyword_counts[kid] = keyword_counts.get(kid, 0) + cnt
+        if metrics is not None:
+            clocks.append(time.perf_counter())
+
+        """ Debug """
+        ## Keep spans of sentences only. Strings are built when debug details are accessed.
+        debug = list()
+        if self.debug:
+            debug = st.DebugSpans(
+                title=news_title,
+                body=news_body,
+                keywords=matcher.keywords,
+                title_keyword_ids=(
+                    self._ordered_ids(title_counts) if title_total_cnt > 0 else None
+                ),
+                spans=[
+                    (starts[i], ends[i], self._ordered_ids(counts))
+                    for i, counts in sentence_counts.items()
+                ],
+            )
+        if metrics is not None:
+            clocks.append(time.perf_counter())
 
         """ Scoring """
         weight = round(title_weight / body_weight, 2)
         matched_keywords_cnt = weight * title_total_cnt + body_total_cnt
         score = self.score_func(matched_keywords_cnt)
+        matched_keywords = [
+            snapshot.keywords[k] for k in self._ordered_ids(keyword_counts)
+        ]
+        if metrics is not None:
+            clocks.append(time.perf_counter())
+            metrics.observe(
+                clocks,
+                sentences=len(starts),
+                chars=len(news_title) + len(news_body),
+                hits=title_total_cnt + body_total_cnt,
+            )
 
-        return score, list(set(matched_keywords)), debug
-
-    def score_func(self, matched_keywords_cnt: float) -> float:
-        """
-        Score function.
-
-        Args:
-            `matched_keywords_cnt`: Total count of matched keywords.
-        Type:
-            `matched_keywords_cnt`: float
-        Return:
-            score
-            rtype: float
-        """
-
-        if matched_keywords_cnt == 0:
-            return 0.00
-        score = 0.50 + 0.50 / (15 ** 2) * (matched_keywords_cnt) ** 2
-        return round(score, 2) if score <= 1.00 else 1.00
+        counts = (title_total_cnt, body_total_cnt, keyword_counts)
+        return score, matched_keywords, debug, counts
 
     def find_keywords(self, text: str) -> Union[List[Tuple[str, int]], List[str], int]:
         """
@@ -207,21 +376,56 @@ class SimpleComparator(BaseComparator):
             rtype3: integer
         """
 
-        cnt_drafts = list()
-        for keyword in self.keywords:
-            cnt = text.count(keyword)
-            if cnt > 0:
-                cnt_drafts.append((keyword, cnt))
-
-        cnt_drafts = sorted(cnt_drafts, key=lambda x: (x[1]), reverse=True)
+        ## One pass over text by Aho-Corasick automaton instead of `text.count` per keyword.
+        ## Keep the order of self.keywords among keywords with the same count.
+        snapshot = self._snapshot
+        if self.normalizer is not None:
+            text = self.normalizer(text)
+        counts = snapshot.matcher.count(text)
+        cnt_drafts = [
+            (snapshot.keywords[kid], counts[kid]) for kid in self._ordered_ids(counts)
+        ]
         matched_keywords = [cnt[0] for cnt in cnt_drafts]
         total_cnt = sum([cnt[1] for cnt in cnt_drafts])
         return cnt_drafts, matched_keywords, total_cnt
 
+    def _sources_version(self) -> str:
+        return self._normalized_version(
+            ke.KeywordsVersion(self.news_category.value, *self._sources)
+        )
+
+    def _source_files(self) -> List[str]:
+        return ke.KeywordsSourceFiles(self.news_category.value, *self._sources)
+
+    def _compile(self, version: str) -> KeywordsSnapshot:
+        def load():
+            keywords = ke.KeywordsFactory(self.news_category.value, *self._sources)
+            if self.normalizer is None:
+                return keywords.keywords
+            return tuple(self.normalizer.normalize_keywords(keywords.keywords))
+
+        if self.use_artifact:
+            compiled = ar.load_or_compile(
+                self.news_category.value,
+                version,
+                lambda: (load(), {}),
+                flat=self.shared_tables,
+            )
+            return KeywordsSnapshot(version, compiled.keywords, compiled.matcher)
+
+        keywords = load()
+        return KeywordsSnapshot(version, keywords, AhoCorasickMatcher(keywords))
+
+    def _category_keywords(self, snapshot: KeywordsSnapshot) -> Dict[str, Tuple[str]]:
+        return {self.news_category.value: snapshot.keywords}
+
+    def _neardup_namespace(self, version: str) -> Tuple[str, str, str, int]:
+        return (type(self).__name__, self.news_category.value, version, EVALUATE_FORMAT)
+
     @property
     def keywords(self) -> Tuple[str]:
         """
         Keywords of the news category.
         """
 
-        return tuple(self._keywords)
+        return tuple(self._snapshot.keywords)
@@ -2,10 +2,34 @@
 # Author: Yu-Lun Chiang
 # Description: Base Comparator for Polymorphism
 
+import hashlib
+import logging
+import os
+import threading
+import weakref
 from abc import ABC, abstractmethod
-from typing import Tuple
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
 from src.utils import struct as st
+from src.utils.matcher import BaseMatcher
+
+logger = logging.getLogger(__name__)
+
+## Shape of results of `_evaluate`, which is a part of cache keys and near-duplicate
+## namespaces, so that results cached in an older shape are never read.
+EVALUATE_FORMAT = 4
+
+
+class KeywordsSnapshot(NamedTuple):
+    """
+    Keywords of a version and everything built from them, e.g. matcher and tag tables.
+    It never changes once built, so a reload replaces the whole snapshot at once.
+    """
+
+    version: str
+    keywords: Tuple[str, ...]
+    matcher: BaseMatcher
+    extra: Optional[Dict[str, Any]] = None
 
 
 class BaseComparator(ABC):
@@ -17,6 +41,26 @@ class BaseComparator(ABC):
     def _evaluate(self):
         raise NotImplementedError
 
+    @abstractmethod
+    def _sources_version(self) -> str:
+        ## Content hash of keyword sources.
+        raise NotImplementedError
+
+    @abstractmethod
+    def _source_files(self) -> List[str]:
+        ## Files of keyword sources, whose changes trigger a reload when watched.
+        raise NotImplementedError
+
+    @abstractmethod
+    def _compile(self, version: str) -> KeywordsSnapshot:
+        ## Build keywords and matcher of the version from keyword sources.
+        raise NotImplementedError
+
+    @abstractmethod
+    def _category_keywords(self, snapshot: KeywordsSnapshot) -> Dict[str, Tuple[str]]:
+        ## Keywords of each category of the snapshot, which keyword ids of counts point into.
+        raise NotImplementedError
+
     @property
     @abstractmethod
     def keywords(self) -> Tuple[str]:
@@ -30,6 +74,233 @@ class BaseComparator(ABC):
         ## whose feature is that we can't modify elements in self.keywords.
         raise NotImplementedError
 
+    def score_func(self, matched_keywords_cnt: float) -> float:
+        """
+        Score function.
+
+        Args:
+            `matched_keywords_cnt`: Total count of matched keywords.
+        Type:
+            `matched_keywords_cnt`: float
+        Return:
+            score
+            rtype: float
+        """
+
+        if matched_keywords_cnt == 0:
+            return 0.00
+        score = 0.50 + 0.50 / (15**2) * (matched_keywords_cnt) ** 2
+        return round(score, 2) if score <= 1.00 else 1.00
+
+    def _cached_evaluate(
+        self,
+        news_title: str,
+        news_body: str,
+        title_weight: float,
+        body_weight: float,
+        params: Tuple = tuple(),
+        snapshot: Optional[KeywordsSnapshot] = None,
+    ):
+        """
+        Results of `_evaluate`, which are looked up in self.cache first if any.
+        Results depend on keywords, weights and debug mode besides news,
+        and `params` tells results of different comparators apart.
+        `snapshot` is the keywords to use, so that a result is keyed by its own version
+        even if keywords are reloaded meanwhile. Default is the current one.
+        """
+
+        snapshot = snapshot or self._snapshot
+        normalizer = getattr(self, "normalizer", None)
+        if normalizer is not None:
+            news_title, news_body = normalizer(news_title), normalizer(news_body)
+        cache = getattr(self, "cache", None)
+        if cache is None:
+            return self._evaluate(
+                news_title, news_body, title_weight, body_weight, snapshot
+            )
+
+        key = cache.make_key(
+            news_title,
+            news_body,
+            snapshot.version,
+            (
+                type(self).__name__,
+                *params,
+                title_weight,
+                body_weight,
+                self.debug,
+                EVALUATE_FORMAT,
+            ),
+            normalized=not self.debug,
+        )
+        ret = cache.get(key)
+        if ret is None:
+            ret = self._evaluate(
+                news_title, news_body, title_weight, body_weight, snapshot
+            )
+            cache.put(key, ret)
+        return ret
+
+    def _normalized_version(self, version: str) -> str:
+        """
+        Keywords are normalized by self.normalizer if any,
+        so its signature is a part of version of keywords.
+        """
+
+        normalizer = getattr(self, "normalizer", None)
+        if normalizer is None:
+            return version
+        return hashlib.sha1(
+            f"{version}|{normalizer.signature}".encode("utf-8")
+        ).hexdigest()[:16]
+
+    def _init_keywords(self, watch_interval: Optional[float] = None):
+        """
+        Build the first snapshot of keywords, and watch keyword sources if it's asked.
+        """
+
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._stamp = self._sources_stamp()
+        self._snapshot = self._compile(self._sources_version())
+        if watch_interval:
+            self.watch(watch_interval)
+
+    def reload(self, force: Optional[bool] = False) -> bool:
+        """
+        Rebuild keywords and matcher from keyword sources, and swap them in atomically
+        if sources have changed. Calls of `classify` in progress finish with the old
+        version, and later calls use the new one. Nothing waits for the rebuild.
+
+        Args:
+            `force`: Whether to rebuild even if sources haven't changed.
+        Type:
+            `force`: bool
+        Return:
+            Whether keywords are replaced.
+            rtype: bool
+        """
+
+        with self._reload_lock:
+            self._stamp = self._sources_stamp()
+            version = self._sources_version()
+            old = self._snapshot
+            if version == old.version and not force:
+                return False
+            self._snapshot = self._compile(version)
+        logger.info(
+            f"Reload keywords of {type(self).__name__}: {old.version} -> {version}"
+        )
+        return True
+
+    def watch(self, interval: Optional[float] = 5.0):
+        """
+        Check keyword sources every `interval` seconds in a background thread,
+        and reload keywords once they change.
+        If a reload fails (e.g. a file is being written), the old keywords are kept
+        and it's tried again at the next change.
+        """
+
+        self.unwatch()
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=_watch,
+            args=(weakref.ref(self), interval, stop),
+            name=f"{type(self).__name__}-watcher",
+            daemon=True,
+        )
+        self._watcher = (thread, stop)
+        thread.start()
+
+    def unwatch(self):
+        """
+        Stop watching keyword sources.
+        """
+
+        if getattr(self, "_watcher", None) is not None:
+            thread, stop = self._watcher
+            stop.set()
+            thread.join()
+            self._watcher = None
+
+    def _sources_stamp(self) -> Tuple:
+        """
+        Modification time and size of each source file, which are cheap to check.
+        """
+
+        stamp = list()
+        for path in self._source_files():
+            try:
+                stat = os.stat(path)
+                stamp.append((path, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                stamp.append((path, None, None))
+        return tuple(stamp)
+
+    def keyword_tables(self) -> Tuple[str, Dict[str, Tuple[str]]]:
+        """
+        Version of keywords which `classify` uses now, and keywords of each category,
+        which keyword ids of `st.CountsStruct` point into.
+        """
+
+        snapshot = self._snapshot
+        return snapshot.version, self._category_keywords(snapshot)
+
+    @staticmethod
+    def _counts(
+        categories: List[str],
+        counts: List[Tuple[int, int, Dict[int, int]]],
+        version: str,
+    ) -> st.CountsStruct:
+        """
+        Raw counts of each category returned by `_evaluate` as st.CountsStruct.
+        """
+
+        keyword_ids = [tuple(sorted(c[2])) for c in counts]
+        return st.CountsStruct(
+            categories=tuple(categories),
+            title=tuple(c[0] for c in counts),
+            body=tuple(c[1] for c in counts),
+            keyword_ids=tuple(keyword_ids),
+            keyword_counts=tuple(
+                tuple(c[2][kid] for kid in kids) for c, kids in zip(counts, keyword_ids)
+            ),
+            version=version,
+        )
+
+    @property
+    def keywords_version(self) -> str:
+        """
+        Version of keywords which `classify` uses now.
+        """
+
+        return self._snapshot.version
+
+    @staticmethod
+    def _ordered_ids(counts: Dict[int, int]) -> Tuple[int, ...]:
+        """
+        Keyword ids ordered by count (descending), then by keyword id.
+        """
+
+        return tuple(sorted(counts, key=lambda kid: (-counts[kid], kid)))
+
+
+def _watch(ref: weakref.ref, interval: float, stop: threading.Event):
+    ## Only a weak reference is held, so the comparator can still be garbage collected.
+    while not stop.wait(interval):
+        comparator = ref()
+        if comparator is None:
+            return
+        try:
+            if comparator._sources_stamp() != comparator._stamp:
+                comparator.reload()
+        except Exception as e:
+            logger.warning(
+                f"Failed to reload keywords of {type(comparator).__name__}, "
+                f"so keep version {comparator.keywords_version}: {e}"
+            )
+        del comparator
+
 
 class BaseGenerator(ABC):
     @abstractmethod
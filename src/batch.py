@@ -0,0 +1,717 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Batch classification of news over a process pool.
+
+import functools
+import inspect
+import logging
+import os
+from array import array
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    as_completed,
+    wait,
+)
+from itertools import islice
+from multiprocessing import SimpleQueue
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+
+from src.FusedComparator import FusedComparator
+from src.utils import struct as st
+from src.utils.cache import ResultCache
+from src.utils.metrics import process_memory
+from src.utils.neardup import NearDuplicateIndex
+from src.utils.normalization import TextNormalizer
+
+logger = logging.getLogger(__name__)
+
+## Comparator and default classify arguments of a worker process.
+## They're set once by `_init_worker`, so every worker builds its comparator only once.
+_worker_reader = None
+_worker_classify_kwargs = dict()
+
+
+def _init_worker(
+    comparator_kwargs: Dict[str, Any],
+    classify_kwargs: Optional[Dict[str, Any]] = None,
+    pids: Optional[SimpleQueue] = None,
+):
+    global _worker_reader, _worker_classify_kwargs
+    _worker_reader = FusedComparator(**comparator_kwargs)
+    _worker_classify_kwargs = classify_kwargs or dict()
+    if pids is not None:
+        pids.put(os.getpid())
+
+
+def _classify_chunk(
+    chunk: List[Tuple[Any, str, str]],
+    classify_kwargs: Optional[Dict[str, Any]] = None,
+    reader: Optional[FusedComparator] = None,
+) -> List[Tuple[Any, st.SpecStruct]]:
+    ## In the current process, a local reader is given instead of the worker globals,
+    ## which would be replaced by another caller while a generator still runs.
+    reader = _worker_reader if reader is None else reader
+    classify_kwargs = (
+        _worker_classify_kwargs if classify_kwargs is None else classify_kwargs
+    )
+    return [
+        (id, reader.classify(news_title, news_body, **classify_kwargs))
+        for id, news_title, news_body in chunk
+    ]
+
+
+def _chunked(
+    items: Iterable[Tuple[Any, str, str]], chunksize: int
+) -> Iterator[List[Tuple[Any, str, str]]]:
+    if chunksize < 1:
+        raise ValueError(f"chunksize should be a positive integer, but got {chunksize}")
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ResultBatch(NamedTuple):
+    """
+    Classify results of n news of FusedComparator as columns of NumPy arrays,
+    which cost a few dozen bytes per news instead of a SpecStruct with lists of strings.
+    Ids of matched keywords of news i and category c are
+    hit_ids[hit_start[i * C + c] : hit_start[i * C + c + 1]], which are positions
+    in keyword_tables[version[i]][c], keywords of the category of version
+    `versions[version[i]]`. Keyword tables are kept once per version.
+    Batches sent back by workers leave keyword tables as None, which are resolved
+    by version in the current process instead of being pickled with every chunk.
+    """
+
+    categories: List[str]
+    versions: List[str]
+    keyword_tables: List[Optional[Tuple[Tuple[str, ...], ...]]]
+    ids: List[Any]  # (n,)
+    version: np.ndarray  # (n,) int32
+    flags: np.ndarray  # (n, C) bool
+    scores: np.ndarray  # (n, C) float64
+    hit_start: np.ndarray  # (n * C + 1,) int64
+    hit_ids: np.ndarray  # int32
+
+    @property
+    def size(self) -> int:
+        ## Not __len__, which NamedTuple uses as number of fields.
+        return len(self.ids)
+
+    def keyword_ids(self, i: int, category: str) -> np.ndarray:
+        c = self.categories.index(category)
+        j = i * len(self.categories) + c
+        return self.hit_ids[self.hit_start[j] : self.hit_start[j + 1]]
+
+    def keywords(self, i: int, category: str) -> List[str]:
+        """
+        Matched keywords of news i and the category, which are resolved on demand.
+        """
+
+        table = self.keyword_tables[self.version[i]][self.categories.index(category)]
+        return [table[k] for k in self.keyword_ids(i, category).tolist()]
+
+    def result(self, i: int) -> st.CompactSpecStruct:
+        """
+        Classify result of news i, whose repr and dict view are the same as SpecStruct.
+        """
+
+        nn, esg = (cate.value for cate in FusedComparator.CATEGORIES)
+        return st.CompactSpecStruct(
+            NN=bool(self.flags[i, 0]),
+            NN_SCORE=float(self.scores[i, 0]),
+            ESG=bool(self.flags[i, 1]),
+            ESG_SCORE=float(self.scores[i, 1]),
+            NN_KEYWORD_IDS=self.keyword_ids(i, nn).tolist(),
+            ESG_KEYWORD_IDS=self.keyword_ids(i, esg).tolist(),
+            keyword_tables=self.keyword_tables[self.version[i]],
+            KEYWORDS_VERSION=self.versions[self.version[i]],
+        )
+
+    def results(self) -> Iterator[Tuple[Any, st.CompactSpecStruct]]:
+        for i, id in enumerate(self.ids):
+            yield id, self.result(i)
+
+    @staticmethod
+    def from_results(
+        ids: Sequence[Any],
+        results: Sequence[st.CompactSpecStruct],
+        keep_tables: Optional[bool] = True,
+    ) -> "ResultBatch":
+        """
+        Collect compact results of FusedComparator into columns.
+
+        Args:
+            `ids`        : Id of each news.
+            `results`    : Results of `FusedComparator.classify_compact`.
+            `keep_tables`: Whether to keep keyword tables, or only their versions,
+                           e.g. to send the batch to another process.
+        Type:
+            `ids`        : sequence of Any
+            `results`    : sequence of st.CompactSpecStruct
+            `keep_tables`: bool
+        Return:
+            Columns of results.
+            rtype: ResultBatch
+        """
+
+        n = len(results)
+        versions, keyword_tables = list(), list()
+        version = np.zeros(n, dtype=np.int32)
+        flags = np.zeros((n, 2), dtype=bool)
+        scores = np.zeros((n, 2), dtype=np.float64)
+        hit_start = np.zeros(2 * n + 1, dtype=np.int64)
+        hit_ids = array("I")
+        for i, ret in enumerate(results):
+            version[i] = _table_index(
+                versions,
+                keyword_tables,
+                ret.KEYWORDS_VERSION,
+                ret.keyword_tables if keep_tables else None,
+            )
+            flags[i] = ret.NN, ret.ESG
+            scores[i] = ret.NN_SCORE, ret.ESG_SCORE
+            hit_start[2 * i + 1] = len(hit_ids) + ret.keyword_split
+            hit_ids.extend(ret.keyword_ids)
+            hit_start[2 * i + 2] = len(hit_ids)
+
+        return ResultBatch(
+            categories=[cate.value for cate in FusedComparator.CATEGORIES],
+            versions=versions,
+            keyword_tables=keyword_tables,
+            ids=list(ids),
+            version=version,
+            flags=flags,
+            scores=scores,
+            hit_start=hit_start,
+            hit_ids=np.frombuffer(hit_ids, dtype=np.uint32).astype(np.int32),
+        )
+
+    @staticmethod
+    def concat(batches: Iterable["ResultBatch"]) -> "ResultBatch":
+        """
+        Concatenate batches in order. Keyword tables of the same version are kept once.
+        """
+
+        batches = list(batches)
+        versions, keyword_tables = list(), list()
+        parts = {name: list() for name in ("version", "flags", "scores", "hit_ids")}
+        hit_start, offset = [np.zeros(1, dtype=np.int64)], 0
+        for batch in batches:
+            remap = np.array(
+                [
+                    _table_index(versions, keyword_tables, v, tables)
+                    for v, tables in zip(batch.versions, batch.keyword_tables)
+                ],
+                dtype=np.int32,
+            )
+            parts["version"].append(
+                remap[batch.version] if len(remap) else batch.version
+            )
+            parts["flags"].append(batch.flags)
+            parts["scores"].append(batch.scores)
+            parts["hit_ids"].append(batch.hit_ids)
+            hit_start.append(batch.hit_start[1:] + offset)
+            offset += batch.hit_start[-1]
+
+        empty = ResultBatch.from_results(list(), list())
+        return ResultBatch(
+            categories=empty.categories,
+            versions=versions,
+            keyword_tables=keyword_tables,
+            ids=[id for batch in batches for id in batch.ids],
+            hit_start=np.concatenate(hit_start),
+            **{
+                name: np.concatenate([getattr(empty, name)] + part)
+                for name, part in parts.items()
+            },
+        )
+
+
+def _table_index(
+    versions: List[str],
+    keyword_tables: List[Optional[Tuple[Tuple[str, ...], ...]]],
+    version: str,
+    tables: Optional[Tuple[Tuple[str, ...], ...]],
+) -> int:
+    ## Index of the keyword tables, which are appended if they're new.
+    ## A version is a content hash of keywords, so tables are only looked up by version.
+    for i, v in enumerate(versions):
+        if v == version:
+            if keyword_tables[i] is None:
+                keyword_tables[i] = tables
+            return i
+    versions.append(version)
+    keyword_tables.append(tables)
+    return len(versions) - 1
+
+
+def _classify_columns_chunk(
+    chunk: List[Tuple[Any, str, str]],
+    classify_kwargs: Optional[Dict[str, Any]] = None,
+    reader: Optional[FusedComparator] = None,
+) -> ResultBatch:
+    ## Please Check in the `_classify_chunk` function for the local reader.
+    ## Workers only send back versions of keyword tables, which cost more than results.
+    keep_tables = reader is not None
+    reader = _worker_reader if reader is None else reader
+    classify_kwargs = (
+        _worker_classify_kwargs if classify_kwargs is None else classify_kwargs
+    )
+    return ResultBatch.from_results(
+        [id for id, _, _ in chunk],
+        [
+            reader.classify_compact(news_title, news_body, **classify_kwargs)
+            for _, news_title, news_body in chunk
+        ],
+        keep_tables=keep_tables,
+    )
+
+
+def _compact_tables(
+    reader: FusedComparator,
+) -> Tuple[str, Tuple[Tuple[str, ...], ...]]:
+    ## Version and keyword tables that results of `classify_compact` refer to.
+    version, category_keywords = reader.keyword_tables()
+    return version, tuple(
+        category_keywords[cate.value] for cate in FusedComparator.CATEGORIES
+    )
+
+
+def _worker_compact_tables(_=None) -> Tuple[str, Tuple[Tuple[str, ...], ...]]:
+    return _compact_tables(_worker_reader)
+
+
+class WorkerPool:
+    """A pool of worker processes, each of which holds a FusedComparator"""
+
+    def __init__(
+        self,
+        processes: Optional[int] = None,
+        keywords: Optional[Dict[str, Union[str, List[str]]]] = None,
+        load_default: Optional[bool] = True,
+        debug: Optional[bool] = False,
+        cache: Optional[ResultCache] = None,
+        neardup: Optional[NearDuplicateIndex] = None,
+        normalizer: Optional[TextNormalizer] = None,
+        keep_counts: Optional[bool] = False,
+        shared_tables: Optional[bool] = True,
+    ):
+        """
+        Init WorkerPool.
+        Keywords are compiled into an artifact once in the current process before
+        workers start, so workers only load it instead of compiling it one by one.
+        With shared_tables, workers scan directly over matcher tables memory-mapped from
+        the artifact. Pages of a file mapping are shared by all processes on a node,
+        so memory of tables doesn't grow with the number of workers.
+        Memory of every worker can be measured by the `memory` function.
+
+        Args:
+            `processes`    : Number of worker processes. Default is os.cpu_count().
+            `keywords`     : Please Check in the `FusedComparator.__init__` function.
+            `load_default` : Please Check in the `FusedComparator.__init__` function.
+            `debug`        : Please Check in the `FusedComparator.__init__` function.
+            `cache`        : Please Check in the `classify_iter` function.
+            `neardup`      : Please Check in the `classify_iter` function.
+            `normalizer`   : Please Check in the `FusedComparator.__init__` function.
+            `keep_counts`  : Please Check in the `FusedComparator.__init__` function.
+            `shared_tables`: Please Check in the `SimpleComparator.__init__` function.
+        Type:
+            `processes`    : integer
+            `keywords`     : dict [string, string or list of string]
+            `load_default` : bool
+            `debug`        : bool
+            `cache`        : ResultCache
+            `neardup`      : NearDuplicateIndex
+            `normalizer`   : TextNormalizer
+            `keep_counts`  : bool
+            `shared_tables`: bool
+        Return:
+            None
+        """
+
+        self.processes = processes or os.cpu_count() or 1
+        self.shared_tables = shared_tables
+
+        ## Only to compile the artifact. Workers build their own comparators from it.
+        reader = FusedComparator(
+            keywords=keywords,
+            load_default=load_default,
+            normalizer=normalizer,
+            shared_tables=shared_tables,
+        )
+        ## Keyword tables of each version, which label columns sent back by workers.
+        version, tables = _compact_tables(reader)
+        self._keyword_tables = {version: tables}
+
+        comparator_kwargs = {
+            "keywords": keywords,
+            "load_default": load_default,
+            "debug": debug,
+            "cache": cache,
+            "neardup": neardup,
+            "normalizer": normalizer,
+            "keep_counts": keep_counts,
+            "shared_tables": shared_tables,
+        }
+        self._pid_queue = SimpleQueue()
+        self._pids = list()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            initializer=_init_worker,
+            initargs=(comparator_kwargs, None, self._pid_queue),
+        )
+        logger.debug(
+            f"Start a pool of {self.processes} processes (shared_tables: {shared_tables})."
+        )
+
+    def _map(
+        self,
+        func: Callable,
+        items: Iterable[Tuple[Any, str, str]],
+        chunksize: int,
+        ordered: bool,
+        classify_kwargs: Dict[str, Any],
+    ) -> Iterator[Any]:
+        ## Results of func of each chunk. Only a few chunks per process are in flight.
+        submit = functools.partial(
+            self._executor.submit, func, classify_kwargs=classify_kwargs
+        )
+        chunks = _chunked(items, chunksize)
+        max_pending = 2 * self.processes
+
+        if ordered:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(submit(chunk))
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+        else:
+            pending = set()
+            for chunk in chunks:
+                pending.add(submit(chunk))
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            for future in as_completed(pending):
+                yield future.result()
+
+    def classify_iter(
+        self,
+        items: Iterable[Tuple[Any, str, str]],
+        chunksize: int = 64,
+        ordered: bool = True,
+        threshold: float = 0.50,
+        title_weight: float = 0.3,
+        body_weight: float = 0.1,
+    ) -> Iterator[Tuple[Any, st.SpecStruct]]:
+        """
+        Classify lots of news by workers of the pool.
+        The pool can be fed many times, and workers are kept between calls.
+
+        Args:
+            Please Check in the `classify_iter` function.
+        Return:
+            id and classify result of each news.
+            rtype: iterator of Tuple[Any, st.SpecStruct]
+        """
+
+        classify_kwargs = {
+            "threshold": threshold,
+            "title_weight": title_weight,
+            "body_weight": body_weight,
+        }
+        for rets in self._map(
+            _classify_chunk, items, chunksize, ordered, classify_kwargs
+        ):
+            yield from rets
+
+    def classify_columns(
+        self,
+        items: Iterable[Tuple[Any, str, str]],
+        chunksize: int = 64,
+        threshold: float = 0.50,
+        title_weight: float = 0.3,
+        body_weight: float = 0.1,
+    ) -> ResultBatch:
+        """
+        Classify lots of news by workers of the pool into columns in order of items.
+
+        Args:
+            Please Check in the `classify_iter` function.
+        Return:
+            Classify results of all news.
+            rtype: ResultBatch
+        """
+
+        classify_kwargs = {
+            "threshold": threshold,
+            "title_weight": title_weight,
+            "body_weight": body_weight,
+        }
+        batch = ResultBatch.concat(
+            self._map(_classify_columns_chunk, items, chunksize, True, classify_kwargs)
+        )
+        for i, version in enumerate(batch.versions):
+            batch.keyword_tables[i] = self._resolve_tables(version)
+        return batch
+
+    def _resolve_tables(self, version: str) -> Tuple[Tuple[str, ...], ...]:
+        ## Keywords may be reloaded by workers, so tables of an unknown version are
+        ## fetched from a worker once.
+        if version not in self._keyword_tables:
+            for _ in range(self.processes):
+                worker_version, tables = self._executor.submit(
+                    _worker_compact_tables
+                ).result()
+                self._keyword_tables.setdefault(worker_version, tables)
+                if version in self._keyword_tables:
+                    break
+            else:
+                raise ValueError(f"Keyword tables of version {version} are unknown.")
+        return self._keyword_tables[version]
+
+    @property
+    def pids(self) -> List[int]:
+        """
+        Process ids of workers started so far.
+        Workers are started on demand, so there may be fewer than `processes`.
+        """
+
+        while not self._pid_queue.empty():
+            self._pids.append(self._pid_queue.get())
+        return sorted(self._pids)
+
+    def memory(self) -> List[Dict[str, Optional[int]]]:
+        """
+        Resident memory of every worker.
+        Please Check in the `src.utils.metrics.process_memory` function.
+
+        Return:
+            pid, rss, pss, shared and private memory (bytes) of each worker.
+            rtype: list of dict [string, integer]
+        """
+
+        ret = list()
+        for pid in self.pids:
+            try:
+                ret.append({"pid": pid, **process_memory(pid)})
+            except OSError as e:
+                logger.warning(f"Failed to measure memory of worker {pid}: {e}")
+        return ret
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._pid_queue.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def classify_iter(
+    items: Iterable[Tuple[Any, str, str]],
+    processes: Optional[int] = None,
+    chunksize: int = 64,
+    ordered: bool = True,
+    keywords: Optional[Dict[str, Union[str, List[str]]]] = None,
+    load_default: Optional[bool] = True,
+    debug: Optional[bool] = False,
+    cache: Optional[ResultCache] = None,
+    neardup: Optional[NearDuplicateIndex] = None,
+    normalizer: Optional[TextNormalizer] = None,
+    keep_counts: Optional[bool] = False,
+    shared_tables: Optional[bool] = False,
+    threshold: float = 0.50,
+    title_weight: float = 0.3,
+    body_weight: float = 0.1,
+) -> Iterator[Tuple[Any, st.SpecStruct]]:
+    """
+    Classify lots of news by FusedComparator over a process pool.
+    Items are read lazily, and only a few chunks per process are in flight at any time,
+    so it can be fed by a generator over a corpus larger than memory.
+
+    Args:
+        `items`        : Iterable of (id, news_title, news_body).
+        `processes`    : Number of worker processes. Default is os.cpu_count().
+                         If it's 1, news is classified in the current process.
+        `chunksize`    : Number of news sent to a worker at once.
+        `ordered`      : Whether to yield results in order of items or as they complete.
+        `keywords`     : Please Check in the `FusedComparator.__init__` function.
+        `load_default` : Please Check in the `FusedComparator.__init__` function.
+        `debug`        : Please Check in the `FusedComparator.__init__` function.
+        `cache`        : Please Check in the `FusedComparator.__init__` function.
+                         Every worker process has its own memory tier,
+                         and they share the disk tier if any.
+        `neardup`      : Please Check in the `FusedComparator.__init__` function.
+                         Every worker process starts from a copy of the index.
+        `normalizer`   : Please Check in the `FusedComparator.__init__` function.
+        `keep_counts`  : Please Check in the `FusedComparator.__init__` function.
+                         Counts can be added into a CountStore (src/utils/counts.py).
+        `shared_tables`: Please Check in the `WorkerPool.__init__` function.
+                         It's ignored if processes is 1.
+        `threshold`    : Please Check in the `FusedComparator.classify` function.
+        `title_weight` : Please Check in the `FusedComparator.classify` function.
+        `body_weight`  : Please Check in the `FusedComparator.classify` function.
+    Type:
+        `items`        : iterable of Tuple[Any, string, string]
+        `processes`    : integer
+        `chunksize`    : integer
+        `ordered`      : bool
+        `keywords`     : dict [string, string or list of string]
+        `load_default` : bool
+        `debug`        : bool
+        `cache`        : ResultCache
+        `neardup`      : NearDuplicateIndex
+        `normalizer`   : TextNormalizer
+        `keep_counts`  : bool
+        `shared_tables`: bool
+        `threshold`    : float
+        `title_weight` : float
+        `body_weight`  : float
+    Return:
+        id and classify result of each news.
+        rtype: iterator of Tuple[Any, st.SpecStruct]
+    """
+
+    comparator_kwargs = {
+        "keywords": keywords,
+        "load_default": load_default,
+        "debug": debug,
+        "cache": cache,
+        "neardup": neardup,
+        "normalizer": normalizer,
+        "keep_counts": keep_counts,
+    }
+    classify_kwargs = {
+        "threshold": threshold,
+        "title_weight": title_weight,
+        "body_weight": body_weight,
+    }
+    processes = processes or os.cpu_count() or 1
+
+    if processes == 1:
+        reader = FusedComparator(**comparator_kwargs)
+        for chunk in _chunked(items, chunksize):
+            yield from _classify_chunk(chunk, classify_kwargs, reader)
+        return
+
+    logger.debug(f"Classify news by {processes} processes (chunksize: {chunksize}).")
+    with WorkerPool(
+        processes, shared_tables=shared_tables, **comparator_kwargs
+    ) as pool:
+        yield from pool.classify_iter(items, chunksize, ordered, **classify_kwargs)
+
+
+def classify_batch(
+    items: Iterable[Tuple[Any, str, str]], columns: Optional[bool] = False, **kwargs
+) -> Union[List[Tuple[Any, st.SpecStruct]], ResultBatch]:
+    """
+    Classify lots of news and collect all results.
+
+    Args:
+        `items`  : Iterable of (id, news_title, news_body).
+        `columns`: Whether to collect results into columns of a ResultBatch,
+                   which is much smaller than a list of structs for lots of news.
+                   Please Check in the `classify_columns` function.
+        Other arguments: Please Check in the `classify_iter` function,
+                         or in the `classify_columns` function if `columns` is True,
+                         which raises ValueError for arguments it doesn't support.
+    Type:
+        `items`  : iterable of Tuple[Any, string, string]
+        `columns`: bool
+    Return:
+        id and classify result of each news, or a ResultBatch if `columns` is True.
+        rtype: list of Tuple[Any, st.SpecStruct] or ResultBatch
+    """
+
+    if columns:
+        ## Options of classify_iter that columns don't keep, e.g. debug or keep_counts.
+        unsupported = sorted(
+            set(kwargs) - set(inspect.signature(classify_columns).parameters)
+        )
+        if unsupported:
+            raise ValueError(
+                f"{', '.join(unsupported)} isn't supported with columns=True. "
+                "Please use classify_iter for them."
+            )
+        return classify_columns(items, **kwargs)
+    return list(classify_iter(items, **kwargs))
+
+
+def classify_columns(
+    items: Iterable[Tuple[Any, str, str]],
+    processes: Optional[int] = None,
+    chunksize: int = 64,
+    keywords: Optional[Dict[str, Union[str, List[str]]]] = None,
+    load_default: Optional[bool] = True,
+    cache: Optional[ResultCache] = None,
+    neardup: Optional[NearDuplicateIndex] = None,
+    normalizer: Optional[TextNormalizer] = None,
+    shared_tables: Optional[bool] = False,
+    threshold: float = 0.50,
+    title_weight: float = 0.3,
+    body_weight: float = 0.1,
+) -> ResultBatch:
+    """
+    Classify lots of news and collect all results into columns in order of items.
+    Workers send back columns of each chunk instead of structs,
+    so neither transfer nor results in memory hold lists of keyword strings.
+    Debug details and counts aren't kept. Please use `classify_iter` for them.
+
+    Args:
+        Please Check in the `classify_iter` function.
+    Return:
+        Classify results of all news.
+        rtype: ResultBatch
+    """
+
+    comparator_kwargs = {
+        "keywords": keywords,
+        "load_default": load_default,
+        "cache": cache,
+        "neardup": neardup,
+        "normalizer": normalizer,
+    }
+    classify_kwargs = {
+        "threshold": threshold,
+        "title_weight": title_weight,
+        "body_weight": body_weight,
+    }
+    processes = processes or os.cpu_count() or 1
+
+    if processes == 1:
+        reader = FusedComparator(**comparator_kwargs)
+        return ResultBatch.concat(
+            _classify_columns_chunk(chunk, classify_kwargs, reader)
+            for chunk in _chunked(items, chunksize)
+        )
+
+    with WorkerPool(
+        processes, shared_tables=shared_tables, **comparator_kwargs
+    ) as pool:
+        return pool.classify_columns(items, chunksize, **classify_kwargs)
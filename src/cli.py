@@ -0,0 +1,153 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Command line entry point to classify a news corpus.
+#              e.g. python -m src.cli data/dowjones --output results.jsonl --processes 4
+
+import argparse
+import json
+import logging
+import sys
+import time
+from typing import List, Optional
+
+from src.batch import classify_iter
+from src.FusedComparator import FusedComparator
+from src.utils.cache import ResultCache
+from src.utils.corpus import iter_articles
+from src.utils.counts import CountStore
+from src.utils.hits import HitMatrixWriter
+from src.utils.normalization import TextNormalizer
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Classify Dow Jones news into negative/esg news."
+    )
+    parser.add_argument(
+        "sources",
+        nargs="+",
+        help="Directories, glob patterns, .json files or .jsonl dumps of news.",
+    )
+    parser.add_argument(
+        "--output", "-o", default="-", help="Output .jsonl file. Default is stdout."
+    )
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=64)
+    parser.add_argument(
+        "--shared_tables",
+        action="store_true",
+        help="Let worker processes scan matcher tables memory-mapped from one artifact, "
+        "so that they share a single copy of them.",
+    )
+    parser.add_argument(
+        "--unordered",
+        action="store_true",
+        help="Write results as they complete instead of in order of news.",
+    )
+    parser.add_argument("--prefetch", type=int, default=64)
+    parser.add_argument("--threshold", type=float, default=0.50)
+    parser.add_argument("--title_weight", type=float, default=0.3)
+    parser.add_argument("--body_weight", type=float, default=0.1)
+    parser.add_argument("--debug", action="store_true")
+    parser.add_argument(
+        "--normalize",
+        action="store_true",
+        help="Strip html, decode entities, fold full-width characters and whitespace.",
+    )
+    parser.add_argument(
+        "--to_traditional",
+        action="store_true",
+        help="Map simplified into traditional Chinese as well (with --normalize).",
+    )
+    parser.add_argument(
+        "--cache",
+        default=None,
+        help="Sqlite file of result cache, so that repeated news isn't scanned again.",
+    )
+    parser.add_argument(
+        "--cache_entries",
+        type=int,
+        default=100000,
+        help="Max number of results cached in memory of each process.",
+    )
+    parser.add_argument(
+        "--counts",
+        default=None,
+        help="Directory to store raw keyword counts of news, so that they can be "
+        "scored again under other thresholds and weights (python -m src.utils.counts).",
+    )
+    parser.add_argument(
+        "--hit_matrix",
+        default=None,
+        help="Directory to write a sparse news x keyword count matrix, "
+        "which can be loaded by src.utils.hits.load.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+
+    args = parse_args(argv)
+    normalizer = (
+        TextNormalizer(to_traditional=args.to_traditional) if args.normalize else None
+    )
+    sinks = list()
+    if args.counts:
+        sinks.append(CountStore(args.counts))
+    if args.hit_matrix:
+        sinks.append(HitMatrixWriter(args.hit_matrix))
+    if sinks:
+        ## Workers build keywords from the same sources, so they're of the same version.
+        reader = FusedComparator(normalizer=normalizer)
+        for sink in sinks:
+            sink.register(reader)
+
+    items = (
+        ((article.ArticleId, article.PubDateTime), article.Headline, article.BodyHtml)
+        for article in iter_articles(args.sources, prefetch=args.prefetch)
+    )
+    results = classify_iter(
+        items,
+        processes=args.processes,
+        chunksize=args.chunksize,
+        ordered=not args.unordered,
+        debug=args.debug,
+        cache=(
+            ResultCache(max_entries=args.cache_entries, path=args.cache)
+            if args.cache
+            else None
+        ),
+        normalizer=normalizer,
+        keep_counts=bool(sinks),
+        shared_tables=args.shared_tables,
+        threshold=args.threshold,
+        title_weight=args.title_weight,
+        body_weight=args.body_weight,
+    )
+
+    fo = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    start = time.time()
+    cnt = 0
+    try:
+        for (article_id, pub_datetime), ret in results:
+            record = {"ArticleId": article_id, "PubDateTime": pub_datetime}
+            record.update(ret.__2dict__())
+            fo.write(json.dumps(record, ensure_ascii=False) + "\n")
+            for sink in sinks:
+                sink.add(article_id, ret.COUNTS)
+            cnt += 1
+    finally:
+        if fo is not sys.stdout:
+            fo.close()
+        for sink in sinks:
+            sink.close()
+
+    logger.info(f"Classified {cnt} news in {time.time() - start:.2f} seconds.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,630 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Asyncio HTTP service of news classification with micro-batching.
+#              e.g. python -m src.service --port 8080 --processes 4
+
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import signal
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from src import batch
+from src.FusedComparator import FusedComparator
+from src.utils.metrics import SIZE_BUCKETS, MetricsRegistry
+from src.utils.normalization import TextNormalizer
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+    411: "Length Required",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class Overloaded(Exception):
+    """Raised when too many news are waiting to be classified"""
+
+
+class TooLarge(Exception):
+    """Raised when a request has more news than can ever be pending at once"""
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _classify_dicts(
+    chunk: List[Tuple[Any, str, str]],
+    classify_kwargs: Optional[Dict[str, Any]] = None,
+    reader: Optional[FusedComparator] = None,
+) -> List[Dict]:
+    """
+    Classify a chunk in a worker, and convert results to dict before they're sent back.
+    Please Check in the `batch._classify_chunk` function for arguments.
+    """
+
+    return [
+        ret.__2dict__()
+        for _, ret in batch._classify_chunk(chunk, classify_kwargs, reader)
+    ]
+
+
+def _warmup(_, reader: Optional[FusedComparator] = None) -> int:
+    batch._classify_chunk([(None, "", "")], reader=reader)
+    ## Keep the worker busy for a while, so that other warmups go to other workers.
+    time.sleep(0.05)
+    return os.getpid()
+
+
+class MicroBatcher:
+    """Group concurrent requests into batches, which are classified by an executor"""
+
+    def __init__(
+        self,
+        executor: Executor,
+        func: Callable[[List[Any]], List[Any]],
+        max_batch_size: Optional[int] = 64,
+        max_delay: Optional[float] = 0.005,
+        max_pending: Optional[int] = 1024,
+        max_inflight: Optional[int] = 2,
+        registry: Optional[MetricsRegistry] = None,
+    ):
+        """
+        Init MicroBatcher. `run` must be running in the event loop.
+
+        Args:
+            `executor`      : Where batches are processed, e.g. a process pool.
+            `func`          : Process a batch of items, and return a result of each item.
+            `max_batch_size`: Max number of items of a batch.
+            `max_delay`     : Latency budget (seconds) of batching. A batch is dispatched
+                              once it's full or its oldest item has waited `max_delay`.
+            `max_pending`   : Max number of items queued or being processed.
+                              More items are rejected by `Overloaded`, and a request
+                              of more items than this is rejected by `TooLarge`.
+            `max_inflight`  : Max number of batches being processed at once,
+                              e.g. 2 per worker, so that workers never wait for batches.
+            `registry`      : Metrics of batches. None to disable.
+        Type:
+            `executor`      : concurrent.futures.Executor
+            `func`          : Callable
+            `max_batch_size`: integer
+            `max_delay`     : float
+            `max_pending`   : integer
+            `max_inflight`  : integer
+            `registry`      : MetricsRegistry
+        Return:
+            None
+        """
+
+        self.executor = executor
+        self.func = func
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.max_inflight = max_inflight
+        self.registry = registry
+
+        self.pending = 0
+        self.rejected = 0
+        self._queue = deque()  # (item, future, enqueue time)
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(max_inflight)
+
+    async def submit(self, items: List[Any]) -> List[Any]:
+        """
+        Process items in batches with items of other requests.
+
+        Args:
+            `items`: Items of a request.
+        Type:
+            `items`: list
+        Return:
+            Result of each item.
+            rtype: list
+        """
+
+        ## Such a request would never be accepted, so retrying it doesn't help.
+        if len(items) > self.max_pending:
+            raise TooLarge(
+                f"A request has {len(items)} news, but at most {self.max_pending} news "
+                "are accepted at once. Please split the request."
+            )
+        if self.pending + len(items) > self.max_pending:
+            self.rejected += len(items)
+            raise Overloaded(
+                f"{self.pending} news are pending, so {len(items)} news are rejected."
+            )
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        futures = [loop.create_future() for _ in items]
+        self._queue.extend((item, future, now) for item, future in zip(items, futures))
+        self.pending += len(items)
+        self._wakeup.set()
+        return await asyncio.gather(*futures)
+
+    async def run(self):
+        """
+        Collect items into batches and dispatch them, until it's cancelled.
+        """
+
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            ## Wait for more items until the batch is full or the budget is spent.
+            deadline = self._queue[0][2] + self.max_delay
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            await self._slots.acquire()
+            size = min(len(self._queue), self.max_batch_size)
+            entries = [self._queue.popleft() for _ in range(size)]
+            asyncio.ensure_future(self._dispatch(entries))
+
+    async def _dispatch(self, entries: List[Tuple[Any, asyncio.Future, float]]):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            results = await loop.run_in_executor(
+                self.executor, self.func, [item for item, _, _ in entries]
+            )
+            for (_, future, _), result in zip(entries, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future, _ in entries:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+            self.pending -= len(entries)
+
+        if self.registry is not None:
+            self.registry.histogram(
+                "service_batch_size", "Number of news of a batch.", SIZE_BUCKETS
+            ).observe(len(entries))
+            self.registry.histogram(
+                "service_batch_seconds", "Time to classify a batch."
+            ).observe(loop.time() - start)
+            queue_seconds = self.registry.histogram(
+                "service_queue_seconds", "Time news waits to be dispatched."
+            )
+            for _, _, enqueued in entries:
+                queue_seconds.observe(start - enqueued)
+
+
+class ClassifierService:
+    """An HTTP service of FusedComparator over warm worker processes"""
+
+    def __init__(
+        self,
+        processes: Optional[int] = None,
+        max_batch_size: Optional[int] = 64,
+        max_delay: Optional[float] = 0.005,
+        max_pending: Optional[int] = 1024,
+        max_body_size: Optional[int] = 16 * 2**20,
+        comparator_kwargs: Optional[Dict[str, Any]] = None,
+        classify_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Init ClassifierService.
+
+        Routes:
+            POST /classify      : {"title": str, "body": str} -> SpecStruct.
+            POST /classify/bulk : {"news": [{"id": Any, "title": str, "body": str}, ...]}
+                                  -> {"results": [{"id": Any, **SpecStruct}, ...]}.
+            GET  /health        : Status of the service.
+            GET  /metrics       : Prometheus text, or json by "/metrics?format=json".
+        Busy service answers 503 with "Retry-After" instead of queueing without bound.
+
+        Args:
+            `processes`        : Number of worker processes, each of which holds a warm
+                                 FusedComparator. If it's 1, a worker thread is used instead.
+                                 Default is os.cpu_count().
+            `max_batch_size`   : Please Check in the `MicroBatcher.__init__` function.
+            `max_delay`        : Please Check in the `MicroBatcher.__init__` function.
+            `max_pending`      : Please Check in the `MicroBatcher.__init__` function.
+            `max_body_size`    : Max bytes of a request body.
+            `comparator_kwargs`: Please Check in the `FusedComparator.__init__` function.
+            `classify_kwargs`  : Please Check in the `FusedComparator.classify` function.
+        Type:
+            `processes`        : integer
+            `max_batch_size`   : integer
+            `max_delay`        : float
+            `max_pending`      : integer
+            `max_body_size`    : integer
+            `comparator_kwargs`: dict
+            `classify_kwargs`  : dict
+        Return:
+            None
+        """
+
+        self.processes = processes or os.cpu_count() or 1
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.max_body_size = max_body_size
+        self.comparator_kwargs = comparator_kwargs or dict()
+        self.classify_kwargs = classify_kwargs or dict()
+        self.registry = MetricsRegistry()
+
+        self.status = "starting"
+        self.executor = None
+        self.batcher = None
+        self.server = None
+        self._batcher_task = None
+        self._started = None
+
+    async def start(
+        self, host: Optional[str] = "127.0.0.1", port: Optional[int] = 8080
+    ) -> asyncio.AbstractServer:
+        """
+        Start workers, warm up their comparators and listen on host:port.
+        Port 0 picks a free port, which can be read from `self.port`.
+        """
+
+        if self.processes == 1:
+            ## The comparator is kept by the service instead of globals of batch,
+            ## which are shared by everything else in the current process.
+            reader = FusedComparator(**self.comparator_kwargs)
+            self.executor = ThreadPoolExecutor(1)
+            warmup = functools.partial(_warmup, reader=reader)
+            classify_dicts = functools.partial(
+                _classify_dicts, classify_kwargs=self.classify_kwargs, reader=reader
+            )
+        else:
+            self.executor = ProcessPoolExecutor(
+                self.processes,
+                initializer=batch._init_worker,
+                initargs=(self.comparator_kwargs, self.classify_kwargs),
+            )
+            warmup, classify_dicts = _warmup, _classify_dicts
+
+        loop = asyncio.get_running_loop()
+        started = time.time()
+        pids = await asyncio.gather(
+            *[
+                loop.run_in_executor(self.executor, warmup, i)
+                for i in range(self.processes)
+            ]
+        )
+        logger.info(
+            f"{len(set(pids))} workers are warmed up in {time.time() - started:.2f} seconds."
+        )
+
+        self.batcher = MicroBatcher(
+            self.executor,
+            classify_dicts,
+            max_batch_size=self.max_batch_size,
+            max_delay=self.max_delay,
+            max_pending=self.max_pending,
+            max_inflight=2 * self.processes,
+            registry=self.registry,
+        )
+        self._batcher_task = asyncio.ensure_future(self.batcher.run())
+        self.server = await asyncio.start_server(self._handle, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self._started = time.time()
+        self.status = "ok"
+        logger.info(f"Listen on http://{host}:{self.port}")
+        return self.server
+
+    async def close(self):
+        """
+        Stop accepting connections, finish pending news and stop workers.
+        """
+
+        self.status = "stopping"
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        while self.batcher is not None and self.batcher.pending:
+            await asyncio.sleep(0.01)
+        if self._batcher_task is not None:
+            self._batcher_task.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+    async def serve_forever(
+        self, host: Optional[str] = "127.0.0.1", port: Optional[int] = 8080
+    ):
+        """
+        Serve until SIGINT or SIGTERM.
+        """
+
+        await self.start(host, port)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await stop.wait()
+        logger.info("Stopping.")
+        await self.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Serve HTTP/1.1 requests of a connection, which is kept alive by default.
+        """
+
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                keep_alive = True
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                    headers = dict()
+                    while True:
+                        line = await reader.readline()
+                        if line in (b"\r\n", b"\n", b""):
+                            break
+                        name, _, value = line.decode("latin-1").partition(":")
+                        headers[name.strip().lower()] = value.strip()
+                    connection = headers.get("connection", "").lower()
+                    keep_alive = (
+                        connection != "close"
+                        if version == "HTTP/1.1"
+                        else connection == "keep-alive"
+                    )
+                    body = await self._read_body(reader, headers)
+                    status, payload, content_type, extra = await self._route(
+                        method, target, body
+                    )
+                except HTTPError as e:
+                    ## The rest of the request can't be trusted, so the connection is closed.
+                    keep_alive = e.status not in (411, 413) and keep_alive
+                    status, payload, content_type, extra = _error(e.status, str(e))
+                except ValueError as e:
+                    keep_alive = False
+                    status, payload, content_type, extra = _error(400, str(e))
+
+                headers = {
+                    "Content-Type": content_type,
+                    "Content-Length": str(len(payload)),
+                    "Connection": "keep-alive" if keep_alive else "close",
+                    **extra,
+                }
+                writer.write(
+                    (
+                        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                        + "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+                        + "\r\n"
+                    ).encode("latin-1")
+                    + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_body(
+        self, reader: asyncio.StreamReader, headers: Dict[str, str]
+    ) -> bytes:
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HTTPError(411, "Chunked request body is not supported.")
+        length = int(headers.get("content-length", 0))
+        if length > self.max_body_size:
+            raise HTTPError(413, f"Request body is larger than {self.max_body_size}.")
+        return await reader.readexactly(length) if length else b""
+
+    async def _route(
+        self, method: str, target: str, body: bytes
+    ) -> Tuple[int, bytes, str, Dict[str, str]]:
+        url = urlsplit(target)
+        routes = {
+            "/classify": ("POST", self._classify),
+            "/classify/bulk": ("POST", self._classify_bulk),
+            "/health": ("GET", self._health),
+            "/metrics": ("GET", self._metrics),
+        }
+        if url.path not in routes:
+            return _error(404, f"{url.path} is not found.")
+        allowed, handler = routes[url.path]
+        if method != allowed:
+            return _error(405, f"{method} is not allowed on {url.path}.")
+
+        start = time.perf_counter()
+        try:
+            ret = await handler(body, url.query)
+        except Overloaded as e:
+            ret = _error(503, str(e), {"Retry-After": "1"})
+        except TooLarge as e:
+            ret = _error(413, str(e))
+        except HTTPError as e:
+            ret = _error(e.status, str(e))
+        except Exception as e:
+            logger.exception(f"Failed to serve {method} {url.path}")
+            ret = _error(500, f"{type(e).__name__}: {e}")
+        self.registry.histogram(
+            "service_request_seconds", "Latency of requests.", route=url.path
+        ).observe(time.perf_counter() - start)
+        return ret
+
+    async def _classify(self, body: bytes, query: str):
+        news = _parse_news(_loads(body))
+        (ret,) = await self.batcher.submit([(None, news["title"], news["body"])])
+        return _json(ret)
+
+    async def _classify_bulk(self, body: bytes, query: str):
+        data = _loads(body)
+        news = data.get("news") if isinstance(data, dict) else data
+        if not isinstance(news, list):
+            raise HTTPError(400, 'Bulk request should be {"news": [...]}.')
+        news = [_parse_news(n) for n in news]
+        results = await self.batcher.submit(
+            [(None, n["title"], n["body"]) for n in news]
+        )
+        return _json(
+            {"results": [{"id": n.get("id"), **ret} for n, ret in zip(news, results)]}
+        )
+
+    async def _health(self, body: bytes, query: str):
+        ret = {
+            "status": self.status,
+            "processes": self.processes,
+            "pending": self.batcher.pending if self.batcher else 0,
+            "max_pending": self.max_pending,
+            "uptime": time.time() - self._started if self._started else 0.0,
+        }
+        if self.status != "ok":
+            return _error(503, self.status, body=ret)
+        return _json(ret)
+
+    async def _metrics(self, body: bytes, query: str):
+        pending = self.batcher.pending if self.batcher else 0
+        rejected = self.batcher.rejected if self.batcher else 0
+        if "format=json" in query:
+            data = json.loads(self.registry.to_json())
+            data.update({"pending": pending, "rejected": rejected})
+            return _json(data)
+
+        name = self.registry.namespace
+        text = self.registry.to_prometheus() + (
+            f"# HELP {name}_service_pending News queued or being classified.\n"
+            f"# TYPE {name}_service_pending gauge\n"
+            f"{name}_service_pending {pending}\n"
+            f"# HELP {name}_service_rejected_total News rejected by backpressure.\n"
+            f"# TYPE {name}_service_rejected_total counter\n"
+            f"{name}_service_rejected_total {rejected}\n"
+        )
+        return 200, text.encode("utf-8"), "text/plain; version=0.0.4", {}
+
+
+def _loads(body: bytes) -> Any:
+    try:
+        return json.loads(body.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise HTTPError(400, f"Invalid json: {e}")
+
+
+def _parse_news(news: Any) -> Dict[str, Any]:
+    if not isinstance(news, dict):
+        raise HTTPError(400, "News should be an object with title and body.")
+    for field in ("title", "body"):
+        if not isinstance(news.get(field, ""), str):
+            raise HTTPError(400, f"{field} should be a string.")
+    return {
+        "id": news.get("id"),
+        "title": news.get("title", ""),
+        "body": news.get("body", ""),
+    }
+
+
+def _json(data: Any, status: int = 200, extra: Optional[Dict[str, str]] = None):
+    payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    return status, payload, "application/json; charset=utf-8", extra or dict()
+
+
+def _error(
+    status: int,
+    message: str,
+    extra: Optional[Dict[str, str]] = None,
+    body: Optional[Dict] = None,
+):
+    return _json(dict(body or dict(), error=message), status, extra)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="HTTP service to classify news into negative/esg news."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--max_batch_size", type=int, default=64)
+    parser.add_argument(
+        "--max_delay_ms",
+        type=float,
+        default=5.0,
+        help="Latency budget of batching in milliseconds.",
+    )
+    parser.add_argument(
+        "--max_pending",
+        type=int,
+        default=1024,
+        help="Max number of news queued or being classified before answering 503.",
+    )
+    parser.add_argument(
+        "--watch_interval",
+        type=float,
+        default=None,
+        help="Seconds between checks of keyword files, which are reloaded once changed.",
+    )
+    parser.add_argument("--threshold", type=float, default=0.50)
+    parser.add_argument("--title_weight", type=float, default=0.3)
+    parser.add_argument("--body_weight", type=float, default=0.1)
+    parser.add_argument("--debug", action="store_true")
+    parser.add_argument(
+        "--normalize",
+        action="store_true",
+        help="Strip html, decode entities, fold full-width characters and whitespace.",
+    )
+    parser.add_argument(
+        "--to_traditional",
+        action="store_true",
+        help="Map simplified into traditional Chinese as well (with --normalize).",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+
+    args = parse_args(argv)
+    service = ClassifierService(
+        processes=args.processes,
+        max_batch_size=args.max_batch_size,
+        max_delay=args.max_delay_ms / 1000,
+        max_pending=args.max_pending,
+        comparator_kwargs={
+            "debug": args.debug,
+            "watch_interval": args.watch_interval,
+            "normalizer": (
+                TextNormalizer(to_traditional=args.to_traditional)
+                if args.normalize
+                else None
+            ),
+        },
+        classify_kwargs={
+            "threshold": args.threshold,
+            "title_weight": args.title_weight,
+            "body_weight": args.body_weight,
+        },
+    )
+    asyncio.run(service.serve_forever(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
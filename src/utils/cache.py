@@ -0,0 +1,220 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Content-hash result cache, so that repeated news is answered without scanning.
+
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text: str) -> str:
+    """
+    Normalize news before hashing. Only surrounding whitespace and line endings are unified,
+    which don't change matched keywords as long as keywords don't start or end with whitespace.
+    """
+
+    return text.replace("\r\n", "\n").strip()
+
+
+class ResultCache:
+    """An LRU cache in memory with an optional persistent tier in sqlite"""
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = 100000,
+        path: Optional[str] = None,
+        max_disk_entries: Optional[int] = 1000000,
+    ):
+        """
+        Init ResultCache.
+        Results of news are keyed by a hash of normalized title and body,
+        version of keywords and scoring parameters.
+        Memory tier evicts least recently used results when it's full.
+        Disk tier, if any, keeps results across runs and is shared by processes.
+
+        Args:
+            `max_entries`     : Max number of results in memory.
+            `path`            : Sqlite file of disk tier. None to disable it.
+            `max_disk_entries`: Max number of results on disk.
+                                Least recently used results are removed once it's exceeded.
+        Type:
+            `max_entries`     : integer
+            `path`            : string
+            `max_disk_entries`: integer
+        Return:
+            None
+        """
+
+        if max_entries < 1:
+            raise ValueError(
+                f"max_entries should be a positive integer, but got {max_entries}"
+            )
+
+        self.max_entries = max_entries
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self._init()
+
+    def _init(self):
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._puts = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False, isolation_level=None
+            )
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, atime REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS results_atime ON results (atime)"
+            )
+
+    @staticmethod
+    def make_key(
+        news_title: str,
+        news_body: str,
+        version: str,
+        params: Sequence[Any],
+        normalized: Optional[bool] = True,
+    ) -> str:
+        """
+        Key of a result.
+
+        Args:
+            `news_title`: Title of news.
+            `news_body` : Content of news.
+            `version`   : Version of keywords, e.g. `SimpleComparator.keywords_version`.
+            `params`    : Anything else results depend on, e.g. comparator, weights, debug.
+            `normalized`: Whether to normalize news before hashing. Debug details point into
+                          the original news, so news shouldn't be normalized in debug mode.
+        Type:
+            `news_title`: string
+            `news_body` : string
+            `version`   : string
+            `params`    : sequence
+            `normalized`: bool
+        Return:
+            key
+            rtype: string
+        """
+
+        if normalized:
+            news_title, news_body = normalize(news_title), normalize(news_body)
+        h = hashlib.sha1()
+        for part in (version, repr(tuple(params)), news_title, news_body):
+            data = part.encode("utf-8")
+            h.update(len(data).to_bytes(8, "little"))
+            h.update(data)
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Result of the key, or None if it's not cached.
+        """
+
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE results SET atime = ? WHERE key = ?", (time.time(), key)
+                    )
+                    value = pickle.loads(row[0])
+                    self._remember(key, value)
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Any):
+        """
+        Cache the result of the key. None can't be cached.
+        """
+
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, value, atime) VALUES (?, ?, ?)",
+                    (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time()),
+                )
+                self._puts += 1
+                ## Trim disk tier once in a while instead of on every put.
+                if self.max_disk_entries and self._puts % 1000 == 0:
+                    self._trim()
+
+    def _remember(self, key: str, value: Any):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _trim(self):
+        (n,) = self._db.execute("SELECT COUNT(*) FROM results").fetchone()
+        if n > self.max_disk_entries:
+            self._db.execute(
+                "DELETE FROM results WHERE key IN "
+                "(SELECT key FROM results ORDER BY atime LIMIT ?)",
+                (n - self.max_disk_entries,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                if self.max_disk_entries:
+                    self._trim()
+                self._db.close()
+                self._db = None
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._memory
+
+    def __repr__(self):
+        return (
+            f"ResultCache(entries={len(self)}, hits={self.hits}, "
+            f"disk_hits={self.disk_hits}, misses={self.misses}, path={self.path})"
+        )
+
+    def __getstate__(self):
+        ## Only settings are sent to other processes, which open their own tiers.
+        return (self.max_entries, self.path, self.max_disk_entries)
+
+    def __setstate__(self, state):
+        self.max_entries, self.path, self.max_disk_entries = state
+        self._init()
@@ -0,0 +1,174 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Streaming reader of Dow Jones news corpus.
+
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+from itertools import islice
+from typing import Iterator, List, Optional, Union
+
+from src.utils import struct as st
+from src.utils import utility as ut
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = (".json", ".jsonl")
+
+## Sentinel that the background reader is done.
+_DONE = object()
+
+
+def iter_files(sources: Union[str, List[str]]) -> Iterator[str]:
+    """
+    Expand sources into news files lazily.
+
+    Args:
+        `sources`: Directories, glob patterns or files.
+                   A directory is walked recursively for .json and .jsonl files.
+    Type:
+        `sources`: string or list of string
+    Return:
+        File paths.
+        rtype: iterator of string
+    """
+
+    if ut.is_string(sources):
+        sources = [sources]
+    elif not ut.is_list_of_string(sources):
+        raise ValueError(f"Expected string or list of string, but got {type(sources)}")
+
+    for source in sources:
+        if os.path.isdir(source):
+            for dirpath, dirnames, filenames in os.walk(source):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.endswith(EXTENSIONS):
+                        yield os.path.join(dirpath, filename)
+        elif glob.has_magic(source):
+            for file in sorted(glob.iglob(source, recursive=True)):
+                if os.path.isfile(file):
+                    yield file
+        elif os.path.isfile(source):
+            yield source
+        else:
+            raise FileNotFoundError(
+                f"{source} is neither a directory, a file nor a glob."
+            )
+
+
+def _read_files(
+    sources: Union[str, List[str]],
+    buffer: queue.Queue,
+    stop: threading.Event,
+    lines_per_chunk: int,
+):
+    """
+    Read raw news into buffer on a background thread.
+    A .json file is put as one chunk, and a .jsonl file is put as chunks of lines.
+    """
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        for file in iter_files(sources):
+            if file.endswith(".jsonl"):
+                with open(file, "r", encoding="utf-8-sig") as f:
+                    while True:
+                        lines = list(islice(f, lines_per_chunk))
+                        if not lines or not put((file, lines)):
+                            break
+            else:
+                with open(file, "r", encoding="utf-8-sig") as f:
+                    if not put((file, [f.read()])):
+                        break
+            if stop.is_set():
+                break
+    except BaseException as e:
+        put(e)
+    put(_DONE)
+
+
+def _to_article(data: dict) -> st.ArticleStruct:
+    return st.ArticleStruct(
+        ArticleId=data.get("ArticleId", ""),
+        Headline=data.get("Headline") or "",
+        BodyHtml=data.get("BodyHtml") or "",
+        PubDateTime=data.get("PubDateTime", ""),
+    )
+
+
+def iter_articles(
+    sources: Union[str, List[str]],
+    prefetch: Optional[int] = 64,
+    lines_per_chunk: Optional[int] = 256,
+) -> Iterator[st.ArticleStruct]:
+    """
+    Stream news from Dow Jones json files and jsonl dumps.
+    Files are read on a background thread into a bounded buffer,
+    so memory is bounded no matter how large the corpus is.
+
+    Args:
+        `sources`        : Directories, glob patterns, .json files (one news or a list of
+                           news per file) or .jsonl files (one news per line).
+                           Anything but objects of news is skipped with a warning.
+        `prefetch`       : Max number of chunks read ahead by the background thread.
+        `lines_per_chunk`: Number of lines of .jsonl file in a chunk.
+    Type:
+        `sources`        : string or list of string
+        `prefetch`       : integer
+        `lines_per_chunk`: integer
+    Return:
+        Lightweight news records.
+        rtype: iterator of st.ArticleStruct
+    """
+
+    buffer = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    reader = threading.Thread(
+        target=_read_files,
+        args=(sources, buffer, stop, lines_per_chunk),
+        name="corpus-reader",
+        daemon=True,
+    )
+    reader.start()
+
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+
+            file, texts = item
+            for text in texts:
+                if not text.strip():
+                    continue
+                try:
+                    data = json.loads(text)
+                except json.JSONDecodeError as e:
+                    logger.warning(f"Skip broken news in {file}: {e}")
+                    continue
+                ## A .json export may hold a list of news.
+                for news in data if isinstance(data, list) else [data]:
+                    if not isinstance(news, dict):
+                        logger.warning(
+                            f"Skip broken news in {file}: "
+                            f"expect an object, but got {type(news).__name__}"
+                        )
+                        continue
+                    yield _to_article(news)
+    finally:
+        ## Stop the background thread if the caller stops early.
+        stop.set()
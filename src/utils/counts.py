@@ -0,0 +1,627 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Store raw keyword counts of classified news, and score them again
+#              under other thresholds and weights without scanning.
+#              e.g. python -m src.utils.counts sweep counts/ --thresholds 0.5 0.6 0.7
+
+import argparse
+import functools
+import json
+import logging
+import os
+import tempfile
+import threading
+from array import array
+from itertools import product
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from src.base import BaseComparator
+from src.utils import struct as st
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+META_NAME = "meta.json"
+KEYWORDS_NAME = "keywords.json"
+CHUNK_NAME = "counts_{:06d}.npz"
+
+## score_func of comparators doesn't depend on the instance.
+default_score_func = functools.partial(BaseComparator.score_func, None)
+
+
+class CountRecords(NamedTuple):
+    """
+    Raw counts of n news of C categories as flat arrays.
+    Ids of matched keywords of news i and category c are
+    hit_ids[hit_start[i * C + c] : hit_start[i * C + c + 1]],
+    which are positions in keywords of the category of version `versions[version[i]]`,
+    and hit_counts of the same slice are their counts in title and body.
+    """
+
+    categories: List[str]
+    versions: List[str]
+    ids: np.ndarray  # (n,) string
+    version: np.ndarray  # (n,) int32
+    title: np.ndarray  # (n, C) int32
+    body: np.ndarray  # (n, C) int32
+    hit_start: np.ndarray  # (n * C + 1,) int64
+    hit_ids: np.ndarray  # int32
+    hit_counts: np.ndarray  # int32
+
+    @property
+    def size(self) -> int:
+        ## Not __len__, which NamedTuple uses as number of fields.
+        return len(self.ids)
+
+    def keyword_ids(self, i: int, category: str) -> np.ndarray:
+        c = self.categories.index(category)
+        j = i * len(self.categories) + c
+        return self.hit_ids[self.hit_start[j] : self.hit_start[j + 1]]
+
+
+class CountStore:
+    """An append-only store of raw keyword counts in chunks of NumPy arrays"""
+
+    def __init__(self, path: str, chunk_size: Optional[int] = 100000):
+        """
+        Init CountStore.
+        A record of news holds its id, version of keywords, and title count,
+        body count, and ids and counts of matched keywords of each category
+        (Please Check in `st.CountsStruct`). Records are buffered in flat arrays
+        and written into a new .npz chunk every `chunk_size` records,
+        so neither a dict nor an object per news is kept.
+        An existing store is appended to. Only one process should write a store at once.
+
+        Args:
+            `path`      : Directory of the store.
+            `chunk_size`: Number of records of a chunk.
+        Type:
+            `path`      : string
+            `chunk_size`: integer
+        Return:
+            None
+        """
+
+        if chunk_size < 1:
+            raise ValueError(
+                f"chunk_size should be a positive integer, but got {chunk_size}"
+            )
+
+        self.path = path
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+
+        meta_path = os.path.join(path, META_NAME)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta["format_version"] != FORMAT_VERSION:
+                raise ValueError(
+                    f"{path} is not a count store of format version {FORMAT_VERSION}."
+                )
+            with open(os.path.join(path, KEYWORDS_NAME), "r", encoding="utf-8") as f:
+                self._keywords = json.load(f)
+        else:
+            os.makedirs(path, exist_ok=True)
+            meta = {
+                "format_version": FORMAT_VERSION,
+                "categories": None,
+                "versions": list(),
+                "chunks": list(),
+            }
+            self._keywords = dict()
+        self.categories = meta["categories"]
+        self.versions = meta["versions"]
+        self._chunks = meta["chunks"]
+        self._version_index = {v: i for i, v in enumerate(self.versions)}
+        self._reset_buffer()
+
+    def __repr__(self):
+        return (
+            f"CountStore(records={len(self)}, categories={self.categories}, "
+            f"versions={len(self.versions)}, path={self.path})"
+        )
+
+    def __len__(self) -> int:
+        return sum(chunk["records"] for chunk in self._chunks) + len(self._ids)
+
+    def __enter__(self) -> "CountStore":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _reset_buffer(self):
+        self._ids = list()
+        self._version = array("i")
+        self._title = array("i")
+        self._body = array("i")
+        self._hit_lens = array("q")
+        self._hit_ids = array("i")
+        self._hit_counts = array("i")
+
+    def _set_categories(self, categories: Sequence[str]):
+        if self.categories is None:
+            self.categories = list(categories)
+        elif list(categories) != self.categories:
+            raise ValueError(
+                f"Categories of the store are {self.categories}, but got {list(categories)}."
+            )
+
+    def register(self, comparator: BaseComparator):
+        """
+        Keep keywords of the current version of a comparator,
+        so that keyword ids of its records can be resolved into keywords.
+        """
+
+        version, category_keywords = comparator.keyword_tables()
+        with self._lock:
+            self._set_categories(list(category_keywords))
+            if version in self._keywords:
+                return
+            self._keywords[version] = {
+                cate: list(keywords) for cate, keywords in category_keywords.items()
+            }
+            self._save_json(KEYWORDS_NAME, self._keywords)
+
+    def keywords(self, version: str) -> Dict[str, List[str]]:
+        """
+        Keywords of each category of a version, or KeyError if it's never registered.
+        """
+
+        return self._keywords[version]
+
+    def add(self, id: Any, counts: st.CountsStruct):
+        """
+        Add a record of news, e.g. `SpecStruct.COUNTS` of a comparator with `keep_counts`.
+
+        Args:
+            `id`    : Id of news, e.g. ArticleId. It's stored as string.
+            `counts`: Raw counts of news.
+        Type:
+            `id`    : Any
+            `counts`: st.CountsStruct
+        Return:
+            None
+        """
+
+        if counts is None:
+            raise ValueError(
+                "No counts in the result. Please classify with keep_counts."
+            )
+
+        with self._lock:
+            self._set_categories(counts.categories)
+            vidx = self._version_index.get(counts.version)
+            if vidx is None:
+                if counts.version not in self._keywords:
+                    logger.warning(
+                        f"Keywords of version {counts.version} aren't registered, "
+                        f"so its keyword ids can't be resolved."
+                    )
+                vidx = self._version_index[counts.version] = len(self.versions)
+                self.versions.append(counts.version)
+
+            self._ids.append(str(id))
+            self._version.append(vidx)
+            self._title.extend(counts.title)
+            self._body.extend(counts.body)
+            for keyword_ids in counts.keyword_ids:
+                self._hit_lens.append(len(keyword_ids))
+                self._hit_ids.extend(keyword_ids)
+            for keyword_counts in counts.keyword_counts:
+                self._hit_counts.extend(keyword_counts)
+            if len(self._ids) >= self.chunk_size:
+                self._flush()
+
+    def flush(self):
+        """
+        Write buffered records into a new chunk.
+        """
+
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._ids:
+            return
+        n, c = len(self._ids), len(self.categories)
+        hit_start = np.zeros(n * c + 1, dtype=np.int64)
+        np.cumsum(np.frombuffer(self._hit_lens, dtype=np.int64), out=hit_start[1:])
+        arrays = {
+            "ids": np.array(self._ids, dtype=str),
+            "version": np.frombuffer(self._version, dtype=np.int32),
+            "title": np.frombuffer(self._title, dtype=np.int32).reshape(n, c),
+            "body": np.frombuffer(self._body, dtype=np.int32).reshape(n, c),
+            "hit_start": hit_start,
+            "hit_ids": np.frombuffer(self._hit_ids, dtype=np.int32),
+            "hit_counts": np.frombuffer(self._hit_counts, dtype=np.int32),
+        }
+
+        name = CHUNK_NAME.format(len(self._chunks))
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fo:
+                np.savez(fo, **arrays)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, os.path.join(self.path, name))
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+        ## A chunk is visible to readers only once meta lists it.
+        self._chunks.append({"name": name, "records": n})
+        self._save_json(
+            META_NAME,
+            {
+                "format_version": FORMAT_VERSION,
+                "categories": self.categories,
+                "versions": self.versions,
+                "chunks": self._chunks,
+            },
+        )
+        self._reset_buffer()
+        logger.debug(f"Write {n} records into {name}.")
+
+    def _save_json(self, name: str, data: Any):
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fo:
+                json.dump(data, fo, ensure_ascii=False)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, os.path.join(self.path, name))
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def close(self):
+        self.flush()
+
+    def records(self, latest: Optional[bool] = False) -> CountRecords:
+        """
+        All records in the store, including buffered ones.
+
+        Args:
+            `latest`: Whether to keep only the latest record of each id,
+                      e.g. after news is classified again by new keywords.
+        Type:
+            `latest`: bool
+        Return:
+            Records as flat arrays.
+            rtype: CountRecords
+        """
+
+        self.flush()
+        c = len(self.categories or list())
+        parts = {name: list() for name in CountRecords._fields[2:]}
+        offset = 0
+        for chunk in self._chunks:
+            with np.load(os.path.join(self.path, chunk["name"])) as data:
+                for name in parts:
+                    part = data[name]
+                    if name == "hit_start":
+                        ## Drop the leading 0 of every chunk but the first.
+                        part = part[1:] if parts[name] else part
+                        part = part + offset
+                    parts[name].append(part)
+                offset += len(data["hit_ids"])
+
+        if not self._chunks:
+            records = CountRecords(
+                categories=list(self.categories or list()),
+                versions=list(self.versions),
+                ids=np.zeros(0, dtype=str),
+                version=np.zeros(0, dtype=np.int32),
+                title=np.zeros((0, c), dtype=np.int32),
+                body=np.zeros((0, c), dtype=np.int32),
+                hit_start=np.zeros(1, dtype=np.int64),
+                hit_ids=np.zeros(0, dtype=np.int32),
+                hit_counts=np.zeros(0, dtype=np.int32),
+            )
+        else:
+            records = CountRecords(
+                categories=list(self.categories),
+                versions=list(self.versions),
+                **{name: np.concatenate(part) for name, part in parts.items()},
+            )
+        return _latest(records) if latest else records
+
+
+def _latest(records: CountRecords) -> CountRecords:
+    ## The last occurrence of each id is the first one in reversed order.
+    n, c = records.size, len(records.categories)
+    _, first = np.unique(records.ids[::-1], return_index=True)
+    keep = np.sort(n - 1 - first)
+    slots = (keep[:, None] * c + np.arange(c)).ravel()
+    starts, ends = records.hit_start[slots], records.hit_start[slots + 1]
+    lens = ends - starts
+    hit_start = np.zeros(len(slots) + 1, dtype=np.int64)
+    np.cumsum(lens, out=hit_start[1:])
+    hits = np.repeat(starts - hit_start[:-1], lens) + np.arange(hit_start[-1])
+    return records._replace(
+        ids=records.ids[keep],
+        version=records.version[keep],
+        title=records.title[keep],
+        body=records.body[keep],
+        hit_start=hit_start,
+        hit_ids=records.hit_ids[hits],
+        hit_counts=records.hit_counts[hits],
+    )
+
+
+class _Pairs(NamedTuple):
+    ## Distinct (title count, body count) of a category, and which pair each news has.
+    title: np.ndarray
+    body: np.ndarray
+    inverse: np.ndarray
+    counts: np.ndarray
+
+
+def _pairs(title: np.ndarray, body: np.ndarray) -> _Pairs:
+    base = int(body.max()) + 1 if len(body) else 1
+    codes, inverse, counts = np.unique(
+        title.astype(np.int64) * base + body,
+        return_inverse=True,
+        return_counts=True,
+    )
+    return _Pairs(codes // base, codes % base, inverse.ravel(), counts)
+
+
+def _pair_scores(
+    pairs: _Pairs,
+    title_weight: float,
+    body_weight: float,
+    score_func: Callable[[float], float],
+) -> np.ndarray:
+    ## Same arithmetic as `_evaluate` of comparators, so scores are exactly the same.
+    weight = round(title_weight / body_weight, 2)
+    matched_keywords_cnt = weight * pairs.title.astype(np.float64) + pairs.body
+    return np.array(
+        [score_func(float(cnt)) for cnt in matched_keywords_cnt], dtype=np.float64
+    )
+
+
+def rescore(
+    records: CountRecords,
+    threshold: float = 0.50,
+    title_weight: float = 0.3,
+    body_weight: float = 0.1,
+    score_func: Optional[Callable[[float], float]] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Scores and flags of every news under a threshold and weights,
+    which are the same as `classify` of comparators would give.
+    `score_func` is called once per distinct (title count, body count) of a category
+    instead of once per news, so that any score function is vectorized.
+
+    Args:
+        `records`     : Records of a CountStore.
+        `threshold`   : Please Check in the `FusedComparator.classify` function.
+        `title_weight`: Please Check in the `FusedComparator.classify` function.
+        `body_weight` : Please Check in the `FusedComparator.classify` function.
+        `score_func`  : Score of a count of matched keywords.
+                        Default is `score_func` of comparators.
+    Type:
+        `records`     : CountRecords
+        `threshold`   : float
+        `title_weight`: float
+        `body_weight` : float
+        `score_func`  : callable
+    Return:
+        Scores (n, C) and flags (n, C) in order of `records.categories`.
+        rtype: dict {"scores": np.ndarray of float64, "flags": np.ndarray of bool}
+    """
+
+    score_func = score_func or default_score_func
+    scores = np.zeros(records.title.shape, dtype=np.float64)
+    for c in range(len(records.categories)):
+        pairs = _pairs(records.title[:, c], records.body[:, c])
+        pair_scores = _pair_scores(pairs, title_weight, body_weight, score_func)
+        scores[:, c] = pair_scores[pairs.inverse]
+    return {"scores": scores, "flags": scores > threshold}
+
+
+def align_labels(
+    records: CountRecords, labels: Dict[Any, Dict[str, bool]]
+) -> Dict[str, np.ndarray]:
+    """
+    Labels of news keyed by id as arrays aligned with records.
+
+    Args:
+        `records`: Records of a CountStore.
+        `labels` : Labels of each news id, e.g. {"ID": {"NN": True, "ESG": False}}.
+                   A category is keyed by its name (e.g. "NN") or value (e.g. "Negative_News").
+    Type:
+        `records`: CountRecords
+        `labels` : dict [Any, dict [string, bool]]
+    Return:
+        1 (positive), 0 (negative) or -1 (unlabelled) of each news
+        of each category which has any label.
+        rtype: dict [string, np.ndarray of int8]
+    """
+
+    names = {cate.value: cate.name for cate in st.NewsCategory}
+    labels = {str(id): label for id, label in labels.items()}
+    ret = dict()
+    for category in records.categories:
+        aligned = np.full(records.size, -1, dtype=np.int8)
+        for i, id in enumerate(records.ids.tolist()):
+            label = labels.get(id)
+            if label is None:
+                continue
+            value = label.get(category, label.get(names.get(category)))
+            if value is not None:
+                aligned[i] = int(bool(value))
+        if (aligned >= 0).any():
+            ret[category] = aligned
+    return ret
+
+
+def sweep(
+    records: CountRecords,
+    thresholds: Iterable[float],
+    title_weights: Iterable[float],
+    body_weights: Iterable[float],
+    labels: Optional[Dict[str, np.ndarray]] = None,
+    score_func: Optional[Callable[[float], float]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Flag rate of each category under every combination of thresholds and weights,
+    and precision and recall if labels are given.
+    News is grouped by distinct (title count, body count) once, so a combination
+    costs as much as the number of distinct pairs instead of the number of news.
+
+    Args:
+        `records`      : Records of a CountStore.
+        `thresholds`   : Thresholds to evaluate.
+        `title_weights`: Title weights to evaluate.
+        `body_weights` : Body weights to evaluate.
+        `labels`       : Labels of each category aligned with records.
+                         Please Check in the `align_labels` function.
+        `score_func`   : Please Check in the `rescore` function.
+    Type:
+        `records`      : CountRecords
+        `thresholds`   : iterable of float
+        `title_weights`: iterable of float
+        `body_weights` : iterable of float
+        `labels`       : dict [string, np.ndarray of int8]
+        `score_func`   : callable
+    Return:
+        A row for each category, threshold and weights, with "flagged" and "flag_rate",
+        and "labelled", "precision", "recall" and "f1" if the category is labelled.
+        rtype: list of dict
+    """
+
+    score_func = score_func or default_score_func
+    thresholds = list(thresholds)
+    weights = list(product(title_weights, body_weights))
+    n = records.size
+    rows = list()
+    for c, category in enumerate(records.categories):
+        pairs = _pairs(records.title[:, c], records.body[:, c])
+        label = None if labels is None else labels.get(category)
+        if label is not None:
+            label = np.asarray(label)
+            positives = np.bincount(
+                pairs.inverse, weights=label == 1, minlength=len(pairs.counts)
+            )
+            labelled = np.bincount(
+                pairs.inverse, weights=label >= 0, minlength=len(pairs.counts)
+            )
+            total_positives = positives.sum()
+
+        for title_weight, body_weight in weights:
+            pair_scores = _pair_scores(pairs, title_weight, body_weight, score_func)
+            for threshold in thresholds:
+                mask = pair_scores > threshold
+                flagged = int(pairs.counts[mask].sum())
+                row = {
+                    "category": category,
+                    "threshold": threshold,
+                    "title_weight": title_weight,
+                    "body_weight": body_weight,
+                    "flagged": flagged,
+                    "flag_rate": flagged / n if n else 0.0,
+                }
+                if label is not None:
+                    tp = positives[mask].sum()
+                    predicted = labelled[mask].sum()
+                    precision = tp / predicted if predicted else 0.0
+                    recall = tp / total_positives if total_positives else 0.0
+                    row.update(
+                        {
+                            "labelled": int(labelled.sum()),
+                            "precision": float(precision),
+                            "recall": float(recall),
+                            "f1": (
+                                float(2 * precision * recall / (precision + recall))
+                                if precision + recall
+                                else 0.0
+                            ),
+                        }
+                    )
+                rows.append(row)
+    return rows
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Score stored keyword counts under other thresholds and weights."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    show = subparsers.add_parser("show", help="Show a summary of a count store.")
+    show.add_argument("store")
+
+    sweep = subparsers.add_parser(
+        "sweep", help="Evaluate a grid of thresholds and weights."
+    )
+    sweep.add_argument("store")
+    sweep.add_argument("--thresholds", type=float, nargs="+", default=[0.50])
+    sweep.add_argument("--title_weights", type=float, nargs="+", default=[0.3])
+    sweep.add_argument("--body_weights", type=float, nargs="+", default=[0.1])
+    sweep.add_argument(
+        "--labels",
+        default=None,
+        help=".jsonl of labels, e.g. "
+        '{"ArticleId": "ID", "NN": true, "ESG": false} per line.',
+    )
+    sweep.add_argument("--id_field", default="ArticleId")
+    sweep.add_argument(
+        "--latest",
+        action="store_true",
+        help="Keep only the latest record of each news.",
+    )
+    sweep.add_argument(
+        "--output", "-o", default=None, help="Output .json file. Default is stdout."
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+
+    args = parse_args(argv)
+    store = CountStore(args.store)
+
+    if args.command == "show":
+        records = store.records()
+        print(f"{records.size} records of {records.categories}")
+        for vidx, version in enumerate(records.versions):
+            print(f"    {version}: {int((records.version == vidx).sum())} records")
+        return
+
+    records = store.records(latest=args.latest)
+    labels = None
+    if args.labels:
+        with open(args.labels, "r", encoding="utf-8") as f:
+            lines = (json.loads(line) for line in f if line.strip())
+            labels = align_labels(
+                records, {line.pop(args.id_field): line for line in lines}
+            )
+    rows = sweep(
+        records,
+        args.thresholds,
+        args.title_weights,
+        args.body_weights,
+        labels=labels,
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fo:
+            json.dump(rows, fo, ensure_ascii=False, indent=4)
+        return
+    keys = list(rows[0]) if rows else list()
+    print("\t".join(keys))
+    for row in rows:
+        print(
+            "\t".join(
+                f"{row[k]:.4f}" if isinstance(row[k], float) else str(row[k])
+                for k in keys
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,562 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Sparse news x keyword count matrix in CSR format,
+#              whose merged matrix.npz can be loaded by scipy.sparse.load_npz.
+#              e.g. python -m src.utils.hits export counts/ hits/
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+from array import array
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from src.base import BaseComparator
+from src.utils import struct as st
+from src.utils.counts import CountRecords, CountStore
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+META_NAME = "meta.json"
+MATRIX_NAME = "matrix.npz"
+ARTICLES_NAME = "articles.npy"
+KEYWORDS_NAME = "keywords.json"
+CHUNK_NAME = "hits_{:06d}.npz"
+
+
+class HitMatrix(NamedTuple):
+    """
+    Count of keyword j in title and body of news i is
+    data[k] for k in range(indptr[i], indptr[i + 1]) if indices[k] == j.
+    """
+
+    data: np.ndarray  # int32
+    indices: np.ndarray  # int32, sorted in each row
+    indptr: np.ndarray  # int64
+    shape: tuple
+    articles: np.ndarray  # (n,) string, id of each row
+    keywords: List[str]  # keyword of each column
+    categories: Dict[str, List[int]]  # columns of keywords of each category
+
+    def to_scipy(self):
+        """
+        The matrix as scipy.sparse.csr_matrix, which requires scipy (pip install scipy).
+        """
+
+        try:
+            from scipy import sparse
+        except ImportError:
+            raise ImportError(
+                "scipy is required to build csr_matrix (pip install scipy)."
+            )
+        return sparse.csr_matrix(
+            (self.data, self.indices, self.indptr), shape=self.shape
+        )
+
+
+class HitMatrixWriter:
+    """Build a news x keyword count matrix incrementally in chunks"""
+
+    def __init__(self, path: str, chunk_size: Optional[int] = 100000):
+        """
+        Init HitMatrixWriter.
+        Rows are news in order of `add`, and columns are keywords. A keyword has
+        the same column across categories and versions of keywords, and new keywords
+        get new columns, so columns are stable as long as the matrix is appended to.
+        Rows are buffered in flat arrays and written into a CSR chunk every
+        `chunk_size` news, so neither a dict nor an object per news is kept.
+        Chunks are merged into `matrix.npz` only by `merge`, and `load` reads
+        the rest of them after it.
+
+        Files in `path`:
+            matrix.npz   : CSR matrix in the format of scipy.sparse.save_npz.
+            articles.npy : Id of each row of matrix.npz.
+            hits_*.npz   : Chunks of rows which aren't merged yet, in the same format.
+            meta.json    : Chunks in order of rows.
+            keywords.json: Keyword of each column and columns of each category.
+
+        Args:
+            `path`      : Directory of the matrix. An existing matrix is appended to.
+            `chunk_size`: Number of news of a chunk.
+        Type:
+            `path`      : string
+            `chunk_size`: integer
+        Return:
+            None
+        """
+
+        if chunk_size < 1:
+            raise ValueError(
+                f"chunk_size should be a positive integer, but got {chunk_size}"
+            )
+
+        self.path = path
+        self.chunk_size = chunk_size
+        os.makedirs(path, exist_ok=True)
+
+        meta_path = os.path.join(path, META_NAME)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta["format_version"] != FORMAT_VERSION:
+                raise ValueError(
+                    f"{path} is not a hit matrix of format version {FORMAT_VERSION}."
+                )
+            with open(os.path.join(path, KEYWORDS_NAME), "r", encoding="utf-8") as f:
+                columns = json.load(f)
+            self.keywords = columns["keywords"]
+            self.categories = {
+                cate: set(cols) for cate, cols in columns["categories"].items()
+            }
+            self._chunks = meta["chunks"]
+            self._next_chunk = meta.get("next_chunk", len(self._chunks))
+        else:
+            self.keywords = list()
+            self.categories = dict()
+            self._chunks = list()
+            self._next_chunk = 0
+        self._columns = {keyword: col for col, keyword in enumerate(self.keywords)}
+        ## Columns of keywords of every registered (version, category) in a flat table,
+        ## and where each of them starts.
+        self._table = array("i")
+        self._offsets = dict()
+        self._reset_buffer()
+
+    def __repr__(self):
+        return (
+            f"HitMatrixWriter(columns={len(self.keywords)}, "
+            f"chunks={len(self._chunks)}, path={self.path})"
+        )
+
+    def __enter__(self) -> "HitMatrixWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _reset_buffer(self):
+        self._ids = list()
+        self._seg_rows = array("q")
+        self._seg_starts = array("q")
+        self._seg_lens = array("q")
+        self._kids = array("i")
+        self._vals = array("i")
+
+    def register(self, comparator: BaseComparator):
+        """
+        Assign columns to keywords of the current version of a comparator.
+        """
+
+        self._register(*comparator.keyword_tables())
+
+    def _register(self, version: str, category_keywords: Dict[str, Sequence[str]]):
+        if version in self._offsets:
+            return
+        size = len(self.keywords)
+        offsets = dict()
+        for cate, keywords in category_keywords.items():
+            offsets[cate] = len(self._table)
+            for keyword in keywords:
+                col = self._columns.get(keyword)
+                if col is None:
+                    col = self._columns[keyword] = len(self.keywords)
+                    self.keywords.append(keyword)
+                self._table.append(col)
+            self.categories.setdefault(cate, set()).update(self._table[offsets[cate] :])
+        self._offsets[version] = offsets
+        if len(self.keywords) > size:
+            logger.debug(
+                f"Add {len(self.keywords) - size} columns of version {version}."
+            )
+
+    def add(self, id: Any, counts: st.CountsStruct):
+        """
+        Add a row of news, e.g. `SpecStruct.COUNTS` of a comparator with `keep_counts`.
+
+        Args:
+            `id`    : Id of news, e.g. ArticleId. It's stored as string.
+            `counts`: Raw counts of news. Its version must be registered.
+        Type:
+            `id`    : Any
+            `counts`: st.CountsStruct
+        Return:
+            None
+        """
+
+        if counts is None:
+            raise ValueError(
+                "No counts in the result. Please classify with keep_counts."
+            )
+        offsets = self._offsets.get(counts.version)
+        if offsets is None:
+            raise ValueError(
+                f"Keywords of version {counts.version} aren't registered. "
+                f"Please register the comparator first."
+            )
+
+        ## Keyword ids are mapped into columns when the chunk is written.
+        ## A keyword of several categories appears once per category,
+        ## and duplicates are dropped then as well.
+        row = len(self._ids)
+        for cate, keyword_ids, keyword_counts in zip(
+            counts.categories, counts.keyword_ids, counts.keyword_counts
+        ):
+            self._seg_rows.append(row)
+            self._seg_starts.append(offsets[cate])
+            self._seg_lens.append(len(keyword_ids))
+            self._kids.extend(keyword_ids)
+            self._vals.extend(keyword_counts)
+        self._ids.append(str(id))
+        if len(self._ids) >= self.chunk_size:
+            self.flush()
+
+    def add_records(self, records: CountRecords, store: CountStore):
+        """
+        Add every record of a CountStore as rows, without classifying news again.
+
+        Args:
+            `records`: Records of the store, e.g. `store.records(latest=True)`.
+            `store`  : The store, which holds keywords of each version of records.
+        Type:
+            `records`: CountRecords
+            `store`  : CountStore
+        Return:
+            None
+        """
+
+        self.flush()
+        c = len(records.categories)
+        offsets = np.zeros((len(records.versions), c), dtype=np.int64)
+        for vidx, version in enumerate(records.versions):
+            self._register(version, store.keywords(version))
+            for cidx, cate in enumerate(records.categories):
+                offsets[vidx, cidx] = self._offsets[version][cate]
+        table = np.frombuffer(self._table, dtype=np.int32)
+
+        for start in range(0, records.size, self.chunk_size):
+            end = min(start + self.chunk_size, records.size)
+            lo, hi = records.hit_start[start * c], records.hit_start[end * c]
+            slot_lens = np.diff(records.hit_start[start * c : end * c + 1])
+            slots = np.repeat(np.arange(start * c, end * c), slot_lens)
+            rows, cidx = slots // c, slots % c
+            cols = table[offsets[records.version[rows], cidx] + records.hit_ids[lo:hi]]
+            self._write_chunk(
+                records.ids[start:end],
+                rows - start,
+                cols,
+                records.hit_counts[lo:hi],
+            )
+
+    def flush(self):
+        """
+        Write buffered rows into a new chunk.
+        """
+
+        if not self._ids:
+            return
+        seg_lens = np.frombuffer(self._seg_lens, dtype=np.int64)
+        table = np.frombuffer(self._table, dtype=np.int32)
+        starts = np.repeat(np.frombuffer(self._seg_starts, dtype=np.int64), seg_lens)
+        self._write_chunk(
+            np.array(self._ids, dtype=str),
+            np.repeat(np.frombuffer(self._seg_rows, dtype=np.int64), seg_lens),
+            table[starts + np.frombuffer(self._kids, dtype=np.int32)],
+            np.frombuffer(self._vals, dtype=np.int32),
+        )
+        self._reset_buffer()
+
+    def _write_chunk(
+        self, ids: np.ndarray, rows: np.ndarray, cols: np.ndarray, vals: np.ndarray
+    ):
+        ## Sort entries by (row, column) and drop duplicated columns of a row.
+        n = len(ids)
+        keys = rows.astype(np.int64) * len(self.keywords) + cols
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        keep = np.ones(len(keys), dtype=bool)
+        keep[1:] = keys[1:] != keys[:-1]
+        rows, cols, vals = rows[order][keep], cols[order][keep], vals[order][keep]
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+
+        ## Names of chunks are never reused, so that merged chunks can be recognized.
+        name = CHUNK_NAME.format(self._next_chunk)
+        self._next_chunk += 1
+        _save_npz(
+            os.path.join(self.path, name),
+            data=vals.astype(np.int32),
+            indices=cols.astype(np.int32),
+            indptr=indptr,
+            shape=np.array([n, len(self.keywords)]),
+            format=np.array("csr"),
+            articles=ids,
+        )
+        ## Keywords are saved before meta lists the chunk, so every column is known.
+        self._save_keywords()
+        self._chunks.append(name)
+        self._save_meta()
+
+    def close(self, merge: Optional[bool] = False):
+        """
+        Write buffered rows. Chunks are left in place and read by `load`,
+        so that a close touches only the new chunk, however large the matrix is.
+
+        Args:
+            `merge`: Whether to merge chunks into matrix.npz and articles.npy as well.
+                     Please Check in the `merge` function.
+        Type:
+            `merge`: bool
+        Return:
+            None
+        """
+
+        self.flush()
+        if merge:
+            self.merge()
+        elif not self._chunks and not os.path.exists(
+            os.path.join(self.path, MATRIX_NAME)
+        ):
+            self._save_empty()
+
+    def merge(self):
+        """
+        Write buffered rows, and merge chunks into matrix.npz and articles.npy,
+        so that matrix.npz alone is the whole matrix, e.g. for scipy.sparse.load_npz.
+        It copies the whole matrix, so call it once after appending, not on every close.
+        """
+
+        self.flush()
+        if not self._chunks:
+            if not os.path.exists(os.path.join(self.path, MATRIX_NAME)):
+                self._save_empty()
+            return
+
+        ## matrix.npz records the chunks merged into it. If a previous merge stopped
+        ## after the matrix was saved, its chunks are still listed in meta, but they
+        ## must not be merged again.
+        parts, chunks = _read_parts(self.path, self._chunks)
+        data, indices, indptr, articles = _concat_parts(parts)
+        if chunks:
+            self._save_matrix(data, indices, indptr, articles, chunks)
+
+        chunks, self._chunks = self._chunks, list()
+        self._save_meta()
+        for name in chunks:
+            os.remove(os.path.join(self.path, name))
+        logger.info(f"Write a hit matrix of {len(data)} hits into {self.path}.")
+
+    def _save_empty(self):
+        self._save_keywords()
+        self._save_matrix(
+            np.zeros(0, dtype=np.int32),
+            np.zeros(0, dtype=np.int32),
+            np.zeros(1, dtype=np.int64),
+            np.zeros(0, dtype=str),
+            list(),
+        )
+
+    def _save_matrix(self, data, indices, indptr, articles, merged):
+        ## articles.npy is replaced first, and its rows are a superset of matrix.npz,
+        ## so a reader never finds a row without an id.
+        _save_npy(os.path.join(self.path, ARTICLES_NAME), articles)
+        _save_npz(
+            os.path.join(self.path, MATRIX_NAME),
+            data=data,
+            indices=indices,
+            indptr=indptr,
+            shape=np.array([len(articles), len(self.keywords)]),
+            format=np.array("csr"),
+            merged=np.array(merged, dtype=str),
+        )
+
+    def _save_keywords(self):
+        _save_json(
+            os.path.join(self.path, KEYWORDS_NAME),
+            {
+                "keywords": self.keywords,
+                "categories": {
+                    cate: sorted(cols) for cate, cols in self.categories.items()
+                },
+            },
+        )
+
+    def _save_meta(self):
+        _save_json(
+            os.path.join(self.path, META_NAME),
+            {
+                "format_version": FORMAT_VERSION,
+                "chunks": self._chunks,
+                "next_chunk": self._next_chunk,
+            },
+        )
+
+
+def load(path: str) -> HitMatrix:
+    """
+    Load a matrix written by `HitMatrixWriter`.
+    Rows of chunks which aren't merged yet follow rows of matrix.npz.
+    Columns added after a row was written are empty.
+    """
+
+    with open(os.path.join(path, KEYWORDS_NAME), "r", encoding="utf-8") as f:
+        columns = json.load(f)
+    chunks = list()
+    if os.path.exists(os.path.join(path, META_NAME)):
+        with open(os.path.join(path, META_NAME), "r", encoding="utf-8") as f:
+            chunks = json.load(f)["chunks"]
+    parts, _ = _read_parts(path, chunks)
+    data, indices, indptr, articles = _concat_parts(parts)
+    return HitMatrix(
+        data=data,
+        indices=indices,
+        indptr=indptr,
+        shape=(len(indptr) - 1, len(columns["keywords"])),
+        articles=articles,
+        keywords=columns["keywords"],
+        categories=columns["categories"],
+    )
+
+
+def _read_parts(path: str, chunks: List[str]):
+    ## Parts of a matrix in order of rows, i.e. matrix.npz and then chunks which
+    ## aren't merged into it, and names of those chunks.
+    parts = list()
+    merged = set()
+    if os.path.exists(os.path.join(path, MATRIX_NAME)):
+        with np.load(os.path.join(path, MATRIX_NAME)) as matrix:
+            part = {key: matrix[key] for key in ("data", "indices", "indptr")}
+            if "merged" in matrix.files:
+                merged.update(matrix["merged"].tolist())
+        ## articles.npy may have more rows than matrix.npz, if a merge stopped between them.
+        part["articles"] = np.load(os.path.join(path, ARTICLES_NAME))[
+            : len(part["indptr"]) - 1
+        ]
+        parts.append(part)
+    chunks = [name for name in chunks if name not in merged]
+    for name in chunks:
+        with np.load(os.path.join(path, name)) as chunk:
+            parts.append(
+                {key: chunk[key] for key in ("data", "indices", "indptr", "articles")}
+            )
+    return parts, chunks
+
+
+def _concat_parts(parts: List[Dict[str, np.ndarray]]):
+    if len(parts) == 1:
+        part = parts[0]
+        return part["data"], part["indices"], part["indptr"], part["articles"]
+    data, indices, indptr, articles = (
+        [np.zeros(0, np.int32)],
+        [np.zeros(0, np.int32)],
+        [np.zeros(1, np.int64)],
+        [np.zeros(0, str)],
+    )
+    offset = 0
+    for part in parts:
+        data.append(part["data"])
+        indices.append(part["indices"])
+        indptr.append(part["indptr"][1:] + offset)
+        articles.append(part["articles"])
+        offset += len(part["data"])
+    return (
+        np.concatenate(data),
+        np.concatenate(indices),
+        np.concatenate(indptr),
+        np.concatenate(articles),
+    )
+
+
+def _save_npz(path: str, **arrays):
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fo:
+            np.savez(fo, **arrays)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def _save_npy(path: str, array: np.ndarray):
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fo:
+            np.save(fo, array)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def _save_json(path: str, data: Any):
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fo:
+            json.dump(data, fo, ensure_ascii=False)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Export a sparse news x keyword count matrix."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export = subparsers.add_parser(
+        "export", help="Build a matrix from a count store (python -m src.utils.counts)."
+    )
+    export.add_argument("store")
+    export.add_argument("output")
+    export.add_argument(
+        "--latest",
+        action="store_true",
+        help="Keep only the latest record of each news.",
+    )
+
+    show = subparsers.add_parser("show", help="Show a summary of a matrix.")
+    show.add_argument("path")
+    show.add_argument(
+        "--top", type=int, default=20, help="Show the most common keywords."
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args(argv)
+
+    if args.command == "export":
+        store = CountStore(args.store)
+        ## The exported matrix.npz is complete, so that scipy can load it alone.
+        with HitMatrixWriter(args.output) as writer:
+            writer.add_records(store.records(latest=args.latest), store)
+            writer.merge()
+        return
+
+    matrix = load(args.path)
+    print(
+        f"{matrix.shape[0]} news x {matrix.shape[1]} keywords, {len(matrix.data)} hits"
+    )
+    ## Number of news which have each keyword.
+    df = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    for col in np.argsort(-df, kind="stable")[: args.top]:
+        if df[col]:
+            print(f"    {matrix.keywords[col]}: {df[col]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Precompiled keyword artifact for fast comparator startup.
+#              e.g. python -m src.utils.keywords.artifact
+
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from src.utils.keywords import keywords as ke
+from src.utils.matcher import (
+    TABLES,
+    AhoCorasickMatcher,
+    BaseMatcher,
+    FlatAhoCorasickMatcher,
+)
+
+logger = logging.getLogger(__name__)
+
+## Layout of an artifact:
+##   MAGIC | FORMAT_VERSION (uint32) | size of header (uint32) | header (json) | sections
+## Header records version (content hash of sources), byteorder and
+## (offset, number of items) of each section. Every section is an array of unsigned int
+## aligned to 8 bytes, except "keywords", which is utf-8 bytes of all keywords.
+MAGIC = b"NCKW"
+FORMAT_VERSION = 1
+PREFIX = struct.Struct("<4sII")
+ALIGN = 8
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "NEWS_CLASSIFIER_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "news_classifier", "keywords"),
+)
+
+
+class CompiledKeywords:
+    """Deduped keywords, their matcher and extra tables of a keyword set"""
+
+    def __init__(
+        self,
+        version: str,
+        keywords: Tuple[str],
+        matcher: BaseMatcher,
+        extra: Optional[Dict[str, Sequence[int]]] = None,
+        path: Optional[str] = None,
+    ):
+        self.version = version
+        self.keywords = keywords
+        self.matcher = matcher
+        self.extra = extra or dict()
+        self.path = path
+
+    def __repr__(self):
+        return (
+            f"CompiledKeywords(version={self.version}, "
+            f"keywords={len(self.keywords)}, path={self.path})"
+        )
+
+
+def artifact_path(name: str, version: str, cache_dir: Optional[str] = None) -> str:
+    return os.path.join(cache_dir or DEFAULT_CACHE_DIR, f"{name}-{version}.kwa")
+
+
+def save(
+    path: str,
+    version: str,
+    keywords: Sequence[str],
+    tables: Dict[str, array],
+):
+    """
+    Save keywords and tables into an artifact atomically.
+
+    Args:
+        `path`    : Output artifact.
+        `version` : Content hash of keyword sources.
+        `keywords`: Keywords.
+        `tables`  : Matcher tables and extra tables, arrays of unsigned int.
+    Type:
+        `path`    : string
+        `version` : string
+        `keywords`: sequence of string
+        `tables`  : dict [string, array]
+    Return:
+        None
+    """
+
+    encoded = [keyword.encode("utf-8") for keyword in keywords]
+    keyword_offsets = array("I", [0])
+    for e in encoded:
+        keyword_offsets.append(keyword_offsets[-1] + len(e))
+    sections = [("keywords", b"".join(encoded)), ("keyword_offsets", keyword_offsets)]
+    sections.extend(tables.items())
+
+    offset = 0
+    layout = dict()
+    for name, section in sections:
+        nbytes = len(section) * (1 if isinstance(section, bytes) else section.itemsize)
+        layout[name] = (offset, len(section))
+        offset += nbytes + (-nbytes) % ALIGN
+
+    header = json.dumps(
+        {
+            "version": version,
+            "byteorder": sys.byteorder,
+            "itemsize": array("I").itemsize,
+            "sections": layout,
+        }
+    ).encode("utf-8")
+    header += b" " * ((-(PREFIX.size + len(header))) % ALIGN)
+
+    dirname = os.path.dirname(os.path.abspath(path))
+    os.makedirs(dirname, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fo:
+            fo.write(PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)))
+            fo.write(header)
+            for name, section in sections:
+                data = section if isinstance(section, bytes) else section.tobytes()
+                fo.write(data)
+                fo.write(b"\0" * ((-len(data)) % ALIGN))
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def _read_layout(
+    view: memoryview, path: str
+) -> Tuple[dict, Dict[str, Tuple[int, int]]]:
+    """
+    Parse the header of an artifact and check that every section lies within the file,
+    so that a truncated or corrupt artifact raises ValueError.
+
+    Args:
+        `view`: Memory view of the whole artifact.
+        `path`: Artifact, only for error messages.
+    Type:
+        `view`: memoryview
+        `path`: string
+    Return:
+        Header and (start, end) in bytes of each section.
+        rtype: tuple (dict, dict [string, tuple (int, int)])
+    """
+
+    if len(view) < PREFIX.size:
+        raise ValueError(f"{path} is truncated.")
+    magic, format_version, header_size = PREFIX.unpack_from(view, 0)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise ValueError(
+            f"{path} is not an artifact of format version {FORMAT_VERSION}."
+        )
+    base = PREFIX.size + header_size
+    if base > len(view):
+        raise ValueError(f"{path} is truncated.")
+    try:
+        header = json.loads(bytes(view[PREFIX.size : base]))
+        byteorder, itemsize = header["byteorder"], header["itemsize"]
+        layout = {
+            name: (int(offset), int(n))
+            for name, (offset, n) in header["sections"].items()
+        }
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"{path} has a corrupt header: {e!r}") from e
+    if not isinstance(header.get("version"), str):
+        raise ValueError(f"{path} has a corrupt header: no version.")
+    if byteorder != sys.byteorder or itemsize != array("I").itemsize:
+        raise ValueError(f"{path} was compiled on an incompatible platform.")
+    missing = {"keywords", "keyword_offsets", *TABLES} - layout.keys()
+    if missing:
+        raise ValueError(f"{path} lacks sections {sorted(missing)}.")
+
+    bounds = dict()
+    for name, (offset, n) in layout.items():
+        start = base + offset
+        end = start + n * (1 if name == "keywords" else itemsize)
+        if offset < 0 or n < 0 or end > len(view):
+            raise ValueError(
+                f"{path} is truncated: section {name} ends beyond the file."
+            )
+        bounds[name] = (start, end)
+    return header, bounds
+
+
+def _check_sections(sections: Dict[str, memoryview], path: str):
+    """
+    Check that offsets of keywords and tables of the matcher agree in size,
+    or lookups would go out of range. Raise ValueError otherwise.
+    """
+
+    keyword_offsets = sections["keyword_offsets"]
+    n_keywords = len(keyword_offsets) - 1
+    n_states = len(sections["fail"])
+    if (
+        n_keywords < 0
+        or keyword_offsets[0] != 0
+        or keyword_offsets[-1] != len(sections["keywords"])
+        or any(keyword_offsets[i] > keyword_offsets[i + 1] for i in range(n_keywords))
+        or len(sections["edge_start"]) != n_states + 1
+        or len(sections["out_start"]) != n_states + 1
+        or len(sections["edge_chars"]) != sections["edge_start"][-1]
+        or len(sections["edge_next"]) != sections["edge_start"][-1]
+        or len(sections["out_kids"]) != sections["out_start"][-1]
+    ):
+        raise ValueError(f"{path} has inconsistent sections.")
+
+
+def load(path: str, flat: Optional[bool] = False) -> CompiledKeywords:
+    """
+    Load an artifact by memory mapping.
+    A truncated or corrupt artifact raises ValueError, so that it's recompiled.
+
+    Args:
+        `path`: Artifact.
+        `flat`: Whether to scan directly over memory-mapped tables by FlatAhoCorasickMatcher,
+                so that all processes loading the same artifact share its pages.
+                Otherwise, tables are copied into AhoCorasickMatcher, which is faster to scan.
+    Type:
+        `path`: string
+        `flat`: bool
+    Return:
+        Compiled keywords.
+        rtype: CompiledKeywords
+    """
+
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    view = memoryview(mm)
+    sections = dict()
+    try:
+        header, bounds = _read_layout(view, path)
+        for name, (start, end) in bounds.items():
+            section = view[start:end]
+            sections[name] = section if name == "keywords" else section.cast("I")
+            section = None
+        _check_sections(sections, path)
+        keyword_offsets = sections["keyword_offsets"].tolist()
+        blob = bytes(sections.pop("keywords"))
+        keywords = tuple(
+            blob[keyword_offsets[i] : keyword_offsets[i + 1]].decode("utf-8")
+            for i in range(len(keyword_offsets) - 1)
+        )
+    except ValueError:
+        for section in sections.values():
+            section.release()
+        view.release()
+        mm.close()
+        raise
+    del sections["keyword_offsets"]
+
+    tables = {name: sections.pop(name) for name in TABLES}
+    if flat:
+        matcher = FlatAhoCorasickMatcher(keywords, tables)
+        extra = sections
+    else:
+        matcher = AhoCorasickMatcher.from_tables(keywords, tables)
+        extra = {name: array("I", section) for name, section in sections.items()}
+        del tables, sections
+        view.release()
+        mm.close()
+
+    return CompiledKeywords(header["version"], keywords, matcher, extra, path)
+
+
+def load_or_compile(
+    name: str,
+    version: str,
+    build: Callable[[], Tuple[Sequence[str], Dict[str, array]]],
+    cache_dir: Optional[str] = None,
+    flat: Optional[bool] = False,
+) -> CompiledKeywords:
+    """
+    Load the artifact of a keyword set, or compile and save it if sources have changed.
+
+    Args:
+        `name`     : Name of the keyword set, e.g. "Negative_News".
+        `version`  : Content hash of keyword sources.
+        `build`    : A function that loads keywords and extra tables from sources.
+                     It's only called when no artifact of the version exists.
+        `cache_dir`: Directory of artifacts. Default is $NEWS_CLASSIFIER_CACHE_DIR
+                     or ~/.cache/news_classifier/keywords.
+        `flat`     : Please Check in the `load` function.
+    Type:
+        `name`     : string
+        `version`  : string
+        `build`    : callable
+        `cache_dir`: string
+        `flat`     : bool
+    Return:
+        Compiled keywords.
+        rtype: CompiledKeywords
+    """
+
+    path = artifact_path(name, version, cache_dir)
+    if os.path.exists(path):
+        try:
+            return load(path, flat)
+        ## load raises ValueError for a truncated artifact, but corrupt content of tables
+        ## may fail in any way while building the matcher, so recompile on any error.
+        except Exception as e:
+            logger.warning(f"Recompile {path}: {e!r}")
+
+    logger.debug(f"Compile {name} keywords (version: {version}) into {path}.")
+    keywords, extra = build()
+    keywords = tuple(keywords)
+    matcher = AhoCorasickMatcher(keywords)
+    try:
+        save(path, version, keywords, {**matcher.to_tables(), **extra})
+    except OSError as e:
+        logger.warning(f"Failed to save {path}, so use keywords in memory: {e}")
+        return CompiledKeywords(version, keywords, matcher, extra)
+
+    if flat:
+        return load(path, flat)
+    return CompiledKeywords(version, keywords, matcher, extra, path)
+
+
+def compile_category(
+    name: str,
+    keywords: Optional[Sequence[str]] = None,
+    load_default: Optional[bool] = True,
+    cache_dir: Optional[str] = None,
+    flat: Optional[bool] = False,
+) -> CompiledKeywords:
+    """
+    Load or compile keywords of a news category.
+
+    Args:
+        `name`        : "Negative_News" or "ESG_News".
+        `keywords`    : Please Check in the `SimpleComparator.__init__` function.
+        `load_default`: Please Check in the `SimpleComparator.__init__` function.
+        `cache_dir`   : Please Check in the `load_or_compile` function.
+        `flat`        : Please Check in the `load` function.
+    Type:
+        `name`        : string
+        `keywords`    : string or list of string
+        `load_default`: bool
+        `cache_dir`   : string
+        `flat`        : bool
+    Return:
+        Compiled keywords.
+        rtype: CompiledKeywords
+    """
+
+    return load_or_compile(
+        name=name,
+        version=ke.KeywordsVersion(name, keywords, load_default),
+        build=lambda: (ke.KeywordsFactory(name, keywords, load_default).keywords, {}),
+        cache_dir=cache_dir,
+        flat=flat,
+    )
+
+
+if __name__ == "__main__":
+
+    for name in ke.LOCALIZERS:
+        compiled = compile_category(name)
+        print(f"{name}: {compiled}")
@@ -2,11 +2,14 @@
 # Author: Yu-Lun Chiang
 # Description: Base Keyword Loader for Polymorphism
 
+import hashlib
+import json
 import logging
 import os
 from typing import List, Tuple, Union, Optional
 from abc import ABC, abstractmethod
 from src.utils import utility as ut
+from src.utils.keywords.manifest import MANIFEST_NAME, KeywordsManifest
 
 logger = logging.getLogger(__name__)
 
@@ -45,16 +48,97 @@ class BaseKeywordsLoader(Keywords):
         ret.extend(ut.load(keywords))
 
         if load_default:
-            ret.extend(
-                ut.load(
-                    [
-                        os.path.join(self.DEFAULT_DIR, file)
-                        for file in os.listdir(self.DEFAULT_DIR)
-                        if file.endswith(".txt")
-                    ]
+            ret.extend(self.default_keywords())
+
+        return ret
+
+    @classmethod
+    def manifest(cls) -> Optional[KeywordsManifest]:
+        return KeywordsManifest.from_dir(cls.DEFAULT_DIR)
+
+    @classmethod
+    def default_keywords(cls) -> List[str]:
+        """
+        Active default keywords, which are resolved through manifest.json of DEFAULT_DIR.
+        Without a manifest, keywords of every .txt in DEFAULT_DIR are loaded.
+        """
+
+        manifest = cls.manifest()
+        if manifest is None:
+            return ut.load(cls.default_files())
+        return manifest.keywords()
+
+    @classmethod
+    def default_files(cls) -> List[str]:
+        manifest = cls.manifest()
+        if manifest is not None:
+            return manifest.files()
+        return [
+            os.path.join(cls.DEFAULT_DIR, file)
+            for file in sorted(os.listdir(cls.DEFAULT_DIR))
+            if file.endswith(".txt")
+        ]
+
+    @classmethod
+    def version(
+        cls,
+        keywords: Optional[Union[str, List[str]]] = None,
+        load_default: Optional[bool] = True,
+    ) -> str:
+        """
+        Content hash of keyword sources, which changes only when the sources change.
+        Files are hashed as raw bytes without being parsed.
+        """
+
+        sha = hashlib.sha1()
+
+        def update(tag: str, content: bytes):
+            sha.update(f"{tag}:{len(content)}:".encode("utf-8"))
+            sha.update(content)
+
+        if ut.is_string(keywords):
+            keywords = [keywords]
+        for keyword in keywords or list():
+            if keyword.endswith(".txt"):
+                with open(keyword, "rb") as f:
+                    update("file", f.read())
+            else:
+                update("word", keyword.encode("utf-8"))
+
+        if load_default:
+            for file in cls.default_files():
+                with open(file, "rb") as f:
+                    update(f"default:{os.path.basename(file)}", f.read())
+            manifest = cls.manifest()
+            if manifest is not None:
+                ## Only fields which change keywords, so history alone changes nothing.
+                update(
+                    "manifest",
+                    json.dumps(
+                        [manifest.sources, manifest.include, manifest.exclude],
+                        ensure_ascii=False,
+                    ).encode("utf-8"),
                 )
-            )
 
+        return sha.hexdigest()[:16]
+
+    @classmethod
+    def source_files(
+        cls,
+        keywords: Optional[Union[str, List[str]]] = None,
+        load_default: Optional[bool] = True,
+    ) -> List[str]:
+        """
+        Files which keywords are loaded from, e.g. to watch whether they change.
+        Default files are listed again every time, so that new files are found.
+        """
+
+        if ut.is_string(keywords):
+            keywords = [keywords]
+        ret = [keyword for keyword in keywords or list() if keyword.endswith(".txt")]
+        if load_default:
+            ret.append(os.path.join(cls.DEFAULT_DIR, MANIFEST_NAME))
+            ret.extend(cls.default_files())
         return ret
 
     @property
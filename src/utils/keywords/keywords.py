@@ -10,9 +10,10 @@ from src.utils.keywords.base import BaseKeywordsLoader
 logger = logging.getLogger(__name__)
 
 
+FILE_ABS_DIRNAME = os.path.dirname(os.path.abspath(__file__))
 DEFAULT_DIR_PATH = {
-    "Negative_News": "src/utils/keywords/negative_news/",
-    "ESG_News": "src/utils/keywords/esg_news/",
+    "Negative_News": os.path.join(FILE_ABS_DIRNAME, "negative_news"),
+    "ESG_News": os.path.join(FILE_ABS_DIRNAME, "esg_news"),
 }
 
 
@@ -22,13 +23,27 @@ def KeywordsFactory(
     load_default: Optional[bool] = True,
 ):
 
-    LOCALIZERS = {
-        "Negative_News": NegativeNewsKeywordsLoader,
-        "ESG_News": ESGNewsKeywordsLoader,
-    }
     return LOCALIZERS[name](keywords, load_default)
 
 
+def KeywordsVersion(
+    name: str,
+    keywords: Optional[Union[str, List[str]]] = None,
+    load_default: Optional[bool] = True,
+) -> str:
+
+    return LOCALIZERS[name].version(keywords, load_default)
+
+
+def KeywordsSourceFiles(
+    name: str,
+    keywords: Optional[Union[str, List[str]]] = None,
+    load_default: Optional[bool] = True,
+) -> List[str]:
+
+    return LOCALIZERS[name].source_files(keywords, load_default)
+
+
 class NegativeNewsKeywordsLoader(BaseKeywordsLoader):
 
     DEFAULT_DIR = DEFAULT_DIR_PATH["Negative_News"]
@@ -61,10 +76,16 @@ class ESGNewsKeywordsLoader(BaseKeywordsLoader):
         return super().keywords
 
 
+LOCALIZERS = {
+    "Negative_News": NegativeNewsKeywordsLoader,
+    "ESG_News": ESGNewsKeywordsLoader,
+}
+
+
 if __name__ == "__main__":
 
     nn = NegativeNewsKeywordsLoader(keywords="我")
     print(nn.keywords)
 
     esg = ESGNewsKeywordsLoader()
-    print(esg.keywords)
\ No newline at end of file
+    print(esg.keywords)
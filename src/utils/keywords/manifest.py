@@ -0,0 +1,301 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Manifest of active keyword sources of a news category.
+#              e.g. python -m src.utils.keywords.manifest show
+#                   python -m src.utils.keywords.manifest promote Negative_News NN_keywords_XXX.txt
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from src.utils import utility as ut
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+
+class KeywordsManifest:
+    """Which keyword files of a directory are active, and words included or excluded"""
+
+    def __init__(
+        self,
+        path: str,
+        name: Optional[str] = None,
+        version: Optional[int] = 0,
+        sources: Optional[List[str]] = None,
+        include: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None,
+        max_keywords: Optional[int] = None,
+        history: Optional[List[Dict]] = None,
+    ):
+        """
+        Init KeywordsManifest. Please use `KeywordsManifest.load` or `from_dir`.
+
+        Args:
+            `path`        : Path of manifest.json. Sources are relative to its directory.
+            `name`        : Name of the news category, e.g. "Negative_News".
+            `version`     : Revision of the manifest, which increases on every change.
+            `sources`     : Active keyword files (.txt) in order.
+            `include`     : Words which are keywords even if no source has them.
+            `exclude`     : Words which are never keywords even if a source has them.
+            `max_keywords`: Max number of active keywords. Promotion beyond it is refused.
+                            None for no limit.
+            `history`     : Changes of the manifest, the latest last.
+        Type:
+            `path`        : string
+            `name`        : string
+            `version`     : integer
+            `sources`     : list of string
+            `include`     : list of string
+            `exclude`     : list of string
+            `max_keywords`: integer
+            `history`     : list of dict
+        Return:
+            None
+        """
+
+        self.path = path
+        self.name = name
+        self.version = version
+        self.sources = list(sources or list())
+        self.include = list(include or list())
+        self.exclude = list(exclude or list())
+        self.max_keywords = max_keywords
+        self.history = list(history or list())
+
+    def __repr__(self):
+        return (
+            f"KeywordsManifest(name={self.name}, version={self.version}, "
+            f"sources={self.sources}, path={self.path})"
+        )
+
+    @property
+    def directory(self) -> str:
+        return os.path.dirname(os.path.abspath(self.path))
+
+    @classmethod
+    def load(cls, path: str) -> "KeywordsManifest":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(path, **data)
+
+    @classmethod
+    def from_dir(cls, directory: str) -> Optional["KeywordsManifest"]:
+        """
+        Manifest of a directory, or None if the directory has no manifest.
+        """
+
+        path = os.path.join(directory, MANIFEST_NAME)
+        return cls.load(path) if os.path.exists(path) else None
+
+    def save(self):
+        """
+        Save the manifest atomically, so that loaders never read half of it.
+        """
+
+        data = {
+            "name": self.name,
+            "version": self.version,
+            "sources": self.sources,
+            "include": self.include,
+            "exclude": self.exclude,
+            "max_keywords": self.max_keywords,
+            "history": self.history,
+        }
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fo:
+                json.dump(data, fo, ensure_ascii=False, indent=4)
+                fo.write("\n")
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def files(self) -> List[str]:
+        """
+        Paths of active keyword files.
+        """
+
+        return [os.path.join(self.directory, source) for source in self.sources]
+
+    def keywords(self) -> List[str]:
+        """
+        Active keywords: keywords of sources and included words, except excluded words.
+        """
+
+        return self._keywords(self.files())
+
+    def _keywords(self, files: List[str]) -> List[str]:
+        exclude = set(self.exclude)
+        return [
+            keyword
+            for keyword in ut.load(files + self.include)
+            if keyword not in exclude
+        ]
+
+    def promote(
+        self,
+        file: str,
+        retire: Optional[List[str]] = None,
+        force: Optional[bool] = False,
+    ) -> Tuple[int, int]:
+        """
+        Make a keyword file active, e.g. one generated by `Word2VecKeyGenerator.save2txt`.
+        A file outside the directory is copied into it first,
+        and a file in the directory can be given by its name.
+
+        Args:
+            `file`  : Keyword file (.txt) to promote.
+            `retire`: Sources to deactivate at the same time, e.g. the previous generation.
+            `force` : Whether to promote even if active keywords exceed `max_keywords`.
+        Type:
+            `file`  : string
+            `retire`: list of string
+            `force` : bool
+        Return:
+            Number of active keywords before and after the promotion.
+            rtype: Tuple[int, int]
+        """
+
+        if not file.endswith(".txt"):
+            raise ValueError(
+                f"Only .txt keyword files can be promoted, but got {file}."
+            )
+        source = os.path.basename(file)
+        dest = os.path.join(self.directory, source)
+        if not os.path.exists(file) and os.path.exists(dest):
+            ## A file name in the directory, e.g. one generated into it.
+            file = dest
+        retire = [os.path.basename(r) for r in retire or list()]
+        for r in retire:
+            if r not in self.sources:
+                raise ValueError(f"{r} is not an active source of {self.name}.")
+
+        before = len(self.keywords())
+        sources = [s for s in self.sources if s not in retire]
+        if source not in sources:
+            sources.append(source)
+        ## The file may not be copied into the directory yet.
+        after = len(
+            self._keywords(
+                [
+                    file if s == source else os.path.join(self.directory, s)
+                    for s in sources
+                ]
+            )
+        )
+        if self.max_keywords is not None and after > self.max_keywords and not force:
+            raise ValueError(
+                f"{after} keywords would be active, more than {self.max_keywords}. "
+                f"Please retire sources or exclude words, or use force."
+            )
+
+        if os.path.abspath(file) != os.path.abspath(dest):
+            shutil.copyfile(file, dest)
+        self.sources = sources
+        self._record("promote", source=source, retired=retire, keywords=after)
+        self.save()
+        logger.info(
+            f"Promote {source} into {self.name} (version {self.version}): "
+            f"{before} -> {after} active keywords."
+        )
+        return before, after
+
+    def retire(self, source: str) -> Tuple[int, int]:
+        """
+        Deactivate a source. The file is kept, so it can be promoted again.
+
+        Args:
+            `source`: Active source to deactivate.
+        Type:
+            `source`: string
+        Return:
+            Number of active keywords before and after it.
+            rtype: Tuple[int, int]
+        """
+
+        source = os.path.basename(source)
+        if source not in self.sources:
+            raise ValueError(f"{source} is not an active source of {self.name}.")
+        before = len(self.keywords())
+        self.sources.remove(source)
+        after = len(self.keywords())
+        self._record("retire", source=source, keywords=after)
+        self.save()
+        logger.info(
+            f"Retire {source} from {self.name} (version {self.version}): "
+            f"{before} -> {after} active keywords."
+        )
+        return before, after
+
+    def _record(self, action: str, **details):
+        self.version += 1
+        self.history.append(
+            {
+                "version": self.version,
+                "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "action": action,
+                **details,
+            }
+        )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Manage active keyword sources.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    show = subparsers.add_parser("show", help="Show active sources of each category.")
+    show.add_argument("name", nargs="?", default=None)
+
+    promote = subparsers.add_parser("promote", help="Make a keyword file active.")
+    promote.add_argument("name", help="Negative_News or ESG_News.")
+    promote.add_argument("file")
+    promote.add_argument("--retire", nargs="+", default=None)
+    promote.add_argument("--force", action="store_true")
+
+    retire = subparsers.add_parser("retire", help="Deactivate a keyword file.")
+    retire.add_argument("name", help="Negative_News or ESG_News.")
+    retire.add_argument("source")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    from src.utils.keywords import keywords as ke
+
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args(argv)
+    names = [args.name] if args.name else list(ke.LOCALIZERS)
+    for name in names:
+        directory = ke.LOCALIZERS[name].DEFAULT_DIR
+        manifest = KeywordsManifest.from_dir(directory)
+        if manifest is None:
+            raise FileNotFoundError(f"No {MANIFEST_NAME} in {directory}.")
+
+        if args.command == "promote":
+            manifest.promote(args.file, args.retire, args.force)
+        elif args.command == "retire":
+            manifest.retire(args.source)
+        else:
+            print(
+                f"{name} (version {manifest.version}): "
+                f"{len(manifest.keywords())} active keywords"
+            )
+            for source in manifest.sources:
+                print(f"    {source}")
+            if manifest.include or manifest.exclude:
+                print(
+                    f"    include: {len(manifest.include)} words, "
+                    f"exclude: {len(manifest.exclude)} words"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Aho-Corasick automaton to find all keywords in a single pass.
+
+import logging
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left
+from collections import deque
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+## Names of flat tables of an automaton. Every table is an array of unsigned int.
+##   edge_start: edges of node i are edge_chars/edge_next[edge_start[i]:edge_start[i + 1]],
+##               sorted by code point of char.
+##   edge_chars: code point of char of each edge.
+##   edge_next : next node of each edge.
+##   fail      : failure link of each node.
+##   out_start : outputs of node i are out_kids[out_start[i]:out_start[i + 1]].
+##   out_kids  : keyword ids of outputs (outputs of failure nodes are merged).
+TABLES = ("edge_start", "edge_chars", "edge_next", "fail", "out_start", "out_kids")
+
+
+class BaseMatcher(ABC):
+    """Base Matcher for Polymorphism"""
+
+    def __init__(self, keywords: Sequence[str]):
+        self._keywords = tuple(keywords)
+        self._lengths = tuple(len(keyword) for keyword in self._keywords)
+
+    @abstractmethod
+    def finditer(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        Find all (possibly overlapping) keyword occurrences in text.
+
+        Args:
+            `text`: Input text.
+        Type:
+            `text`: string
+        Return:
+            Occurrences ordered by their end position.
+            rtype: iterator of Tuple[int, int] (start, keyword id)
+        """
+
+        raise NotImplementedError
+
+    def count(self, text: str) -> Dict[int, int]:
+        """
+        Count keyword occurrences in text.
+        Occurrences of the same keyword never overlap, which is the same as `str.count`.
+
+        Args:
+            `text`: Input text.
+        Type:
+            `text`: string
+        Return:
+            Count of each matched keyword.
+            rtype: dict [integer (keyword id), integer]
+        """
+
+        counts = dict()
+        last_end = dict()
+        lengths = self._lengths
+        for start, kid in self.finditer(text):
+            if start < last_end.get(kid, 0):
+                continue
+            last_end[kid] = start + lengths[kid]
+            counts[kid] = counts.get(kid, 0) + 1
+        return counts
+
+    def __len__(self) -> int:
+        return len(self._keywords)
+
+    @property
+    def keywords(self) -> Tuple[str]:
+        """
+        Keywords of the automaton. Keyword id is the index in this tuple.
+        """
+
+        return self._keywords
+
+    @property
+    def lengths(self) -> Tuple[int]:
+        """
+        Length of each keyword.
+        """
+
+        return self._lengths
+
+
+class AhoCorasickMatcher(BaseMatcher):
+    """A multi-pattern matcher built once from a sequence of keywords"""
+
+    def __init__(self, keywords: Sequence[str]):
+        """
+        Init AhoCorasickMatcher.
+        Build a trie of keywords and its failure links,
+        so that every keyword occurrence in a text can be found in one linear pass.
+
+        Args:
+            `keywords`: Keywords to be found. Keyword id is the index in `keywords`.
+                        Empty keywords are ignored.
+                        Duplicate keywords are kept and reported with each of their ids.
+        Type:
+            `keywords`: sequence of string
+        Return:
+            None
+        """
+
+        super().__init__(keywords)
+
+        ## node 0 is root
+        self._goto: List[Dict[str, int]] = [dict()]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [tuple()]
+
+        for kid, keyword in enumerate(self._keywords):
+            if not keyword:
+                continue
+            node = 0
+            for ch in keyword:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append(dict())
+                    self._fail.append(0)
+                    self._out.append(tuple())
+                node = nxt
+            self._out[node] += (kid,)
+
+        ## Breadth-first to build failure links.
+        ## Outputs of the failure node are merged, so no suffix walk is needed while scanning.
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                f = self._goto[f].get(ch, 0)
+                self._fail[nxt] = f
+                if self._out[f]:
+                    self._out[nxt] += self._out[f]
+
+        logger.debug(
+            f"Built automaton of {len(self._keywords)} keywords with {len(self._goto)} nodes."
+        )
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int]]:
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        lengths = self._lengths
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                end = i + 1
+                for kid in out[node]:
+                    yield end - lengths[kid], kid
+
+    def to_tables(self) -> Dict[str, array]:
+        """
+        Export the automaton as flat tables, which can be stored in a binary file.
+
+        Return:
+            Flat tables. Please check `TABLES` for details.
+            rtype: dict [string, array]
+        """
+
+        tables = {name: array("I") for name in TABLES}
+        tables["edge_start"].append(0)
+        tables["out_start"].append(0)
+        for goto, out in zip(self._goto, self._out):
+            for ch in sorted(goto):
+                tables["edge_chars"].append(ord(ch))
+                tables["edge_next"].append(goto[ch])
+            tables["edge_start"].append(len(tables["edge_chars"]))
+            tables["out_kids"].extend(out)
+            tables["out_start"].append(len(tables["out_kids"]))
+        tables["fail"].extend(self._fail)
+        return tables
+
+    @classmethod
+    def from_tables(
+        cls, keywords: Sequence[str], tables: Dict[str, Sequence[int]]
+    ) -> "AhoCorasickMatcher":
+        """
+        Restore the automaton from flat tables exported by `to_tables`.
+        It skips building of trie and failure links.
+
+        Args:
+            `keywords`: Keywords of the automaton.
+            `tables`  : Flat tables of the automaton.
+        Type:
+            `keywords`: sequence of string
+            `tables`  : dict [string, sequence of integer]
+        Return:
+            The automaton
+            rtype: AhoCorasickMatcher
+        """
+
+        matcher = cls.__new__(cls)
+        BaseMatcher.__init__(matcher, keywords)
+
+        edge_start = tables["edge_start"].tolist()
+        edge_chars = tables["edge_chars"].tolist()
+        edge_next = tables["edge_next"].tolist()
+        out_start = tables["out_start"].tolist()
+        out_kids = tables["out_kids"].tolist()
+
+        n = len(edge_start) - 1
+        matcher._goto = [
+            dict(
+                zip(
+                    map(chr, edge_chars[edge_start[i] : edge_start[i + 1]]),
+                    edge_next[edge_start[i] : edge_start[i + 1]],
+                )
+            )
+            for i in range(n)
+        ]
+        matcher._fail = tables["fail"].tolist()
+        matcher._out = [
+            tuple(out_kids[out_start[i] : out_start[i + 1]]) for i in range(n)
+        ]
+        return matcher
+
+
+class FlatAhoCorasickMatcher(BaseMatcher):
+    """A multi-pattern matcher that scans directly over flat tables"""
+
+    def __init__(self, keywords: Sequence[str], tables: Dict[str, Sequence[int]]):
+        """
+        Init FlatAhoCorasickMatcher.
+        It scans over flat tables exported by `AhoCorasickMatcher.to_tables` without copying,
+        so tables can live in a memory-mapped file or a shared memory segment,
+        which are shared by all processes.
+        It's slower than AhoCorasickMatcher, but costs (almost) no private memory.
+
+        Args:
+            `keywords`: Keywords of the automaton.
+            `tables`  : Flat tables of the automaton, e.g. memoryview of unsigned int.
+        Type:
+            `keywords`: sequence of string
+            `tables`  : dict [string, sequence of integer]
+        Return:
+            None
+        """
+
+        super().__init__(keywords)
+        self._tables = tables
+        ## Next node of each char from root. Most chars of a text don't start any keyword,
+        ## so they are skipped without search. It's as small as the number of first chars.
+        root = slice(tables["edge_start"][0], tables["edge_start"][1])
+        self._root = dict(
+            zip(map(chr, tables["edge_chars"][root]), tables["edge_next"][root])
+        )
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int]]:
+        edge_start, edge_chars, edge_next, fail, out_start, out_kids = (
+            self._tables[name] for name in TABLES
+        )
+        root = self._root
+        lengths = self._lengths
+        node = 0
+        for i, ch in enumerate(text):
+            while node:
+                c = ord(ch)
+                lo, hi = edge_start[node], edge_start[node + 1]
+                j = bisect_left(edge_chars, c, lo, hi)
+                if j < hi and edge_chars[j] == c:
+                    node = edge_next[j]
+                    break
+                node = fail[node]
+            else:
+                node = root.get(ch, 0)
+                if not node:
+                    continue
+            lo, hi = out_start[node], out_start[node + 1]
+            if lo != hi:
+                end = i + 1
+                for j in range(lo, hi):
+                    kid = out_kids[j]
+                    yield end - lengths[kid], kid
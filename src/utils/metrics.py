@@ -0,0 +1,331 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Histograms of per-stage timing of comparators,
+#              which can be dumped as Prometheus text format or json.
+
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+## Upper bounds (inclusive) of buckets. The last bucket (+Inf) is implicit.
+TIME_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+SIZE_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+## Fields of /proc/<pid>/smaps_rollup summed into each figure of `process_memory`.
+MEMORY_FIELDS = {
+    "rss": ("Rss",),
+    "pss": ("Pss",),
+    "shared": ("Shared_Clean", "Shared_Dirty"),
+    "private": ("Private_Clean", "Private_Dirty"),
+}
+
+
+class Histogram:
+    """Cumulative histogram of observed values as the Prometheus histogram"""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        buckets: Sequence[float],
+        labels: Optional[Dict[str, str]] = None,
+    ):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.labels = dict(labels or dict())
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)
+            self.count = 0
+            self.sum = 0.0
+            self.max = 0.0
+
+    def observe(self, value: float):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """
+        Count of observed values less than or equal to each upper bound.
+
+        Return:
+            (upper bound, count), and the last upper bound is inf
+            rtype: list of Tuple[float, int]
+        """
+
+        ret = list()
+        total = 0
+        for le, cnt in zip(self.buckets + (float("inf"),), self._counts):
+            total += cnt
+            ret.append((le, total))
+        return ret
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate quantile by linear interpolation within the bucket,
+        which is the same as `histogram_quantile` of Prometheus.
+        The estimate is capped by the max observed value.
+        """
+
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        lower, prev = 0.0, 0
+        for le, total in self.cumulative():
+            if total >= rank:
+                if le == float("inf"):
+                    return self.max
+                in_bucket = total - prev
+                frac = (rank - prev) / in_bucket if in_bucket else 1.0
+                return min(lower + (le - lower) * frac, self.max)
+            lower, prev = le, total
+        return self.max
+
+    def to_dict(self) -> Dict:
+        return {
+            "labels": self.labels,
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "p50": self.quantile(0.50),
+            "p90": self.quantile(0.90),
+            "p99": self.quantile(0.99),
+            "buckets": [
+                ["+Inf" if le == float("inf") else le, cnt]
+                for le, cnt in self.cumulative()
+            ],
+        }
+
+
+class MetricsRegistry:
+    """A registry of histograms"""
+
+    def __init__(
+        self,
+        namespace: Optional[str] = "news_classifier",
+        slow_seconds: Optional[float] = None,
+    ):
+        """
+        Init MetricsRegistry.
+
+        Args:
+            `namespace`   : Prefix of names of metrics.
+            `slow_seconds`: Log a warning with sizes of news
+                            when a classification takes longer than it. None to disable.
+        Type:
+            `namespace`   : string
+            `slow_seconds`: float
+        Return:
+            None
+        """
+
+        self.namespace = namespace
+        self.slow_seconds = slow_seconds
+        self._histograms: Dict[Tuple, Histogram] = dict()
+        self._lock = threading.Lock()
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        buckets: Optional[Sequence[float]] = TIME_BUCKETS,
+        **labels: str,
+    ) -> Histogram:
+        """
+        Get the histogram of the name and labels, or create it if it doesn't exist.
+        """
+
+        if self.namespace:
+            name = f"{self.namespace}_{name}"
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(name, help, buckets, labels)
+            return self._histograms[key]
+
+    def collect(self) -> List[Histogram]:
+        with self._lock:
+            return list(self._histograms.values())
+
+    def reset(self):
+        for histogram in self.collect():
+            histogram.reset()
+
+    def to_prometheus(self) -> str:
+        """
+        Dump all histograms as Prometheus text exposition format.
+        """
+
+        lines = list()
+        seen = set()
+        for h in sorted(self.collect(), key=lambda h: h.name):
+            if h.name not in seen:
+                seen.add(h.name)
+                lines.append(f"# HELP {h.name} {h.help}")
+                lines.append(f"# TYPE {h.name} histogram")
+            labels = [f'{k}="{_escape(v)}"' for k, v in sorted(h.labels.items())]
+            for le, cnt in h.cumulative():
+                le = "+Inf" if le == float("inf") else repr(float(le))
+                bucket_labels = ",".join(labels + [f'le="{le}"'])
+                lines.append(f"{h.name}_bucket{{{bucket_labels}}} {cnt}")
+            suffix = f"{{{','.join(labels)}}}" if labels else ""
+            lines.append(f"{h.name}_sum{suffix} {h.sum!r}")
+            lines.append(f"{h.name}_count{suffix} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self, **kwargs) -> str:
+        """
+        Dump all histograms as json, keyed by names of metrics.
+        """
+
+        ret = dict()
+        for h in sorted(self.collect(), key=lambda h: h.name):
+            ret.setdefault(h.name, list()).append(h.to_dict())
+        return json.dumps(ret, ensure_ascii=False, **kwargs)
+
+
+class ComparatorMetrics:
+    """Histograms of a comparator, which are observed once per classification"""
+
+    STAGES = ("split", "match", "debug", "score")
+
+    def __init__(self, registry: MetricsRegistry, comparator: str, category: str):
+        self.registry = registry
+        self.comparator = comparator
+        self.category = category
+        labels = {"comparator": comparator, "category": category}
+        self.stages = tuple(
+            registry.histogram(
+                "classify_stage_seconds",
+                "Wall time of each stage of a classification.",
+                TIME_BUCKETS,
+                stage=stage,
+                **labels,
+            )
+            for stage in self.STAGES
+        )
+        self.total = registry.histogram(
+            "classify_seconds", "Wall time of a classification.", TIME_BUCKETS, **labels
+        )
+        self.sentences = registry.histogram(
+            "classify_sentences", "Sentences of news body.", SIZE_BUCKETS, **labels
+        )
+        self.chars = registry.histogram(
+            "classify_chars",
+            "Characters of news title and body.",
+            SIZE_BUCKETS,
+            **labels,
+        )
+        self.hits = registry.histogram(
+            "classify_hits",
+            "Keyword hits in news title and body.",
+            SIZE_BUCKETS,
+            **labels,
+        )
+
+    def observe(
+        self,
+        clocks: Sequence[float],
+        sentences: int,
+        chars: int,
+        hits: int,
+    ):
+        """
+        Args:
+            `clocks`   : Clock at start and at end of each stage in order of STAGES.
+            `sentences`: Number of sentences.
+            `chars`    : Number of characters.
+            `hits`     : Number of keyword hits.
+        Type:
+            `clocks`   : sequence of float (len(STAGES) + 1)
+            `sentences`: integer
+            `chars`    : integer
+            `hits`     : integer
+        Return:
+            None
+        """
+
+        for i, histogram in enumerate(self.stages):
+            histogram.observe(clocks[i + 1] - clocks[i])
+        total = clocks[-1] - clocks[0]
+        self.total.observe(total)
+        self.sentences.observe(sentences)
+        self.chars.observe(chars)
+        self.hits.observe(hits)
+
+        slow_seconds = self.registry.slow_seconds
+        if slow_seconds is not None and total > slow_seconds:
+            logger.warning(
+                f"Slow classification by {self.comparator} ({self.category}): "
+                f"{total:.4f}s, {chars} chars, {sentences} sentences, {hits} hits."
+            )
+
+
+def process_memory(pid: Optional[int] = None) -> Dict[str, Optional[int]]:
+    """
+    Resident memory of a process in bytes.
+    Pages shared with other processes (e.g. a memory-mapped artifact) are counted in full
+    by rss, but pss splits them evenly among processes mapping them,
+    so the sum of pss of all workers is what they really cost.
+
+    Args:
+        `pid`: Process id. Default is the current process.
+    Type:
+        `pid`: integer
+    Return:
+        rss, pss, shared and private memory.
+        Figures other than rss are None if /proc/<pid>/smaps_rollup is unavailable.
+        rtype: dict [string, integer]
+    """
+
+    proc = f"/proc/{pid or 'self'}"
+    ret = dict.fromkeys(MEMORY_FIELDS)
+    try:
+        with open(f"{proc}/smaps_rollup", "r") as f:
+            fields = dict()
+            for line in f:
+                name, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[name] = int(value.split()[0]) * 1024
+    except OSError as e:
+        logger.debug(f"Read rss from statm only: {e}")
+        with open(f"{proc}/statm", "r") as f:
+            ret["rss"] = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        return ret
+
+    for key, names in MEMORY_FIELDS.items():
+        ret[key] = sum(fields.get(name, 0) for name in names)
+    return ret
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
@@ -0,0 +1,268 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: MinHash with LSH banding to find near-duplicate news,
+#              e.g. the same wire story lightly edited by different outlets.
+
+import logging
+import os
+import pickle
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+## Html tags and whitespace are dropped before shingling.
+STRIP_PATTERN = re.compile(r"<[^>]*>|\s+", flags=re.U)
+
+## Multiplier of polynomial hash of shingles, modulo 2 ** 64.
+SHINGLE_BASE = np.uint64(0x100000001B3)
+
+## Max number of shingles hashed at once, which bounds memory for huge news.
+BLOCK_SIZE = 4096
+
+
+class NearDuplicateIndex:
+    """A bounded index of MinHash signatures of news and their results"""
+
+    def __init__(
+        self,
+        threshold: Optional[float] = 0.9,
+        num_perm: Optional[int] = 128,
+        bands: Optional[int] = 32,
+        shingle_size: Optional[int] = 5,
+        min_length: Optional[int] = 100,
+        max_entries: Optional[int] = 100000,
+        seed: Optional[int] = 0,
+    ):
+        """
+        Init NearDuplicateIndex.
+        Text is split into overlapping character shingles and summarized by MinHash signature,
+        whose agreement estimates Jaccard similarity of shingles.
+        Signatures are split into bands, and news sharing any band are candidates,
+        so only a few candidates are compared instead of every news in the index.
+
+        Args:
+            `threshold`   : Min estimated Jaccard similarity to be a near-duplicate.
+            `num_perm`    : Number of hash functions (length of signature).
+            `bands`       : Number of bands of signature. It must divide `num_perm`.
+            `shingle_size`: Number of characters of a shingle.
+            `min_length`  : Text shorter than it (without tags and whitespace) is never
+                            looked up, since short text is similar to each other by chance.
+            `max_entries` : Max number of news in the index.
+                            Least recently used news is evicted once it's exceeded.
+            `seed`        : Random seed of hash functions.
+        Type:
+            `threshold`   : float
+            `num_perm`    : integer
+            `bands`       : integer
+            `shingle_size`: integer
+            `min_length`  : integer
+            `max_entries` : integer
+            `seed`        : integer
+        Return:
+            None
+        """
+
+        if num_perm % bands:
+            raise ValueError(f"bands ({bands}) must divide num_perm ({num_perm}).")
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError(f"threshold should be in (0, 1], but got {threshold}")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.min_length = max(min_length, shingle_size)
+        self.max_entries = max_entries
+        self.seed = seed
+
+        ## Multiply-shift hash functions: ((a * x + b) mod 2 ** 64) >> 32, where a is odd.
+        rng = np.random.default_rng(seed)
+        a = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+        self._a = a * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # id -> (namespace, signature, value)
+        self._buckets = dict()  # (namespace, band, band bytes) -> set of ids
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """
+        MinHash signature of text.
+
+        Args:
+            `text`: Input text.
+        Type:
+            `text`: string
+        Return:
+            Signature, or None if text is shorter than `min_length`.
+            rtype: np.ndarray of uint32 (num_perm,)
+        """
+
+        text = STRIP_PATTERN.sub("", text)
+        if len(text) < self.min_length:
+            return None
+
+        k = self.shingle_size
+        chars = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(
+            np.uint64
+        )
+        n = len(chars) - k + 1
+        shingles = np.zeros(n, dtype=np.uint64)
+        for j in range(k):
+            shingles = shingles * SHINGLE_BASE + chars[j : j + n]
+        shingles = np.unique(shingles)
+
+        ret = np.full(self.num_perm, np.iinfo(np.uint32).max, dtype=np.uint64)
+        for i in range(0, len(shingles), BLOCK_SIZE):
+            block = shingles[i : i + BLOCK_SIZE, None]
+            hashed = (block * self._a + self._b) >> np.uint64(32)
+            np.minimum(ret, hashed.min(axis=0), out=ret)
+        return ret.astype(np.uint32)
+
+    def _band_keys(self, namespace: Hashable, signature: np.ndarray):
+        rows = self.num_perm // self.bands
+        return [
+            (namespace, band, signature[band * rows : (band + 1) * rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def query(
+        self, signature: Optional[np.ndarray], namespace: Hashable = None
+    ) -> Optional[Tuple[float, Any]]:
+        """
+        Find the most similar news in the index.
+
+        Args:
+            `signature`: Signature of news from `signature`.
+            `namespace`: News is only compared with news added with the same namespace,
+                         e.g. comparator and version of keywords.
+        Type:
+            `signature`: np.ndarray
+            `namespace`: hashable
+        Return:
+            (estimated similarity, value) of the most similar news, or None if no news is
+            more similar than `threshold`.
+            rtype: Tuple[float, Any]
+        """
+
+        if signature is None:
+            return None
+
+        with self._lock:
+            candidates = set()
+            for key in self._band_keys(namespace, signature):
+                candidates.update(self._buckets.get(key, ()))
+
+            best, best_sim = None, 0.0
+            for id in candidates:
+                sim = float(np.mean(self._entries[id][1] == signature))
+                if sim > best_sim:
+                    best, best_sim = id, sim
+
+            if best is None or best_sim < self.threshold:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best)
+            self.hits += 1
+            return best_sim, self._entries[best][2]
+
+    def add(
+        self, signature: Optional[np.ndarray], value: Any, namespace: Hashable = None
+    ):
+        """
+        Add news into the index.
+
+        Args:
+            `signature`: Signature of news from `signature`. Nothing is added if it's None.
+            `value`    : Anything to be reused by near-duplicates, e.g. results.
+            `namespace`: Please Check in the `query` function.
+        Type:
+            `signature`: np.ndarray
+            `value`    : Any
+            `namespace`: hashable
+        Return:
+            None
+        """
+
+        if signature is None:
+            return
+
+        with self._lock:
+            id = self._next_id
+            self._next_id += 1
+            self._entries[id] = (namespace, signature, value)
+            for key in self._band_keys(namespace, signature):
+                self._buckets.setdefault(key, set()).add(id)
+
+            while len(self._entries) > self.max_entries:
+                old_id, (old_namespace, old_signature, _) = self._entries.popitem(
+                    last=False
+                )
+                for key in self._band_keys(old_namespace, old_signature):
+                    bucket = self._buckets[key]
+                    bucket.discard(old_id)
+                    if not bucket:
+                        del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self):
+        return (
+            f"NearDuplicateIndex(entries={len(self)}, threshold={self.threshold}, "
+            f"hits={self.hits}, misses={self.misses})"
+        )
+
+    def __getstate__(self):
+        with self._lock:
+            return {
+                "config": (
+                    self.threshold,
+                    self.num_perm,
+                    self.bands,
+                    self.shingle_size,
+                    self.min_length,
+                    self.max_entries,
+                    self.seed,
+                ),
+                "entries": list(self._entries.values()),
+            }
+
+    def __setstate__(self, state):
+        self.__init__(*state["config"])
+        for namespace, signature, value in state["entries"]:
+            self.add(signature, value, namespace)
+
+    def save(self, path: str):
+        """
+        Save the index atomically, so that it can be loaded by `NearDuplicateIndex.load`.
+        """
+
+        dirname = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dirname, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fo:
+                pickle.dump(self, fo, pickle.HIGHEST_PROTOCOL)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "NearDuplicateIndex":
+        with open(path, "rb") as f:
+            index = pickle.load(f)
+        if not isinstance(index, cls):
+            raise ValueError(f"{path} is not a {cls.__name__}.")
+        return index
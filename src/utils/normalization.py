@@ -0,0 +1,252 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Normalize news before matching: strip html, decode entities,
+#              fold full-width characters and map simplified to traditional Chinese.
+
+import functools
+import hashlib
+import html
+import logging
+import re
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+## Tags which separate blocks of text. They become line breaks,
+## so that no keyword is matched across two paragraphs.
+BLOCK_TAGS = "p|br|div|li|ul|ol|tr|td|th|table|h[1-6]|blockquote|pre|hr|section|article"
+
+TAG_PATTERNS = {
+    "drop": r"(?P<drop><(?:script|style)\b.*?</(?:script|style)\s*>)",
+    "block": rf"(?P<block></?(?:{BLOCK_TAGS})\b[^>]*>)",
+    ## Only real tags, so that "a < b" in text is kept.
+    "tag": r"(?P<tag><[!/?A-Za-z][^>]*>)",
+}
+ENTITY_PATTERN = r"(?P<entity>&(?:#[0-9]+|#[xX][0-9A-Fa-f]+|[A-Za-z][A-Za-z0-9]*);)"
+## Runs of whitespace which may change: 2+ characters, line breaks, tabs, ideographic
+## spaces and spaces between CJK characters. A single ascii space between words is
+## kept as it is without a callback.
+CJK = "\u2e80-\u9fff\uf900-\ufaff\uff00-\uffef"
+SPACE_PATTERN = rf"(?P<space>\s{{2,}}|[^\S ]|(?<=[{CJK}]) (?=[{CJK}]))"
+CJK_PATTERN = re.compile(rf"[{CJK}]")
+
+## Full-width characters folded into half-width ones. Punctuation of Chinese text
+## (e.g. "，", "（", "：") is common and never in keywords, so it isn't folded.
+WIDTH_CHARS = (
+    "０１２３４５６７８９"
+    "ＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ"
+    "ａｂｃｄｅｆｇｈｉｊｋｌｍｎｏｐｑｒｓｔｕｖｗｘｙｚ"
+    "＃＄％＆＊＋－．／＠＿"
+)
+
+## Zero-width characters, which split keywords without being visible.
+ZERO_WIDTH = "\u200b\u200c\u200d\u2060\ufeff"
+
+## Ranges of CJK characters which are looked up in a simplified-to-traditional converter.
+CJK_RANGES = ((0x3400, 0x4DBF), (0x4E00, 0x9FFF))
+
+
+class TextNormalizer:
+    """A normalization stage ahead of matching, which is shared by title and body"""
+
+    def __init__(
+        self,
+        strip_html: Optional[bool] = True,
+        decode_entities: Optional[bool] = True,
+        fold_width: Optional[bool] = True,
+        collapse_whitespace: Optional[bool] = True,
+        to_traditional: Optional[bool] = False,
+        s2t_table: Optional[str] = None,
+    ):
+        """
+        Init TextNormalizer.
+        Markup, entities and whitespace are handled by one regular expression,
+        and characters are mapped by one precompiled translation table,
+        so text is normalized in two passes at most whatever is enabled.
+        Keywords are normalized by the same table (`normalize_keywords`),
+        so that no variant of a keyword is needed in keyword lists.
+
+        Args:
+            `strip_html`         : Whether to remove tags. Block tags (e.g. <p>, <br>)
+                                   become line breaks, and <script>/<style> are dropped.
+            `decode_entities`    : Whether to decode entities, e.g. "&amp;" and "&#35441;".
+            `fold_width`         : Whether to fold full-width letters, digits and symbols
+                                   which appear in names (e.g. "＆") into half-width ones,
+                                   and ideographic or no-break spaces into spaces.
+                                   Full-width punctuation (e.g. "，") is kept, since
+                                   it's never a part of keywords.
+            `collapse_whitespace`: Whether to collapse runs of whitespace into a space.
+                                   Whitespace between CJK characters (e.g. hard-wrapped
+                                   lines) is removed, and 2+ line breaks are kept as one.
+            `to_traditional`     : Whether to map simplified Chinese into traditional
+                                   Chinese character by character.
+            `s2t_table`          : Tab-separated file of "simplified\ttraditional"
+                                   characters. Default is built by OpenCC, which is
+                                   required then (pip install opencc).
+        Type:
+            `strip_html`         : bool
+            `decode_entities`    : bool
+            `fold_width`         : bool
+            `collapse_whitespace`: bool
+            `to_traditional`     : bool
+            `s2t_table`          : string
+        Return:
+            None
+        """
+
+        self.strip_html = strip_html
+        self.decode_entities = decode_entities
+        self.fold_width = fold_width
+        self.collapse_whitespace = collapse_whitespace
+        self.to_traditional = to_traditional
+        self.s2t_table = s2t_table
+
+        patterns = list()
+        if strip_html:
+            patterns.extend(TAG_PATTERNS.values())
+        if decode_entities:
+            patterns.append(ENTITY_PATTERN)
+        if collapse_whitespace:
+            patterns.append(SPACE_PATTERN)
+        ## Positions which can't start any pattern are skipped by the lookahead.
+        self._pattern = (
+            re.compile(f"(?=[<&\\s])(?:{'|'.join(patterns)})", flags=re.I | re.S)
+            if patterns
+            else None
+        )
+
+        table = dict()
+        if fold_width:
+            table.update(width_table())
+        if to_traditional:
+            table.update(s2t(s2t_table))
+        table.update({ord(c): None for c in ZERO_WIDTH})
+        self._table = table
+        ## Most news has no character to map, so it isn't translated at all.
+        self._chars = re.compile(
+            "[" + "".join(re.escape(chr(code)) for code in sorted(table)) + "]"
+        )
+
+        sha = hashlib.sha1(
+            repr((strip_html, decode_entities, fold_width, collapse_whitespace)).encode(
+                "utf-8"
+            )
+        )
+        for key in sorted(table):
+            sha.update(f"{key}:{table[key]};".encode("utf-8"))
+        self.signature = sha.hexdigest()[:16]
+
+    def __repr__(self):
+        return (
+            f"TextNormalizer(strip_html={self.strip_html}, "
+            f"decode_entities={self.decode_entities}, fold_width={self.fold_width}, "
+            f"collapse_whitespace={self.collapse_whitespace}, "
+            f"to_traditional={self.to_traditional}, signature={self.signature})"
+        )
+
+    def __call__(self, text: str) -> str:
+        """
+        Normalize text.
+
+        Args:
+            `text`: News title or body, which may be html.
+        Type:
+            `text`: string
+        Return:
+            Normalized text.
+            rtype: string
+        """
+
+        if self._pattern is not None:
+            text = self._pattern.sub(self._replace, text)
+        if self._chars.search(text):
+            text = text.translate(self._table)
+        return text.strip()
+
+    def _replace(self, m: re.Match) -> str:
+        kind = m.lastgroup
+        if kind == "space":
+            run = m.group()
+            if run.count("\n") >= 2:
+                return "\n"
+            text = m.string
+            prev = text[m.start() - 1] if m.start() > 0 else ""
+            next = text[m.end()] if m.end() < len(text) else ""
+            if CJK_PATTERN.match(prev) and CJK_PATTERN.match(next):
+                return ""
+            return " "
+        if kind == "entity":
+            return html.unescape(m.group())
+        if kind == "block":
+            return "\n"
+        return ""
+
+    def normalize_keywords(self, keywords: Iterable[str]) -> List[str]:
+        """
+        Keywords mapped by the translation table, without duplicates in order.
+        Keywords aren't markup, so only characters are mapped.
+        """
+
+        ret = (keyword.translate(self._table).strip() for keyword in keywords)
+        return list(dict.fromkeys(keyword for keyword in ret if keyword))
+
+
+def width_table() -> Dict[int, str]:
+    """
+    Full-width letters, digits and symbols of `WIDTH_CHARS` into half-width ones,
+    and ideographic space and no-break space into space.
+    """
+
+    table = {ord(c): chr(ord(c) - 0xFEE0) for c in WIDTH_CHARS}
+    table[0x3000] = " "
+    table[0x00A0] = " "
+    return table
+
+
+@functools.lru_cache(maxsize=None)
+def s2t(path: Optional[str] = None) -> Dict[int, str]:
+    """
+    Translation table of simplified Chinese characters into traditional ones.
+    It's character by character, so a character with several traditional forms
+    takes its most common one.
+
+    Args:
+        `path`: Please Check in the `TextNormalizer.__init__` function (`s2t_table`).
+    Type:
+        `path`: string
+    Return:
+        Translation table for `str.translate`.
+        rtype: dict [integer, string]
+    """
+
+    if path is not None:
+        table = dict()
+        with open(path, "r", encoding="utf-8-sig") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) >= 2 and len(parts[0]) == 1 and parts[1]:
+                    table[ord(parts[0])] = parts[1]
+        return table
+
+    try:
+        import opencc
+    except ImportError:
+        raise ImportError(
+            "opencc is required to map simplified into traditional Chinese "
+            "(pip install opencc), or please give s2t_table."
+        )
+    try:
+        converter = opencc.OpenCC("s2t")
+    except Exception:
+        converter = opencc.OpenCC("s2t.json")
+
+    ## One character per line, so that no phrase is converted as a whole.
+    chars = [chr(code) for start, end in CJK_RANGES for code in range(start, end + 1)]
+    converted = converter.convert("\n".join(chars)).split("\n")
+    if len(converted) != len(chars):
+        raise ValueError("OpenCC changed the number of characters.")
+    return {
+        ord(simplified): traditional
+        for simplified, traditional in zip(chars, converted)
+        if simplified != traditional and len(traditional) == 1
+    }
@@ -0,0 +1,129 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Offset-based sentence segmentation and assignment of keyword hits to sentences.
+
+import hashlib
+import logging
+import re
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from src.utils.matcher import BaseMatcher
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_PATTERN = re.compile(r"[^!?。\.\!\?]+[!?。\.\!\?]?", flags=re.U)
+
+
+def sentence_spans(text: str) -> Tuple[List[int], List[int]]:
+    """
+    Offsets of sentences in text. No sentence is copied.
+    Sentences are the same as `re.findall(SENTENCE_PATTERN, text)`.
+
+    Args:
+        `text`: Input text.
+    Type:
+        `text`: string
+    Return:
+        start offsets, end offsets of sentences
+        rtype1: list of integer
+        rtype2: list of integer
+    """
+
+    starts = list()
+    ends = list()
+    for m in SENTENCE_PATTERN.finditer(text):
+        start, end = m.span()
+        starts.append(start)
+        ends.append(end)
+    return starts, ends
+
+
+def count_by_sentence(
+    matcher: BaseMatcher,
+    text: str,
+    spans: Tuple[List[int], List[int]],
+    known: Optional[Dict[bytes, Tuple[Tuple[int, int], ...]]] = None,
+) -> Dict[int, Dict[int, int]]:
+    """
+    Match keywords once over the whole text and assign each hit to its sentence
+    by binary search over sentence offsets.
+    Hits crossing a sentence boundary are dropped, and occurrences of the same keyword
+    never overlap, so counts are the same as scanning every sentence on its own.
+
+    Args:
+        `matcher`: Keyword matcher.
+        `text`   : Input text.
+        `spans`  : Offsets of sentences from `sentence_spans`.
+        `known`  : Counts of sentences already scanned, keyed by their digests,
+                   e.g. from `sentence_table` of a near-duplicate.
+                   Only sentences not in it are scanned.
+    Type:
+        `matcher`: BaseMatcher
+        `text`   : string
+        `spans`  : Tuple[list of integer, list of integer]
+        `known`  : dict [bytes, tuple of (integer, integer)]
+    Return:
+        Count of each matched keyword in each sentence, in order of sentences.
+        rtype: dict [integer (sentence index), dict [integer (keyword id), integer]]
+    """
+
+    starts, ends = spans
+    if known is not None:
+        ## Sentences of a near-duplicate that are known reuse their counts,
+        ## and only the others (e.g. added or edited paragraphs) are scanned.
+        ret = dict()
+        for i, (start, end) in enumerate(zip(starts, ends)):
+            sentence = text[start:end]
+            counts = known.get(sentence_digest(sentence))
+            counts = dict(counts) if counts is not None else matcher.count(sentence)
+            if counts:
+                ret[i] = counts
+        return ret
+
+    lengths = matcher.lengths
+    last_end = dict()
+    ret = dict()
+    for start, kid in matcher.finditer(text):
+        end = start + lengths[kid]
+        i = bisect_right(starts, start) - 1
+        if i < 0 or end > ends[i] or start < last_end.get(kid, 0):
+            continue
+        last_end[kid] = end
+        counts = ret.setdefault(i, dict())
+        counts[kid] = counts.get(kid, 0) + 1
+    return ret
+
+
+def sentence_digest(sentence: str) -> bytes:
+    ## Stable across processes, unlike hash(), so that tables can be saved and shared.
+    return hashlib.blake2b(sentence.encode("utf-8"), digest_size=8).digest()
+
+
+def sentence_table(
+    text: str,
+    spans: Tuple[List[int], List[int]],
+    sentence_counts: Dict[int, Dict[int, int]],
+) -> Dict[bytes, Tuple[Tuple[int, int], ...]]:
+    """
+    Counts of every sentence keyed by its digest, which can be passed to
+    `count_by_sentence` as `known` for a near-duplicate of text.
+
+    Args:
+        `text`           : Input text.
+        `spans`          : Please Check in the `count_by_sentence` function.
+        `sentence_counts`: Result of `count_by_sentence`.
+    Type:
+        `text`           : string
+        `spans`          : Tuple[list of integer, list of integer]
+        `sentence_counts`: dict [integer, dict [integer, integer]]
+    Return:
+        (keyword id, count) of each sentence, keyed by digest of the sentence.
+        rtype: dict [bytes, tuple of (integer, integer)]
+    """
+
+    starts, ends = spans
+    return {
+        sentence_digest(text[start:end]): tuple(sentence_counts.get(i, dict()).items())
+        for i, (start, end) in enumerate(zip(starts, ends))
+    }
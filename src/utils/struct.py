@@ -3,9 +3,11 @@
 # Description: Data Structure
 
 import logging
+from array import array
+from collections.abc import Sequence
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Dict, List, Tuple, Union
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
 
 # import torch
 
@@ -33,6 +35,124 @@ class NewsCategory(Enum):
     OTHER = "Other"
 
 
+class DebugSpans(Sequence):
+    """
+    Debug details stored as spans that point into the original news.
+    Each detail {"keywords": [...], "text": sentence} is built only when it's accessed,
+    e.g. indexing, iterating, rendering or serializing.
+    """
+
+    __slots__ = ("title", "body", "keywords", "title_keyword_ids", "spans")
+
+    def __init__(
+        self,
+        title: str,
+        body: str,
+        keywords: Tuple[str],
+        title_keyword_ids: Optional[Tuple[int, ...]] = None,
+        spans: Optional[List[Tuple[int, int, Tuple[int, ...]]]] = None,
+    ):
+        """
+        Args:
+            `title`            : Title of news.
+            `body`             : Content of news.
+            `keywords`         : Keyword table that keyword ids refer to.
+            `title_keyword_ids`: Ids of keywords matched in title, or None if nothing matched.
+            `spans`            : (sentence_start, sentence_end, keyword_ids) of body sentences
+                                 that contain keywords.
+        """
+
+        self.title = title
+        self.body = body
+        self.keywords = keywords
+        self.title_keyword_ids = title_keyword_ids
+        self.spans = spans or list()
+
+    def __len__(self) -> int:
+        return len(self.spans) + (self.title_keyword_ids is not None)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("DebugSpans index out of range")
+
+        if self.title_keyword_ids is not None:
+            if i == 0:
+                return self._detail(self.title_keyword_ids, self.title)
+            i -= 1
+        start, end, keyword_ids = self.spans[i]
+        return self._detail(keyword_ids, self.body[start:end])
+
+    def _detail(self, keyword_ids: Tuple[int, ...], text: str) -> Dict[str, str]:
+        return {"keywords": [self.keywords[k] for k in keyword_ids], "text": text}
+
+    def __eq__(self, other):
+        if isinstance(other, (DebugSpans, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __getstate__(self):
+        ## Only keep matched keywords instead of the whole keyword table, and sentences
+        ## that contain keywords instead of the whole news when pickling.
+        used = sorted(
+            set(self.title_keyword_ids or tuple()).union(
+                *(keyword_ids for _, _, keyword_ids in self.spans)
+            )
+        )
+        remap = {k: i for i, k in enumerate(used)}
+        sentences = list()
+        spans = list()
+        offset = 0
+        for start, end, keyword_ids in self.spans:
+            sentences.append(self.body[start:end])
+            spans.append(
+                (offset, offset + end - start, tuple(remap[k] for k in keyword_ids))
+            )
+            offset += end - start
+        return (
+            "" if self.title_keyword_ids is None else self.title,
+            "".join(sentences),
+            tuple(self.keywords[k] for k in used),
+            (
+                None
+                if self.title_keyword_ids is None
+                else tuple(remap[k] for k in self.title_keyword_ids)
+            ),
+            spans,
+        )
+
+    def __setstate__(self, state):
+        (
+            self.title,
+            self.body,
+            self.keywords,
+            self.title_keyword_ids,
+            self.spans,
+        ) = state
+
+
+class CountsStruct(NamedTuple):
+    """
+    Raw counts of matched keywords, which don't depend on threshold and weights,
+    so that news can be scored again without scanning. Keyword ids are positions
+    in keywords of each category of the version, and keyword counts are counts
+    of them in title and body.
+    """
+
+    categories: Tuple[str, ...]
+    title: Tuple[int, ...]
+    body: Tuple[int, ...]
+    keyword_ids: Tuple[Tuple[int, ...], ...]
+    keyword_counts: Tuple[Tuple[int, ...], ...]
+    version: Optional[str] = None
+
+
 @dataclass
 class SimpleComparatorStruct:
 
@@ -40,7 +160,9 @@ class SimpleComparatorStruct:
     news_category: NewsCategory
     score: float
     keywords: List[str] = field(default_factory=list)
-    debug: List[Dict[str, str]] = field(default_factory=list)
+    debug: Union[DebugSpans, List[Dict[str, str]]] = field(default_factory=list)
+    keywords_version: Optional[str] = None
+    counts: Optional[CountsStruct] = None
 
     def __repr__(self):
         return (
@@ -48,6 +170,7 @@ class SimpleComparatorStruct:
             f"[ CATEGORY ]: {self.news_category}\n"
             f"[   SCORE  ]: {self.score}\n"
             f"[ KEYWORDS ]: {self.keywords}\n"
+            f"[  VERSION ]: {self.keywords_version}\n"
             f"[   DEBUG  ]: See details below.\n"
         ) + (
             "\n".join(
@@ -58,6 +181,110 @@ class SimpleComparatorStruct:
             else ("self.debug is False. So Nothing is in DEBUG.")
         )
 
+    def __2dict__(self):
+        return {
+            "id": self.id,
+            "news_category": self.news_category.value,
+            "score": self.score,
+            "keywords": self.keywords,
+            "debug": list(self.debug) if self.debug is not None else None,
+            "keywords_version": self.keywords_version,
+        }
+
+
+def _pack_keywords(
+    keyword_ids: Sequence, keywords: Sequence[str]
+) -> Tuple[array, Tuple[str, ...]]:
+    ## Only keep matched keywords instead of the whole keyword table when pickling.
+    ## Keyword ids are unique, so they're remapped into 0, 1, ... in the same order.
+    return array("I", range(len(keyword_ids))), tuple(keywords[k] for k in keyword_ids)
+
+
+class CompactComparatorStruct:
+    """
+    Compact variant of SimpleComparatorStruct returned by `classify_compact`.
+    Matched keywords are kept as ids into the frozen keyword table of
+    the comparator, which is shared by all results, and strings are resolved
+    only when `keywords` is accessed. It has the same repr and dict view.
+    """
+
+    __slots__ = (
+        "id",
+        "news_category",
+        "score",
+        "keyword_ids",
+        "keyword_table",
+        "debug",
+        "keywords_version",
+        "counts",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        news_category: NewsCategory,
+        score: float,
+        keyword_ids: Iterable[int],
+        keyword_table: Tuple[str, ...],
+        debug: Union[DebugSpans, List[Dict[str, str]], None] = None,
+        keywords_version: Optional[str] = None,
+        counts: Optional[CountsStruct] = None,
+    ):
+        """
+        Args:
+            `keyword_ids`  : Ids of matched keywords, in the order of `keywords`.
+            `keyword_table`: Keyword table that keyword ids refer to.
+            Other arguments: Please Check in the `SimpleComparatorStruct`.
+        """
+
+        self.id = id
+        self.news_category = news_category
+        self.score = score
+        self.keyword_ids = array("I", keyword_ids)
+        self.keyword_table = keyword_table
+        self.debug = debug
+        self.keywords_version = keywords_version
+        self.counts = counts
+
+    @property
+    def keywords(self) -> List[str]:
+        return [self.keyword_table[k] for k in self.keyword_ids]
+
+    __repr__ = SimpleComparatorStruct.__repr__
+    __2dict__ = SimpleComparatorStruct.__2dict__
+
+    def __eq__(self, other):
+        if isinstance(other, CompactComparatorStruct):
+            return (self.__2dict__(), self.counts) == (other.__2dict__(), other.counts)
+        return NotImplemented
+
+    def __getstate__(self):
+        keyword_ids, keyword_table = _pack_keywords(
+            self.keyword_ids, self.keyword_table
+        )
+        return (
+            self.id,
+            self.news_category,
+            self.score,
+            keyword_ids,
+            keyword_table,
+            self.debug,
+            self.keywords_version,
+            self.counts,
+        )
+
+    def __setstate__(self, state):
+        (
+            self.id,
+            self.news_category,
+            self.score,
+            self.keyword_ids,
+            self.keyword_table,
+            self.debug,
+            self.keywords_version,
+            self.counts,
+        ) = state
+
 
 @dataclass
 class SpecStruct:
@@ -68,7 +295,11 @@ class SpecStruct:
     ESG: bool
     ESG_SCORE: float
     ESG_KEYWORDS: List[str]
-    DEBUG: Dict[str, List[Dict[str, str]]] = field(default_factory=dict)
+    DEBUG: Dict[str, Union[DebugSpans, List[Dict[str, str]]]] = field(
+        default_factory=dict
+    )
+    KEYWORDS_VERSION: Optional[str] = None
+    COUNTS: Optional[CountsStruct] = None
 
     def __repr__(self):
         return (
@@ -78,6 +309,7 @@ class SpecStruct:
             f"[      ESG     ]: {self.ESG}\n"
             f"[   ESG_SCORE  ]: {self.ESG_SCORE}\n"
             f"[ ESG_KEYWORDS ]: {self.ESG_KEYWORDS}\n"
+            f"[   VERSION    ]: {self.KEYWORDS_VERSION}\n"
             f"[     DEBUG    ]: See details below.\n"
         ) + (
             "\n".join(
@@ -89,6 +321,147 @@ class SpecStruct:
             else ("DEBUG is False. So Nothing is in DEBUG.")
         )
 
+    def __2dict__(self):
+        return {
+            "NN": self.NN,
+            "NN_SCORE": self.NN_SCORE,
+            "NN_KEYWORDS": self.NN_KEYWORDS,
+            "ESG": self.ESG,
+            "ESG_SCORE": self.ESG_SCORE,
+            "ESG_KEYWORDS": self.ESG_KEYWORDS,
+            "DEBUG": (
+                {cate: list(details) for cate, details in self.DEBUG.items()}
+                if self.DEBUG
+                else self.DEBUG
+            ),
+            "KEYWORDS_VERSION": self.KEYWORDS_VERSION,
+        }
+
+
+class CompactSpecStruct:
+    """
+    Compact variant of SpecStruct returned by `FusedComparator.classify_compact`.
+    Matched keywords of both categories are kept in one array of ids,
+    NN ids first, into the frozen keyword tables of the comparator, and strings are
+    resolved only when NN_KEYWORDS or ESG_KEYWORDS is accessed.
+    It has the same repr and dict view.
+    """
+
+    __slots__ = (
+        "NN",
+        "NN_SCORE",
+        "ESG",
+        "ESG_SCORE",
+        "keyword_ids",
+        "keyword_split",
+        "keyword_tables",
+        "DEBUG",
+        "KEYWORDS_VERSION",
+        "COUNTS",
+    )
+
+    def __init__(
+        self,
+        NN: bool,
+        NN_SCORE: float,
+        ESG: bool,
+        ESG_SCORE: float,
+        NN_KEYWORD_IDS: Iterable[int],
+        ESG_KEYWORD_IDS: Iterable[int],
+        keyword_tables: Tuple[Tuple[str, ...], Tuple[str, ...]],
+        DEBUG: Optional[Dict[str, Union[DebugSpans, List[Dict[str, str]]]]] = None,
+        KEYWORDS_VERSION: Optional[str] = None,
+        COUNTS: Optional[CountsStruct] = None,
+    ):
+        """
+        Args:
+            `NN_KEYWORD_IDS` : Ids of matched keywords of "Negative_News",
+                               in the order of `NN_KEYWORDS`.
+            `ESG_KEYWORD_IDS`: Ids of matched keywords of "ESG_News",
+                               in the order of `ESG_KEYWORDS`.
+            `keyword_tables` : Keyword tables of ("Negative_News", "ESG_News")
+                               that keyword ids refer to.
+            Other arguments: Please Check in the `SpecStruct`.
+        """
+
+        self.NN = NN
+        self.NN_SCORE = NN_SCORE
+        self.ESG = ESG
+        self.ESG_SCORE = ESG_SCORE
+        self.keyword_ids = array("I", NN_KEYWORD_IDS)
+        self.keyword_split = len(self.keyword_ids)
+        self.keyword_ids.extend(ESG_KEYWORD_IDS)
+        self.keyword_tables = keyword_tables
+        self.DEBUG = DEBUG
+        self.KEYWORDS_VERSION = KEYWORDS_VERSION
+        self.COUNTS = COUNTS
+
+    @property
+    def NN_KEYWORD_IDS(self) -> array:
+        return self.keyword_ids[: self.keyword_split]
+
+    @property
+    def ESG_KEYWORD_IDS(self) -> array:
+        return self.keyword_ids[self.keyword_split :]
+
+    @property
+    def NN_KEYWORDS(self) -> List[str]:
+        table = self.keyword_tables[0]
+        return [table[k] for k in self.NN_KEYWORD_IDS]
+
+    @property
+    def ESG_KEYWORDS(self) -> List[str]:
+        table = self.keyword_tables[1]
+        return [table[k] for k in self.ESG_KEYWORD_IDS]
+
+    __repr__ = SpecStruct.__repr__
+    __2dict__ = SpecStruct.__2dict__
+
+    def __eq__(self, other):
+        if isinstance(other, CompactSpecStruct):
+            return (self.__2dict__(), self.COUNTS) == (other.__2dict__(), other.COUNTS)
+        return NotImplemented
+
+    def __getstate__(self):
+        nn_ids, nn_table = _pack_keywords(self.NN_KEYWORD_IDS, self.keyword_tables[0])
+        esg_ids, esg_table = _pack_keywords(
+            self.ESG_KEYWORD_IDS, self.keyword_tables[1]
+        )
+        return (
+            self.NN,
+            self.NN_SCORE,
+            self.ESG,
+            self.ESG_SCORE,
+            nn_ids + esg_ids,
+            len(nn_ids),
+            (nn_table, esg_table),
+            self.DEBUG,
+            self.KEYWORDS_VERSION,
+            self.COUNTS,
+        )
+
+    def __setstate__(self, state):
+        (
+            self.NN,
+            self.NN_SCORE,
+            self.ESG,
+            self.ESG_SCORE,
+            self.keyword_ids,
+            self.keyword_split,
+            self.keyword_tables,
+            self.DEBUG,
+            self.KEYWORDS_VERSION,
+            self.COUNTS,
+        ) = state
+
+
+class ArticleStruct(NamedTuple):
+
+    ArticleId: str
+    Headline: str
+    BodyHtml: str
+    PubDateTime: str
+
 
 @dataclass
 class KeyGenerator_WordStruct:
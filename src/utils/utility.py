@@ -90,7 +90,8 @@ def load(input: Union[str, List[str]]) -> List[str]:
             else:
                 ret.append(ipt)
 
-    return list(set(ret))
+    ## Remove duplicates but keep the order, so that keyword ids are stable among processes.
+    return list(dict.fromkeys(ret))
 
 
 def load_stopwords(
@@ -0,0 +1,190 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for batch classification
+
+import glob
+import json
+import logging
+import pickle
+
+import pytest
+
+from src import batch as ba
+from src.batch import (
+    ResultBatch,
+    WorkerPool,
+    classify_batch,
+    classify_columns,
+    classify_iter,
+)
+from src.FusedComparator import FusedComparator
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture(scope="module")
+def items():
+    ret = list()
+    for fn in sorted(glob.glob("data/dowjones/*.json")):
+        data = json.load(open(fn, "r", encoding="utf-8"))
+        ret.append((data["ArticleId"], data["Headline"], data["BodyHtml"]))
+    return ret
+
+
+@pytest.fixture(scope="module")
+def expected(items):
+    reader = FusedComparator()
+    return {id: reader.classify(title, body) for id, title, body in items}
+
+
+def assert_same(ret, expected):
+    assert ret.NN == expected.NN and ret.ESG == expected.ESG
+    assert ret.NN_SCORE == expected.NN_SCORE and ret.ESG_SCORE == expected.ESG_SCORE
+    assert sorted(ret.NN_KEYWORDS) == sorted(expected.NN_KEYWORDS)
+    assert sorted(ret.ESG_KEYWORDS) == sorted(expected.ESG_KEYWORDS)
+
+
+@pytest.mark.parametrize(
+    argnames=("name, processes, chunksize"),
+    argvalues=[("TEST-serial", 1, 4), ("TEST-pool", 2, 3)],
+    ids=["TEST-serial", "TEST-pool"],
+)
+def test_classify_batch_in_order(items, expected, name, processes, chunksize):
+    rets = classify_batch(items, processes=processes, chunksize=chunksize)
+    assert [id for id, _ in rets] == [id for id, _, _ in items]
+    for id, ret in rets:
+        assert_same(ret, expected[id])
+
+
+def test_classify_iter_as_completed(items, expected):
+    rets = list(classify_iter(iter(items), processes=2, chunksize=2, ordered=False))
+    assert sorted(id for id, _ in rets) == sorted(id for id, _, _ in items)
+    for id, ret in rets:
+        assert_same(ret, expected[id])
+
+
+def test_classify_iter_in_process_interleaved(items):
+    ## Generators in the same process don't share their comparators.
+    kwargs = [
+        {"keywords": {"Negative_News": ["詐欺"]}, "load_default": False},
+        {"keywords": {"Negative_News": ["環保"]}, "load_default": False},
+    ]
+    iters = [classify_iter(items, processes=1, chunksize=1, **kw) for kw in kwargs]
+    readers = [FusedComparator(**kw) for kw in kwargs]
+    for id, title, body in items[:3]:
+        for it, reader in zip(iters, readers):
+            ret_id, ret = next(it)
+            assert ret_id == id
+            assert_same(ret, reader.classify(title, body))
+
+
+def test_in_process_keeps_worker_globals(items, expected, monkeypatch):
+    ## Classifying in the current process doesn't replace comparators of workers.
+    sentinel = object()
+    monkeypatch.setattr(ba, "_worker_reader", sentinel)
+    batch = classify_columns(items[:3], processes=1)
+    rets = list(classify_iter(items[:3], processes=1))
+    assert ba._worker_reader is sentinel
+    for (id, ret), (_, columns_ret) in zip(rets, batch.results()):
+        assert_same(ret, expected[id])
+        assert_same(columns_ret, expected[id])
+
+
+def test_worker_pool(items, expected):
+    with WorkerPool(2) as pool:
+        rets = list(pool.classify_iter(items, chunksize=2))
+        assert [id for id, _ in rets] == [id for id, _, _ in items]
+        for id, ret in rets:
+            assert_same(ret, expected[id])
+
+        ## Workers are kept, and classify arguments are given per call.
+        rets = list(pool.classify_iter(items[:3], chunksize=1, threshold=-1.0))
+        assert all(ret.NN and ret.ESG for _, ret in rets)
+
+        memory = pool.memory()
+        assert 1 <= len(memory) <= 2
+        for m in memory:
+            assert m["pid"] in pool.pids
+            assert m["rss"] > 0
+            if m["pss"] is not None:
+                assert m["private"] <= m["rss"]
+
+
+@pytest.mark.parametrize(
+    argnames=("name, processes, chunksize"),
+    argvalues=[("TEST-serial", 1, 4), ("TEST-pool", 2, 3)],
+    ids=["TEST-serial", "TEST-pool"],
+)
+def test_classify_columns(items, expected, name, processes, chunksize):
+    batch = classify_columns(items, processes=processes, chunksize=chunksize)
+    assert batch.size == len(items)
+    assert batch.ids == [id for id, _, _ in items]
+    assert batch.categories == ["Negative_News", "ESG_News"]
+    ## Keyword tables are kept once, though every chunk has its own copy.
+    assert len(batch.versions) == len(batch.keyword_tables) == 1
+    assert batch.flags.shape == batch.scores.shape == (len(items), 2)
+    assert batch.hit_start[-1] == len(batch.hit_ids)
+
+    for i, (id, ret) in enumerate(batch.results()):
+        assert_same(ret, expected[id])
+        assert batch.flags[i].tolist() == [expected[id].NN, expected[id].ESG]
+        assert sorted(batch.keywords(i, "ESG_News")) == sorted(
+            expected[id].ESG_KEYWORDS
+        )
+        assert ret.KEYWORDS_VERSION == expected[id].KEYWORDS_VERSION
+
+    ## Opt in to columns by the batch API.
+    columns = classify_batch(
+        items, columns=True, processes=processes, chunksize=chunksize
+    )
+    assert isinstance(columns, ResultBatch)
+    assert columns.ids == batch.ids
+    assert columns.hit_ids.tolist() == batch.hit_ids.tolist()
+
+    halves = ResultBatch.concat(
+        [
+            classify_columns(items[:5], processes=1),
+            classify_columns(items[5:], processes=1, threshold=-1.0),
+        ]
+    )
+    assert halves.ids == batch.ids
+    assert halves.flags[:5].tolist() == batch.flags[:5].tolist()
+    assert halves.flags[5:].all()
+    assert halves.hit_ids.tolist() == batch.hit_ids.tolist()
+    assert ResultBatch.concat([]).size == 0
+
+
+def test_columns_without_tables(items, monkeypatch):
+    ## Chunks of workers only carry versions of keyword tables.
+    reader = FusedComparator()
+    monkeypatch.setattr(ba, "_worker_reader", reader)
+    chunk = ba._classify_columns_chunk(items[:1], dict())
+    assert chunk.keyword_tables == [None]
+    assert chunk.versions == [reader.keywords_version]
+    assert len(pickle.dumps(chunk)) < 2000
+
+    with WorkerPool(2) as pool:
+        expected = pool.classify_columns(items, chunksize=3)
+        assert expected.keyword_tables == [ba._compact_tables(reader)[1]]
+
+        ## Tables of a version unknown to the pool are fetched from a worker.
+        pool._keyword_tables.clear()
+        batch = pool.classify_columns(items, chunksize=3)
+        assert batch.keyword_tables == expected.keyword_tables
+        for (_, ret), (_, other) in zip(batch.results(), expected.results()):
+            assert ret == other
+
+
+@pytest.mark.parametrize(
+    argnames=("name, kwargs"),
+    argvalues=[
+        ("TEST-0", {"debug": True}),
+        ("TEST-1", {"keep_counts": True}),
+        ("TEST-2", {"ordered": False}),
+        ("TEST-3", {"unknown": 1}),
+    ],
+    ids=["TEST-0", "TEST-1", "TEST-2", "TEST-3"],
+)
+def test_classify_batch_columns_unsupported(items, name, kwargs):
+    with pytest.raises(ValueError, match=list(kwargs)[0]):
+        classify_batch(items, columns=True, processes=1, **kwargs)
@@ -0,0 +1,153 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for FusedComparator
+
+import glob
+import json
+import logging
+
+import pytest
+
+from src.FusedComparator import FusedComparator
+from src.SimpleComparator import SimpleComparator
+from src.utils import struct as st
+
+logger = logging.getLogger(__name__)
+
+test_data = [
+    (f"TEST-{i}", json.load(open(fn, "r", encoding="utf-8")))
+    for i, fn in enumerate(sorted(glob.glob("data/dowjones/*.json")))
+]
+
+
+@pytest.fixture(scope="module")
+def fused_reader():
+    return FusedComparator(debug=True)
+
+
+@pytest.fixture(scope="module")
+def nn_reader():
+    return SimpleComparator(category="Negative_News", debug=True)
+
+
+@pytest.fixture(scope="module")
+def esg_reader():
+    return SimpleComparator(category="ESG_News", debug=True)
+
+
+@pytest.mark.parametrize(
+    argnames=("name, data"),
+    argvalues=test_data,
+    ids=[f"{i[0]}" for i in test_data],
+)
+def test_same_as_simple_comparators(fused_reader, nn_reader, esg_reader, name, data):
+    news_title, news_body = data["Headline"], data["BodyHtml"]
+    ret = fused_reader.classify(news_title, news_body)
+    nn_res = nn_reader.classify(news_title, news_body)
+    esg_res = esg_reader.classify(news_title, news_body)
+
+    assert isinstance(ret, st.SpecStruct)
+    assert ret.NN == (nn_res.news_category == st.NewsCategory.NN)
+    assert ret.NN_SCORE == nn_res.score
+    assert sorted(ret.NN_KEYWORDS) == sorted(nn_res.keywords)
+    assert ret.DEBUG["NN"] == nn_res.debug
+    assert ret.ESG == (esg_res.news_category == st.NewsCategory.ESG)
+    assert ret.ESG_SCORE == esg_res.score
+    assert sorted(ret.ESG_KEYWORDS) == sorted(esg_res.keywords)
+    assert ret.DEBUG["ESG"] == esg_res.debug
+
+
+def test_custom_keywords():
+    reader = FusedComparator(
+        keywords={"Negative_News": ["詐財"], "ESG_News": ["詐財", "環保"]},
+        load_default=False,
+    )
+    ret = reader.classify("假釋又使壞 詐財被活逮", "詐財一百八十萬元。響應環保。")
+    assert ret.NN_KEYWORDS == ["詐財"]
+    assert sorted(ret.ESG_KEYWORDS) == ["環保", "詐財"]
+    assert ret.DEBUG is None
+
+
+def test_unsupported_category():
+    with pytest.raises(ValueError):
+        FusedComparator(keywords={"Other": ["詐財"]})
+
+
+def test_shared_tables(fused_reader, nn_reader):
+    shared_reader = FusedComparator(debug=True, shared_tables=True)
+    shared_nn_reader = SimpleComparator(
+        category="Negative_News", debug=True, shared_tables=True
+    )
+    for _, data in test_data:
+        news_title, news_body = data["Headline"], data["BodyHtml"]
+        ret = shared_reader.classify(news_title, news_body)
+        expected = fused_reader.classify(news_title, news_body)
+        assert ret.__2dict__() == expected.__2dict__()
+        nn_ret = shared_nn_reader.classify(news_title, news_body)
+        nn_expected = nn_reader.classify(news_title, news_body)
+        assert nn_ret.score == nn_expected.score
+        assert nn_ret.keywords == nn_expected.keywords
+        assert nn_ret.debug == nn_expected.debug
+
+    with pytest.raises(ValueError):
+        FusedComparator(use_artifact=False, shared_tables=True)
+
+
+@pytest.mark.parametrize(
+    argnames=("name, data"),
+    argvalues=test_data,
+    ids=[f"{i[0]}" for i in test_data],
+)
+def test_classify_compact(fused_reader, nn_reader, name, data):
+    news_title, news_body = data["Headline"], data["BodyHtml"]
+    ret = fused_reader.classify_compact(news_title, news_body)
+    expected = fused_reader.classify(news_title, news_body)
+    assert isinstance(ret, st.CompactSpecStruct)
+    assert ret.keyword_tables is fused_reader._snapshot.extra["category_keywords"]
+    assert ret.NN_KEYWORDS == expected.NN_KEYWORDS
+    assert ret.ESG_KEYWORDS == expected.ESG_KEYWORDS
+    assert (ret.NN, ret.NN_SCORE, ret.ESG, ret.ESG_SCORE, ret.DEBUG) == (
+        expected.NN,
+        expected.NN_SCORE,
+        expected.ESG,
+        expected.ESG_SCORE,
+        expected.DEBUG,
+    )
+
+    nn_ret = nn_reader.classify_compact(news_title, news_body)
+    nn_expected = nn_reader.classify(news_title, news_body)
+    assert isinstance(nn_ret, st.CompactComparatorStruct)
+    assert nn_ret.keyword_table == nn_reader.keywords
+    assert nn_ret.keywords == nn_expected.keywords
+    assert (nn_ret.news_category, nn_ret.score, nn_ret.debug) == (
+        nn_expected.news_category,
+        nn_expected.score,
+        nn_expected.debug,
+    )
+
+
+def test_keywords_order():
+    ## Keywords are ordered by count (descending), then by their order in keywords.
+    reader = FusedComparator(
+        keywords={"Negative_News": ["乙", "甲"], "ESG_News": ["甲"]},
+        load_default=False,
+        use_artifact=False,
+    )
+    simple = SimpleComparator(
+        category="Negative_News", keywords=["乙", "甲"], load_default=False
+    )
+    for news_title, news_body, expected in [
+        ("甲甲甲乙", "甲甲乙。", ["甲", "乙"]),
+        ("乙乙", "甲。", ["乙", "甲"]),
+        ("乙", "甲。", ["乙", "甲"]),
+    ]:
+        ret = reader.classify(news_title, news_body)
+        compact = reader.classify_compact(news_title, news_body)
+        assert ret.NN_KEYWORDS == compact.NN_KEYWORDS == expected
+        assert ret.ESG_KEYWORDS == compact.ESG_KEYWORDS == ["甲"]
+        assert ret.__2dict__() == compact.__2dict__()
+        assert (
+            simple.classify(news_title, news_body).keywords
+            == simple.classify_compact(news_title, news_body).keywords
+            == expected
+        )
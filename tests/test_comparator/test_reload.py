@@ -0,0 +1,122 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for hot reload of keywords
+
+import logging
+import os
+import threading
+import time
+
+import pytest
+
+from src.FusedComparator import FusedComparator
+from src.SimpleComparator import SimpleComparator
+from src.utils.cache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+
+def make_comparator(name, keywords_file, **kwargs):
+    if name == "Simple":
+        return SimpleComparator(
+            "Negative_News", keywords=keywords_file, load_default=False, **kwargs
+        )
+    return FusedComparator(
+        keywords={"Negative_News": keywords_file, "ESG_News": ["綠能"]},
+        load_default=False,
+        **kwargs,
+    )
+
+
+def keywords_of(ret):
+    return ret.keywords if hasattr(ret, "keywords") else ret.NN_KEYWORDS
+
+
+def version_of(ret):
+    return getattr(ret, "keywords_version", None) or ret.KEYWORDS_VERSION
+
+
+def write(path, keywords):
+    with open(path, "w", encoding="utf-8") as fo:
+        fo.write("\n".join(keywords) + "\n")
+    ## Make sure the change is seen even if the file system has coarse timestamps.
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+test_data = [
+    ("TEST-Simple-artifact", "Simple", True),
+    ("TEST-Simple", "Simple", False),
+    ("TEST-Fused-artifact", "Fused", True),
+    ("TEST-Fused", "Fused", False),
+]
+
+
+@pytest.mark.parametrize(
+    argnames=("name, comparator, use_artifact"),
+    argvalues=test_data,
+    ids=[f"{i[0]}" for i in test_data],
+)
+def test_reload(tmp_path, name, comparator, use_artifact):
+    keywords_file = str(tmp_path / "keywords.txt")
+    write(keywords_file, ["詐欺"])
+    reader = make_comparator(
+        comparator, keywords_file, use_artifact=use_artifact, cache=ResultCache()
+    )
+
+    old = reader.classify("公司涉嫌詐欺與洗錢", "")
+    assert keywords_of(old) == ["詐欺"]
+    assert version_of(old) == reader.keywords_version
+    assert reader.reload() is False
+
+    write(keywords_file, ["詐欺", "洗錢"])
+    assert reader.reload() is True
+    new = reader.classify("公司涉嫌詐欺與洗錢", "")
+    assert sorted(keywords_of(new)) == ["洗錢", "詐欺"]
+    assert version_of(new) == reader.keywords_version != version_of(old)
+    assert "洗錢" in reader.keywords
+
+
+def test_reload_is_atomic(tmp_path):
+    keywords_file = str(tmp_path / "keywords.txt")
+    write(keywords_file, ["詐欺"])
+    reader = make_comparator("Fused", keywords_file, use_artifact=False)
+    versions = {reader.keywords_version: ["詐欺"]}
+
+    stop = threading.Event()
+    errors = list()
+
+    def classify():
+        while not stop.is_set():
+            ret = reader.classify("詐欺洗錢掏空", "")
+            ## Keywords of a result always belong to the version it records.
+            if sorted(ret.NN_KEYWORDS) != versions.get(ret.KEYWORDS_VERSION):
+                errors.append(ret)
+
+    threads = [threading.Thread(target=classify) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for keywords in (["詐欺", "洗錢"], ["掏空", "詐欺"], ["洗錢"]):
+        write(keywords_file, keywords)
+        versions[reader._sources_version()] = sorted(keywords)
+        assert reader.reload() is True
+    stop.set()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+def test_watch(tmp_path):
+    keywords_file = str(tmp_path / "keywords.txt")
+    write(keywords_file, ["詐欺"])
+    reader = make_comparator("Simple", keywords_file, watch_interval=0.02)
+    try:
+        version = reader.keywords_version
+        write(keywords_file, ["詐欺", "洗錢"])
+        deadline = time.time() + 10
+        while reader.keywords_version == version and time.time() < deadline:
+            time.sleep(0.02)
+        assert reader.keywords_version != version
+        assert sorted(reader.classify("詐欺洗錢", "").keywords) == ["洗錢", "詐欺"]
+    finally:
+        reader.unwatch()
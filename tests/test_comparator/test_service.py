@@ -0,0 +1,173 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for HTTP classification service
+
+import asyncio
+import glob
+import http.client
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.FusedComparator import FusedComparator
+from src.service import ClassifierService, MicroBatcher, Overloaded, TooLarge
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture(scope="module")
+def items():
+    ret = list()
+    for fn in sorted(glob.glob("data/dowjones/*.json"))[:8]:
+        data = json.load(open(fn, "r", encoding="utf-8"))
+        ret.append((data["ArticleId"], data["Headline"], data["BodyHtml"]))
+    return ret
+
+
+@pytest.fixture(scope="module")
+def expected(items):
+    reader = FusedComparator()
+    return {id: reader.classify(title, body).__2dict__() for id, title, body in items}
+
+
+def request(port, method, path, data=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        body = None if data is None else json.dumps(data).encode("utf-8")
+        conn.request(method, path, body=body)
+        response = conn.getresponse()
+        payload = response.read()
+        return response.status, dict(response.getheaders()), payload
+    finally:
+        conn.close()
+
+
+def run_with_service(func, **kwargs):
+    async def main():
+        service = ClassifierService(**kwargs)
+        await service.start("127.0.0.1", 0)
+        loop = asyncio.get_running_loop()
+        try:
+            with ThreadPoolExecutor(8) as executor:
+                return await loop.run_in_executor(executor, func, service.port)
+        finally:
+            await service.close()
+
+    return asyncio.run(main())
+
+
+def test_service_classify(items, expected):
+    def client(port):
+        with ThreadPoolExecutor(len(items)) as executor:
+            singles = list(
+                executor.map(
+                    lambda item: request(
+                        port, "POST", "/classify", {"title": item[1], "body": item[2]}
+                    ),
+                    items,
+                )
+            )
+        bulk = request(
+            port,
+            "POST",
+            "/classify/bulk",
+            {"news": [{"id": id, "title": t, "body": b} for id, t, b in items]},
+        )
+        return (
+            singles,
+            bulk,
+            request(port, "GET", "/health"),
+            request(port, "GET", "/metrics"),
+        )
+
+    singles, bulk, health, metrics = run_with_service(
+        client, processes=2, max_delay=0.02
+    )
+
+    for (id, _, _), (status, _, payload) in zip(items, singles):
+        assert status == 200
+        assert json.loads(payload) == expected[id]
+
+    status, _, payload = bulk
+    assert status == 200
+    results = json.loads(payload)["results"]
+    assert [ret.pop("id") for ret in results] == [id for id, _, _ in items]
+    assert results == [expected[id] for id, _, _ in items]
+
+    status, _, payload = health
+    assert status == 200 and json.loads(payload)["status"] == "ok"
+
+    status, _, payload = metrics
+    text = payload.decode("utf-8")
+    assert status == 200
+    assert 'news_classifier_service_request_seconds_count{route="/classify"} 8' in text
+    assert "news_classifier_service_pending 0" in text
+    ## Concurrent requests are classified in fewer batches than requests.
+    batches = [
+        line
+        for line in text.splitlines()
+        if line.startswith("news_classifier_service_batch_size_count")
+    ]
+    assert int(batches[0].split()[-1]) < 2 * len(items)
+
+
+test_data = [
+    ("TEST-1", "GET", "/unknown", None, 404),
+    ("TEST-2", "GET", "/classify", None, 405),
+    ("TEST-3", "POST", "/classify", "not json", 400),
+    ("TEST-4", "POST", "/classify", {"title": 1}, 400),
+    ("TEST-5", "POST", "/classify/bulk", {"news": "x"}, 400),
+    (
+        "TEST-6",
+        "POST",
+        "/classify/bulk",
+        {"news": [{"title": "標題", "body": "內文。"}] * 5},
+        413,
+    ),
+]
+
+
+def test_service_errors():
+    def client(port):
+        rets = list()
+        for _, method, path, data, _ in test_data:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            body = data if isinstance(data, str) else json.dumps(data)
+            conn.request(method, path, body=None if data is None else body)
+            rets.append(conn.getresponse().status)
+            conn.close()
+        return rets
+
+    statuses = run_with_service(client, processes=1, max_pending=4)
+    assert statuses == [status for *_, status in test_data]
+
+
+def test_micro_batcher_backpressure():
+    def slow(items):
+        time.sleep(0.05)
+        return [item * 2 for item in items]
+
+    async def main():
+        with ThreadPoolExecutor(1) as executor:
+            batcher = MicroBatcher(
+                executor, slow, max_batch_size=4, max_delay=0.01, max_pending=6
+            )
+            task = asyncio.ensure_future(batcher.run())
+            first = asyncio.ensure_future(batcher.submit([1, 2, 3, 4, 5]))
+            await asyncio.sleep(0)
+            with pytest.raises(Overloaded):
+                await batcher.submit([6, 7])
+            ## A request larger than max_pending can never be accepted.
+            with pytest.raises(TooLarge):
+                await batcher.submit(list(range(7)))
+            second = await batcher.submit([6])
+            ret = await first
+            task.cancel()
+            return ret, second, batcher
+
+    ret, second, batcher = asyncio.run(main())
+    assert ret == [2, 4, 6, 8, 10] and second == [12]
+    assert batcher.rejected == 2 and batcher.pending == 0
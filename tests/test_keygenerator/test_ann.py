@@ -0,0 +1,90 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for approximate search of related words
+
+import logging
+import os
+
+import numpy as np
+import pytest
+
+from benchmarks.fake_keyedvectors import FakeKeyedVectors
+from src.KeyGenerator.ann import IVFIndex, load_or_build
+from src.KeyGenerator.similarity import most_similar_batch
+
+logger = logging.getLogger(__name__)
+
+rng = np.random.default_rng(0)
+VECTORS = rng.standard_normal((2000, 32)).astype(np.float32)
+NORMS = np.linalg.norm(VECTORS, axis=1)
+QUERY_INDEX = np.arange(0, 2000, 97)
+QUERIES = VECTORS[QUERY_INDEX] / NORMS[QUERY_INDEX, None]
+
+
+def recall(approx, exact):
+    return np.mean(
+        [
+            len({i for i, _ in a} & {i for i, _ in e}) / len(e)
+            for a, e in zip(approx, exact)
+        ]
+    )
+
+
+def test_ivf_index(tmp_path):
+    index = IVFIndex.build(VECTORS, NORMS, nlist=16, nprobe=4)
+    assert index.nlist == 16
+    assert sorted(index.list_index) == list(range(len(VECTORS)))
+
+    ## Approximate search finds most of the exact neighbours.
+    exact = most_similar_batch(VECTORS, NORMS, QUERIES, QUERY_INDEX, 10)
+    approx = index.search(VECTORS, NORMS, QUERIES, QUERY_INDEX, 10)
+    assert recall(approx, exact) > 0.5
+    for related, exclude in zip(approx, QUERY_INDEX):
+        assert exclude not in [i for i, _ in related]
+
+    ## Searching all lists is exact.
+    assert index.search(VECTORS, NORMS, QUERIES, QUERY_INDEX, 10, nprobe=16) == exact
+    assert (
+        IVFIndex.build(VECTORS, NORMS, nlist=16, nprobe=16).search(
+            VECTORS, NORMS, QUERIES, QUERY_INDEX, 10
+        )
+        == exact
+    )
+
+    path = os.path.join(tmp_path, "model.ivf")
+    index.save(path)
+    loaded = load_or_build(path, VECTORS, NORMS)
+    assert loaded.nprobe == 4
+    assert loaded.search(VECTORS, NORMS, QUERIES, QUERY_INDEX, 10) == approx
+
+    ## An index of another model is rebuilt.
+    rebuilt = load_or_build(path, VECTORS[:1000], NORMS[:1000], nlist=8)
+    assert rebuilt.nlist == 8
+    assert len(IVFIndex.load(path).list_index) == 1000
+
+
+test_data = [
+    ("TEST-0", 1, 0.2),
+    ("TEST-1", 8, 0.7),
+    ("TEST-2", 16, 0.9),
+    ("TEST-3", 32, 1.0),
+]
+
+
+@pytest.mark.parametrize(
+    argnames=("name, nprobe, min_recall"),
+    argvalues=test_data,
+    ids=[f"{i[0]}" for i in test_data],
+)
+def test_ivf_recall_on_fake_keyedvectors(name, nprobe, min_recall):
+    wv = FakeKeyedVectors(list(), vocab_size=4000, vector_size=32)
+    query_index = np.arange(0, len(wv), 53)
+    queries = wv.get_normed_vectors()[query_index]
+
+    exact = most_similar_batch(wv.vectors, wv.norms, queries, query_index, 10)
+    index = IVFIndex.build(wv.vectors, wv.norms, nlist=32)
+    approx = index.search(wv.vectors, wv.norms, queries, query_index, 10, nprobe=nprobe)
+    assert recall(approx, exact) >= min_recall
+    for related in approx:
+        scores = [score for _, score in related]
+        assert scores == sorted(scores, reverse=True)
@@ -0,0 +1,112 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for compact quantized word vectors
+
+import logging
+import os
+
+import numpy as np
+import pytest
+
+from src.KeyGenerator.compact import CompactKeyedVectors, Vocabulary
+
+logger = logging.getLogger(__name__)
+
+models = pytest.importorskip("gensim.models")
+
+rng = np.random.default_rng(0)
+WORDS = [f"詞{i}" if i % 10 else f"word{i}" for i in range(3000)]
+VECTORS = rng.standard_normal((len(WORDS), 32)).astype(np.float32)
+
+
+def make_wv():
+    wv = models.KeyedVectors(VECTORS.shape[1])
+    wv.add_vectors(WORDS, VECTORS)
+    return wv
+
+
+def test_vocabulary():
+    words = ["詐欺", "a", "暴力", "", "大跌", "ab"]
+    vocab = Vocabulary.from_words(words)
+    assert len(vocab) == len(words)
+    assert list(vocab) == words
+    assert vocab[-1] == "ab" and vocab[1:3] == ["a", "暴力"]
+    for i, word in enumerate(words):
+        assert vocab.get(word) == i
+    assert "詐" not in vocab and vocab.get("b", -1) == -1
+    with pytest.raises(IndexError):
+        vocab[len(words)]
+
+
+test_data = [
+    ("TEST-0", "float32", 0.999),
+    ("TEST-1", "float16", 0.99),
+    ("TEST-2", "int8", 0.9),
+]
+
+
+@pytest.mark.parametrize(
+    argnames=("name, dtype, min_recall"),
+    argvalues=test_data,
+    ids=[f"{i[0]}" for i in test_data],
+)
+def test_compact(tmp_path, name, dtype, min_recall):
+    wv = make_wv()
+    compact = CompactKeyedVectors.from_keyedvectors(
+        wv, dtype=dtype, max_vocab=2000, keep=["word2500"]
+    )
+    ## Words without CJK ideographs and infrequent words are pruned.
+    assert len(compact) == 2000 - 200 + 1
+    assert "word10" not in compact and "詞2001" not in compact
+    assert "word2500" in compact and compact.index_to_key[-1] == "word2500"
+    assert compact.vectors.dtype == np.dtype(dtype)
+
+    path = os.path.join(tmp_path, "compact")
+    compact.save(path)
+    compact = CompactKeyedVectors.load(path)
+    assert isinstance(compact.vectors, np.memmap)
+
+    ## Related words are close to the ones of the original vectors among kept words.
+    recalls = list()
+    for word in ["詞1", "詞55", "詞999"]:
+        np.testing.assert_allclose(
+            compact.get_vector(word), wv.get_vector(word, norm=True), atol=0.05
+        )
+        ret = compact.most_similar(word, topn=10)
+        assert word not in [w for w, _ in ret]
+        for w, score in ret:
+            assert score == pytest.approx(wv.similarity(word, w), abs=0.02)
+        expected = [
+            w for w, _ in wv.most_similar(word, topn=100) if w in compact.index_to_key
+        ][:10]
+        recalls.append(len({w for w, _ in ret} & set(expected)) / 10)
+
+        ret = compact.most_similar([word], topn=5, restrict_vocab=500)
+        assert all(compact.get_index(w) < 500 for w, _ in ret)
+    assert np.mean(recalls) >= min_recall
+
+
+def test_keygenerator_compact(tmp_path):
+    from src.KeyGenerator.KeyGenerator import Word2VecKeyGenerator
+
+    path = os.path.join(tmp_path, "compact")
+    CompactKeyedVectors.from_keyedvectors(make_wv(), dtype="float32").save(path)
+    file = os.path.join(tmp_path, "keywords.txt")
+    with open(file, "w", encoding="utf-8") as fo:
+        fo.write("\n".join(["詞1", "詞55", "word10", "詞999"]))
+
+    for restrict_vocab in (None, 1000):
+        w2v = Word2VecKeyGenerator("test", compact=path, restrict_vocab=restrict_vocab)
+        expected = w2v.infer_a_file(file, 10, 0.3, vectorized=False)
+        assert w2v.infer_a_file(file, 10, 0.3) == expected
+        ## Pruned words are out of vocabulary.
+        assert expected["word10"].related == []
+        if restrict_vocab:
+            for word in ["詞1", "詞55", "詞999"]:
+                related = expected[word].related
+                assert all(w2v.wv.get_index(w) < restrict_vocab for w, _ in related)
+
+        w2v = Word2VecKeyGenerator(
+            "test", compact=path, restrict_vocab=restrict_vocab, ann=True, nprobe=1000
+        )
+        assert w2v.infer_a_file(file, 10, 0.3) == expected
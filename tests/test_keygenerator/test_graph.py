@@ -0,0 +1,149 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for related-word graph
+
+import logging
+import os
+import time
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pytest
+
+from src.KeyGenerator.ann import IVFIndex
+from src.KeyGenerator.graph import RelatedWordGraph
+
+logger = logging.getLogger(__name__)
+
+RELATED = {
+    "詐欺": [("詐騙", 0.9), ("詐財", 0.8), ("洗錢", 0.6)],
+    "詐騙": [("詐欺", 0.9), ("詐財", 0.85)],
+    "詐財": [("詐欺", 0.8)],
+    "污染": [("排放", 0.75)],
+    "排放": [("污染", 0.75), ("碳排", 0.72)],
+}
+
+
+def search(words, topn):
+    return [RELATED.get(word, [])[:topn] for word in words]
+
+
+test_data = [
+    ("TEST-0", 1, 0.7, None, ["詐欺", "污染", "詐騙", "詐財", "排放"]),
+    ("TEST-1", 2, 0.7, None, ["詐欺", "污染", "詐騙", "詐財", "排放", "碳排"]),
+    ("TEST-2", 2, 0.5, 4, ["詐欺", "污染", "詐騙", "詐財"]),
+    ("TEST-3", 0, 0.7, None, ["詐欺", "污染"]),
+]
+
+
+@pytest.mark.parametrize(
+    argnames=("name, depth, threshold, max_nodes, expected"),
+    argvalues=test_data,
+    ids=[f"{i[0]}" for i in test_data],
+)
+def test_build(name, depth, threshold, max_nodes, expected):
+    graph = RelatedWordGraph.build(
+        search,
+        ["詐欺", "污染", "詐欺", " "],
+        depth=depth,
+        threshold=threshold,
+        max_nodes=max_nodes,
+    )
+    assert graph.words == expected
+    for source, target, weight in zip(graph.sources, graph.targets, graph.weights):
+        assert weight >= threshold
+        assert graph.words[target] in dict(RELATED[graph.words[source]])
+
+
+def test_components_and_hubs(tmp_path):
+    graph = RelatedWordGraph.build(search, ["詐欺", "污染", "未知"], depth=2)
+    assert graph.component_words() == [
+        ["詐欺", "詐騙", "詐財"],
+        ["污染", "排放", "碳排"],
+        ["未知"],
+    ]
+    assert graph.hubs(2) == [
+        ("詐欺", 2, pytest.approx(1.7)),
+        ("詐財", 2, pytest.approx(1.65)),
+    ]
+    assert graph.drift(RelatedWordGraph.build(search, ["詐欺"], depth=1)) == {
+        "added": ["排放", "未知", "污染", "碳排"],
+        "removed": [],
+    }
+
+    path = os.path.join(tmp_path, "graph.graphml")
+    graph.save(path)
+    ns = {"g": "http://graphml.graphdrawing.org/xmlns"}
+    root = ET.parse(path).getroot()
+    nodes = root.findall("g:graph/g:node", ns)
+    edges = root.findall("g:graph/g:edge", ns)
+    assert [node.get("id") for node in nodes] == graph.words
+    assert len(edges) == graph.number_of_edges
+
+    path = os.path.join(tmp_path, "graph.tsv")
+    graph.save(path)
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.rstrip("\n").split("\t") for line in f]
+    assert lines[0] == ["詐欺", "詐騙", "0.900000"]
+    assert len(lines) == graph.number_of_edges
+
+    with pytest.raises(ValueError):
+        graph.save(os.path.join(tmp_path, "graph.png"))
+
+
+def test_build_at_scale():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((50000, 32)).astype(np.float32)
+    norms = np.linalg.norm(vectors, axis=1)
+    words = [f"詞{i}" for i in range(len(vectors))]
+    word_to_index = {word: i for i, word in enumerate(words)}
+    ivf = IVFIndex.build(vectors, norms, nprobe=4)
+
+    def batched_search(queries, topn):
+        index = np.array([word_to_index[word] for word in queries])
+        results = ivf.search(
+            vectors, norms, vectors[index] / norms[index, None], index, topn
+        )
+        return [[(words[i], score) for i, score in related] for related in results]
+
+    start = time.time()
+    graph = RelatedWordGraph.build(
+        batched_search, words[:300], depth=3, topn=10, threshold=0.0
+    )
+    graph.components()
+    graph.hubs()
+    logger.info(f"{graph} in {time.time() - start:.2f} seconds.")
+    assert graph.number_of_nodes > 10000
+    assert time.time() - start < 30
+
+
+def test_keygenerator_graph(tmp_path):
+    models = pytest.importorskip("gensim.models")
+    from src.KeyGenerator.KeyGenerator import Word2VecKeyGenerator
+    from src.KeyGenerator.model_store import ModelStore
+
+    rng = np.random.default_rng(0)
+    wv = models.KeyedVectors(16)
+    wv.add_vectors([f"詞{i}" for i in range(500)], rng.standard_normal((500, 16)))
+    wv.save(os.path.join(tmp_path, "w2v.wordvectors"))
+    store = ModelStore(
+        source=str(tmp_path), models={"test": {"files": {"fast": "w2v.wordvectors"}}}
+    )
+    w2v = Word2VecKeyGenerator("test", store=store)
+
+    ## Without `build_graph`, the graph of inference results is saved.
+    w2v.infer("詞0", topn=5, threshold=0.0)
+    path = os.path.join(tmp_path, "results.tsv")
+    w2v.save(path)
+    with open(path, "r", encoding="utf-8") as f:
+        assert [line.split("\t")[1] for line in f] == [
+            w for w, _ in w2v.relatedwords("詞0").related
+        ]
+
+    graph = w2v.build_graph(["詞0", "詞1", "未知"], depth=2, topn=5, threshold=0.0)
+    assert graph.number_of_nodes > 10
+    assert graph.component_words()[-1] == ["未知"]
+    w2v.save(os.path.join(tmp_path, "graph.graphml"))
+    root = ET.parse(os.path.join(tmp_path, "graph.graphml")).getroot()
+    edges = root[-1].findall("{http://graphml.graphdrawing.org/xmlns}edge")
+    assert len(edges) == graph.number_of_edges
@@ -0,0 +1,107 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for persistent memo of related words
+
+import logging
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from src.KeyGenerator.memo import ExpansionMemo
+
+logger = logging.getLogger(__name__)
+
+RELATED = [("詐騙", 0.9), ("詐財", 0.8), ("洗錢", 0.6), ("犯罪", 0.55)]
+
+
+def test_memo(tmp_path):
+    path = os.path.join(tmp_path, "memo.sqlite")
+    memo = ExpansionMemo(path)
+    assert memo.get("ns", "詐欺", 3) is None
+    memo.put("ns", "詐欺", 4, RELATED)
+
+    ## Entries answer smaller topn, but not larger topn or other namespaces.
+    assert memo.get("ns", "詐欺", 4) == RELATED
+    assert memo.get("ns", "詐欺", 2) == RELATED[:2]
+    assert memo.get("ns", "詐欺", 5) is None
+    assert memo.get("other", "詐欺", 2) is None
+    assert memo.stats() == {"hits": 2, "misses": 3, "hit_rate": 0.4}
+
+    ## An entry of smaller topn doesn't replace one of larger topn.
+    memo.put("ns", "詐欺", 2, RELATED[:2])
+    assert memo.get("ns", "詐欺", 4) == RELATED
+    memo.put("ns", "詐欺", 5, RELATED + [("黑道", 0.5)])
+    assert memo.get("ns", "詐欺", 5)[-1] == ("黑道", 0.5)
+    memo.close()
+
+    ## Entries are kept across runs and processes.
+    memo = pickle.loads(pickle.dumps(ExpansionMemo(path)))
+    assert len(memo) == 1
+    assert memo.get("ns", "詐欺", 3) == RELATED[:3]
+    memo.clear("other")
+    assert len(memo) == 1
+    memo.clear()
+    assert len(memo) == 0
+
+
+test_data = [
+    ("TEST-0", False, False),
+    ("TEST-1", True, False),
+    ("TEST-2", True, True),
+]
+
+
+@pytest.mark.parametrize(
+    argnames=("name, vectorized, ann"),
+    argvalues=test_data,
+    ids=[f"{i[0]}" for i in test_data],
+)
+def test_keygenerator_memo(tmp_path, name, vectorized, ann):
+    models = pytest.importorskip("gensim.models")
+    from src.KeyGenerator.KeyGenerator import Word2VecKeyGenerator
+    from src.KeyGenerator.model_store import ModelStore
+
+    rng = np.random.default_rng(0)
+    wv = models.KeyedVectors(16)
+    wv.add_vectors([f"詞{i}" for i in range(1000)], rng.standard_normal((1000, 16)))
+    wv.save(os.path.join(tmp_path, "w2v.wordvectors"))
+    store = ModelStore(
+        source=str(tmp_path), models={"test": {"files": {"fast": "w2v.wordvectors"}}}
+    )
+    file = os.path.join(tmp_path, "keywords.txt")
+    with open(file, "w", encoding="utf-8") as fo:
+        fo.write("\n".join(["詞0", "詞1", "未知", "詞2"]))
+    force_info = {"詞1": {"topn": 3, "threshold": 0.2}}
+
+    w2v = Word2VecKeyGenerator("test", store=store, ann=ann, nprobe=1000)
+    expected = w2v.infer_a_file(file, 10, 0.3, force_info, vectorized=vectorized)
+
+    memo = ExpansionMemo(os.path.join(tmp_path, "memo.sqlite"))
+    w2v = Word2VecKeyGenerator("test", store=store, ann=ann, nprobe=1000, memo=memo)
+    assert (
+        w2v.infer_a_file(file, 10, 0.3, force_info, vectorized=vectorized) == expected
+    )
+    assert (memo.hits, memo.misses) == (0, 3)
+    assert (
+        w2v.infer_a_file(file, 10, 0.3, force_info, vectorized=vectorized) == expected
+    )
+    assert (memo.hits, memo.misses) == (3, 3)
+
+    ## Smaller topn and another threshold are answered by the memo, and only new words
+    ## and words of larger topn ("詞1" was searched for top 3) are searched.
+    with open(file, "a", encoding="utf-8") as fo:
+        fo.write("\n詞3")
+    ret = w2v.infer_a_file(file, 5, 0.5, vectorized=vectorized)
+    assert (memo.hits, memo.misses) == (5, 5)
+    assert ret["詞0"].related == [
+        (w, score) for w, score in expected["詞0"].related[:5] if score >= 0.5
+    ]
+    assert memo.get(w2v.memo_namespace, "詞1", 5) is not None
+
+    ## Another model (or another way of search) doesn't share entries.
+    other = Word2VecKeyGenerator("test", store=store, restrict_vocab=500, memo=memo)
+    assert other.memo_namespace != w2v.memo_namespace
+    other.infer_a_word("詞0", 10, 0.3)
+    assert memo.misses == 6
@@ -0,0 +1,130 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for lazy provisioning of Word2Vec models
+
+import hashlib
+import io
+import logging
+import os
+import subprocess
+import sys
+import tarfile
+
+import pytest
+
+from src.KeyGenerator.model_store import ModelStore, extract_stream
+
+logger = logging.getLogger(__name__)
+
+FILES = {
+    "w2v.wordvectors": b"wordvectors" * 1000,
+    "w2v.wordvectors.vectors.npy": os.urandom(300000),
+}
+MODELS = {
+    "test": {
+        "url": "http://localhost:9/never-downloaded.tar.gz",
+        "sha256": None,
+        "files": {"fast": "w2v.wordvectors", "normal": "w2v.model"},
+    }
+}
+
+
+def make_archive(path, files=FILES, unsafe=False):
+    with tarfile.open(path, "w:gz") as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo("../evil" if unsafe else name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def test_import_has_no_side_effects(tmp_path):
+    code = "import src.KeyGenerator, src.KeyGenerator.model_store"
+    env = dict(os.environ, NEWS_CLASSIFIER_MODEL_DIR=str(tmp_path / "model"))
+    subprocess.run([sys.executable, "-c", code], check=True, env=env)
+    assert not os.path.exists(tmp_path / "model")
+
+
+def test_resolve_archive(tmp_path):
+    archive = str(tmp_path / "model.tar.gz")
+    sha256 = make_archive(archive)
+    root = str(tmp_path / "model")
+    models = {"test": dict(MODELS["test"], sha256=sha256)}
+    store = ModelStore(root=root, source=archive, models=models)
+    assert not store.is_ready("test")
+
+    path = store.resolve("test", verify=True)
+    assert path == os.path.join(root, "w2v.wordvectors")
+    for name, data in FILES.items():
+        with open(os.path.join(root, name), "rb") as f:
+            assert f.read() == data
+
+    ## The archive isn't read again once the model is ready.
+    os.remove(archive)
+    assert store.resolve("test") == path
+
+    with open(path, "ab") as fo:
+        fo.write(b"changed")
+    with pytest.raises(ValueError):
+        store.resolve("test", verify=True)
+    with pytest.raises(KeyError):
+        store.resolve("unknown")
+
+
+def test_resolve_directory(tmp_path):
+    for name, data in FILES.items():
+        with open(tmp_path / name, "wb") as fo:
+            fo.write(data)
+    root = str(tmp_path / "model")
+    store = ModelStore(root=root, source=str(tmp_path), models=MODELS)
+    assert store.resolve("test") == os.path.join(tmp_path, "w2v.wordvectors")
+    assert not os.path.exists(root)
+    with pytest.raises(FileNotFoundError):
+        store.resolve("test", "normal")
+
+
+def test_extract_stream_checksum(tmp_path):
+    archive = str(tmp_path / "model.tar.gz")
+    make_archive(archive)
+    root = str(tmp_path / "model")
+    with open(archive, "rb") as f:
+        with pytest.raises(ValueError):
+            extract_stream(f, root, sha256="0" * 64)
+    ## Nothing is left if the archive is corrupted.
+    assert os.listdir(root) == []
+
+    make_archive(archive, unsafe=True)
+    with open(archive, "rb") as f:
+        with pytest.raises(ValueError):
+            extract_stream(f, root)
+    assert not os.path.exists(tmp_path / "evil")
+
+
+def test_interrupted_provision(tmp_path):
+    archive = str(tmp_path / "model.tar.gz")
+    make_archive(archive)
+    root = str(tmp_path / "model")
+    store = ModelStore(root=root, source=archive, models=MODELS)
+    store.resolve("test")
+
+    ## A model left by a killed extraction is provisioned again.
+    open(os.path.join(root, ".test.incomplete"), "w").close()
+    os.remove(os.path.join(root, "w2v.wordvectors.vectors.npy"))
+    assert not store.is_ready("test")
+    store.resolve("test")
+    assert store.is_ready("test")
+    assert os.path.exists(os.path.join(root, "w2v.wordvectors.vectors.npy"))
+
+
+def test_refuse_unverified_download(tmp_path):
+    root = str(tmp_path / "model")
+    store = ModelStore(root=root, source=None, models=MODELS)
+    with pytest.raises(ValueError):
+        store.resolve("test")
+    assert not os.path.exists(os.path.join(root, ".test.incomplete"))
+
+    ## Nothing is downloaded if it's allowed but the url is unreachable.
+    store = ModelStore(root=root, source=None, models=MODELS, allow_unverified=True)
+    with pytest.raises(OSError):
+        store.resolve("test")
@@ -0,0 +1,145 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for batched search of related words
+
+import logging
+import os
+
+import numpy as np
+import pytest
+
+from src.KeyGenerator.similarity import most_similar_batch
+
+logger = logging.getLogger(__name__)
+
+rng = np.random.default_rng(0)
+VECTORS = rng.standard_normal((2000, 32)).astype(np.float32)
+NORMS = np.linalg.norm(VECTORS, axis=1)
+QUERY_INDEX = np.arange(0, 2000, 97)
+QUERIES = VECTORS[QUERY_INDEX] / NORMS[QUERY_INDEX, None]
+
+
+def brute_force(query, exclude, topn, restrict_vocab=None):
+    n = restrict_vocab or len(VECTORS)
+    scores = np.dot(VECTORS[:n], query) / NORMS[:n]
+    order = [i for i in np.argsort(-scores, kind="stable") if i != exclude]
+    return [int(i) for i in order[:topn]]
+
+
+test_data = [
+    ("TEST-0", 10, None, 2**24),
+    ("TEST-1", 1, None, 2**24),
+    ("TEST-2", 25, None, 1000),
+    ("TEST-3", 10, 500, 1000),
+]
+
+
+@pytest.mark.parametrize(
+    argnames=("name, topn, restrict_vocab, block_elements"),
+    argvalues=test_data,
+    ids=[f"{i[0]}" for i in test_data],
+)
+def test_most_similar_batch(name, topn, restrict_vocab, block_elements):
+    ret = most_similar_batch(
+        VECTORS,
+        NORMS,
+        QUERIES,
+        QUERY_INDEX,
+        topn,
+        restrict_vocab=restrict_vocab,
+        block_elements=block_elements,
+    )
+    assert len(ret) == len(QUERIES)
+    for related, query, exclude in zip(ret, QUERIES, QUERY_INDEX):
+        assert [i for i, _ in related] == brute_force(
+            query, exclude, topn, restrict_vocab
+        )
+        scores = [score for _, score in related]
+        assert scores == sorted(scores, reverse=True)
+
+    ## Top n of each query.
+    topns = [i % 5 for i in range(len(QUERIES))]
+    ret = most_similar_batch(VECTORS, NORMS, QUERIES, QUERY_INDEX, topns)
+    assert [len(related) for related in ret] == topns
+    assert most_similar_batch(VECTORS, NORMS, QUERIES[:0], [], topn) == []
+
+
+test_data = [
+    ("TEST-0", 10, None, 2**24),
+    ("TEST-1", 3, 700, 1000),
+    ("TEST-2", 20, None, 50),
+]
+
+
+@pytest.mark.parametrize(
+    argnames=("name, topn, restrict_vocab, block_elements"),
+    argvalues=test_data,
+    ids=[f"{i[0]}" for i in test_data],
+)
+def test_most_similar_batch_as_gensim(name, topn, restrict_vocab, block_elements):
+    models = pytest.importorskip("gensim.models")
+    words = [f"詞{i}" for i in range(len(VECTORS))]
+    wv = models.KeyedVectors(VECTORS.shape[1])
+    wv.add_vectors(words, VECTORS)
+    wv.fill_norms()
+
+    ret = most_similar_batch(
+        wv.vectors,
+        wv.norms,
+        wv.get_normed_vectors()[QUERY_INDEX],
+        QUERY_INDEX,
+        topn,
+        restrict_vocab=restrict_vocab,
+        block_elements=block_elements,
+    )
+    for related, i in zip(ret, QUERY_INDEX):
+        expected = wv.most_similar(words[i], topn=topn, restrict_vocab=restrict_vocab)
+        assert [words[j] for j, _ in related] == [word for word, _ in expected]
+        assert [score for _, score in related] == pytest.approx(
+            [score for _, score in expected], abs=1e-6
+        )
+
+
+def test_most_similar_batch_as_fake_keyedvectors():
+    from benchmarks.fake_keyedvectors import FakeKeyedVectors
+
+    wv = FakeKeyedVectors(list(), vocab_size=3000, vector_size=64)
+    query_index = np.arange(0, len(wv), 101)
+    ret = most_similar_batch(
+        wv.vectors,
+        wv.norms,
+        wv.get_normed_vectors()[query_index],
+        query_index,
+        10,
+        block_elements=4096,
+    )
+    for related, i in zip(ret, query_index):
+        expected = wv.most_similar([wv.index_to_key[i]], topn=10)
+        assert [wv.index_to_key[j] for j, _ in related] == [w for w, _ in expected]
+
+
+def test_keygenerator(tmp_path):
+    models = pytest.importorskip("gensim.models")
+    from src.KeyGenerator.KeyGenerator import Word2VecKeyGenerator
+    from src.KeyGenerator.model_store import ModelStore
+
+    words = [f"詞{i}" for i in range(len(VECTORS))]
+    wv = models.KeyedVectors(VECTORS.shape[1])
+    wv.add_vectors(words, VECTORS)
+    wv.save(os.path.join(tmp_path, "w2v.wordvectors"))
+    store = ModelStore(
+        source=str(tmp_path),
+        models={"test": {"files": {"fast": "w2v.wordvectors"}}},
+    )
+
+    file = os.path.join(tmp_path, "keywords.txt")
+    with open(file, "w", encoding="utf-8") as fo:
+        fo.write("\n".join(["詞0", "詞97", "未知", "詞0", "詞194"]))
+    force_info = {"詞97": {"topn": 3, "threshold": 0.2}}
+
+    w2v = Word2VecKeyGenerator("test", store=store)
+    expected = w2v.infer_a_file(file, 10, 0.3, force_info, vectorized=False)
+    assert w2v.infer_a_file(file, 10, 0.3, force_info) == expected
+
+    w2v = Word2VecKeyGenerator("test", ann=True, nprobe=1000, store=store)
+    assert w2v.infer_a_file(file, 10, 0.3, force_info) == expected
@@ -0,0 +1,72 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for precompiled keyword artifact
+
+import logging
+
+import pytest
+
+from src.utils.keywords import artifact as ar
+from src.utils.keywords import keywords as ke
+
+logger = logging.getLogger(__name__)
+
+texts = [
+    "詐欺犯吳朱傳甫獲釋又和同夥林志成假冒檢警人員，向新營市黃姓婦人詐財一百八十萬元。",
+    "台北地檢署檢察官依違反銀行法起訴九名幹部，至於掛名董事長因逃亡未到案遭通緝。",
+    "公司推動節能減碳與綠色能源，重視員工權益及公司治理。",
+]
+
+
+@pytest.mark.parametrize(
+    argnames=("name, flat"),
+    argvalues=[(name, flat) for name in ke.LOCALIZERS for flat in (False, True)],
+    ids=[f"{name}, flat={flat}" for name in ke.LOCALIZERS for flat in (False, True)],
+)
+def test_compile_and_load(tmp_path, name, flat):
+    compiled = ar.compile_category(name, cache_dir=str(tmp_path))
+    loaded = ar.compile_category(name, cache_dir=str(tmp_path), flat=flat)
+
+    assert compiled.path == loaded.path
+    assert compiled.version == loaded.version == ke.KeywordsVersion(name)
+    assert loaded.keywords == ke.KeywordsFactory(name).keywords
+    for text in texts:
+        assert loaded.matcher.count(text) == compiled.matcher.count(text)
+
+
+def test_recompile_when_sources_change(tmp_path):
+    source = tmp_path / "keywords.txt"
+    source.write_text("詐欺\n", encoding="utf-8")
+    args = dict(keywords=str(source), load_default=False, cache_dir=str(tmp_path))
+
+    compiled = ar.compile_category("Negative_News", **args)
+    assert compiled.keywords == ("詐欺",)
+    assert ar.compile_category("Negative_News", **args).version == compiled.version
+
+    source.write_text("詐欺\n詐財\n", encoding="utf-8")
+    recompiled = ar.compile_category("Negative_News", **args)
+    assert recompiled.version != compiled.version
+    assert recompiled.keywords == ("詐欺", "詐財")
+    assert recompiled.matcher.count(texts[0]) == {0: 1, 1: 1}
+
+
+@pytest.mark.parametrize(
+    argnames=("size"),
+    argvalues=[0, 5, 40, -64, -9],
+    ids=["TEST-1", "TEST-2", "TEST-3", "TEST-4", "TEST-5"],
+)
+def test_recompile_truncated_artifact(tmp_path, size):
+    compiled = ar.compile_category("Negative_News", cache_dir=str(tmp_path))
+    with open(compiled.path, "rb") as f:
+        data = f.read()
+    with open(compiled.path, "wb") as fo:
+        fo.write(data[:size])
+
+    with pytest.raises(ValueError):
+        ar.load(compiled.path)
+    for flat in (False, True):
+        loaded = ar.compile_category(
+            "Negative_News", cache_dir=str(tmp_path), flat=flat
+        )
+        assert loaded.keywords == compiled.keywords
+        assert loaded.matcher.count(texts[0]) == compiled.matcher.count(texts[0])
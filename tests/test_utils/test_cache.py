@@ -0,0 +1,100 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for content-hash result cache
+
+import logging
+import os
+import pickle
+
+import pytest
+
+from src.batch import classify_batch
+from src.FusedComparator import FusedComparator
+from src.SimpleComparator import SimpleComparator
+from src.utils.cache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+
+def test_lru():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("b") is None
+    assert [cache.get("a"), cache.get("c")] == [1, 3]
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_make_key():
+    key = ResultCache.make_key("標題", "內文。", "v1", ("NN", 0.3, 0.1))
+    assert key == ResultCache.make_key(
+        " 標題\r\n", "內文。\r\n", "v1", ("NN", 0.3, 0.1)
+    )
+    assert key != ResultCache.make_key("標題", "內文。", "v2", ("NN", 0.3, 0.1))
+    assert key != ResultCache.make_key("標題", "內文。", "v1", ("NN", 0.5, 0.1))
+    assert key != ResultCache.make_key("標題內", "文。", "v1", ("NN", 0.3, 0.1))
+    assert key != ResultCache.make_key(
+        " 標題", "內文。", "v1", ("NN", 0.3, 0.1), normalized=False
+    )
+
+
+def test_disk_tier(tmp_path):
+    path = os.path.join(tmp_path, "results.sqlite")
+    cache = ResultCache(max_entries=1, path=path, max_disk_entries=2)
+    for i in range(3):
+        cache.put(f"{i}", [i])
+    cache.close()
+
+    ## Settings are pickled, and tiers are opened again.
+    cache = pickle.loads(pickle.dumps(cache))
+    assert len(cache) == 0
+    assert cache.get("0") is None
+    assert cache.get("2") == [2]
+    assert cache.disk_hits == 1
+
+
+test_data = [
+    ("TEST-0", "詐欺犯獲釋", "詐欺犯獲釋。又詐財一百八十萬元！環保署"),
+    ("TEST-1", "", ""),
+]
+
+
+@pytest.mark.parametrize(
+    argnames=("name, title, body"),
+    argvalues=test_data,
+    ids=[f"{i[0]}" for i in test_data],
+)
+@pytest.mark.parametrize("debug", [False, True])
+def test_comparator_cache(name, title, body, debug):
+    cache = ResultCache()
+    nn = SimpleComparator("Negative_News", debug=debug, cache=cache)
+    esg = SimpleComparator("ESG_News", debug=debug, cache=cache)
+    fused = FusedComparator(debug=debug, cache=cache)
+
+    for reader, expected in (
+        (nn, SimpleComparator("Negative_News", debug=debug).classify(title, body)),
+        (esg, SimpleComparator("ESG_News", debug=debug).classify(title, body)),
+        (fused, FusedComparator(debug=debug).classify(title, body)),
+    ):
+        assert reader.classify(title, body) == expected
+        ret = reader.classify(title, body)
+        if isinstance(reader, SimpleComparator):
+            ret.id -= 1
+        assert ret == expected
+
+    ## Each comparator misses once and hits once.
+    assert (cache.hits, cache.misses) == (3, 3)
+
+
+def test_batch_cache(tmp_path):
+    path = os.path.join(tmp_path, "results.sqlite")
+    items = [(i, *test_data[0][1:]) for i in range(4)]
+    expected = classify_batch(items, processes=1)
+    assert classify_batch(items, processes=2, cache=ResultCache(path=path)) == expected
+
+    cache = ResultCache(path=path)
+    assert classify_batch(items, processes=1, cache=cache) == expected
+    assert cache.disk_hits == 1
@@ -0,0 +1,78 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for streaming reader of news corpus
+
+import glob
+import json
+import logging
+
+import pytest
+
+from src.utils import struct as st
+from src.utils.corpus import iter_articles, iter_files
+
+logger = logging.getLogger(__name__)
+
+DJROOT = "data/dowjones"
+files = sorted(glob.glob(f"{DJROOT}/*.json"))
+
+
+@pytest.fixture(scope="module")
+def jsonl_file(tmp_path_factory):
+    path = tmp_path_factory.mktemp("corpus") / "dowjones.jsonl"
+    with open(path, "w", encoding="utf-8") as fo:
+        for fn in files:
+            data = json.load(open(fn, "r", encoding="utf-8"))
+            fo.write(json.dumps(data, ensure_ascii=False) + "\n")
+        fo.write("\n")
+    return str(path)
+
+
+def test_iter_files():
+    assert list(iter_files(DJROOT)) == files
+    assert list(iter_files(f"{DJROOT}/LIB*.json")) == [
+        fn for fn in files if "/LIB" in fn
+    ]
+    with pytest.raises(FileNotFoundError):
+        list(iter_files(f"{DJROOT}/NOT_EXISTS.json"))
+
+
+def test_iter_articles_from_directory():
+    articles = list(iter_articles(DJROOT, prefetch=2))
+    assert len(articles) == len(files)
+    for fn, article in zip(files, articles):
+        data = json.load(open(fn, "r", encoding="utf-8"))
+        assert isinstance(article, st.ArticleStruct)
+        assert article.ArticleId == data["ArticleId"]
+        assert article.Headline == data["Headline"]
+        assert article.BodyHtml == data["BodyHtml"]
+        assert article.PubDateTime == data["PubDateTime"]
+
+
+def test_iter_articles_from_jsonl(jsonl_file):
+    articles = list(iter_articles(jsonl_file, prefetch=1, lines_per_chunk=4))
+    assert articles == list(iter_articles(DJROOT))
+
+
+def test_iter_articles_stop_early(jsonl_file):
+    articles = iter_articles([jsonl_file, DJROOT], prefetch=1, lines_per_chunk=1)
+    assert next(articles).ArticleId == json.load(open(files[0]))["ArticleId"]
+    articles.close()
+
+
+def test_iter_articles_not_objects(tmp_path, caplog):
+    news = [json.load(open(fn, "r", encoding="utf-8")) for fn in files[:3]]
+    ## An export holding a list of news, and lines that aren't objects.
+    with open(tmp_path / "export.json", "w", encoding="utf-8") as fo:
+        json.dump(news[:2] + [None], fo, ensure_ascii=False)
+    with open(tmp_path / "dump.jsonl", "w", encoding="utf-8") as fo:
+        for line in ["null", "[]", '"news"', "1", json.dumps(news[2]), "{broken"]:
+            fo.write(line + "\n")
+
+    with caplog.at_level(logging.WARNING):
+        articles = list(iter_articles(str(tmp_path)))
+    ## dump.jsonl is read before export.json.
+    assert [a.ArticleId for a in articles] == [
+        n["ArticleId"] for n in news[2:] + news[:2]
+    ]
+    assert sum("Skip broken news" in r.message for r in caplog.records) == 5
@@ -0,0 +1,155 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for stored keyword counts and rescoring
+
+import glob
+import json
+import logging
+
+import numpy as np
+import pytest
+
+from src.FusedComparator import FusedComparator
+from src.SimpleComparator import SimpleComparator
+from src.utils.counts import CountStore, align_labels, main, rescore, sweep
+
+logger = logging.getLogger(__name__)
+
+articles = [
+    json.load(open(fn, "r", encoding="utf-8"))
+    for fn in sorted(glob.glob("data/dowjones/*.json"))
+]
+
+test_data = [
+    ("TEST-1", 0.50, 0.3, 0.1),
+    ("TEST-2", 0.60, 0.3, 0.1),
+    ("TEST-3", 0.55, 0.5, 0.1),
+    ("TEST-4", 0.70, 0.2, 0.3),
+    ("TEST-5", 0.0, 1.0, 1.0),
+]
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    reader = FusedComparator(use_artifact=False, keep_counts=True)
+    store = CountStore(str(tmp_path_factory.mktemp("counts")), chunk_size=7)
+    store.register(reader)
+    for article in articles:
+        ret = reader.classify(article["Headline"], article["BodyHtml"])
+        store.add(article["ArticleId"], ret.COUNTS)
+    store.close()
+    return store
+
+
+@pytest.mark.parametrize(
+    argnames=("name, threshold, title_weight, body_weight"),
+    argvalues=test_data,
+    ids=[f"{i[0]}" for i in test_data],
+)
+def test_rescore(name, store, threshold, title_weight, body_weight):
+    reader = FusedComparator(use_artifact=False)
+    records = CountStore(store.path).records()
+    assert records.size == len(articles)
+    assert records.categories == ["Negative_News", "ESG_News"]
+
+    ret = rescore(records, threshold, title_weight, body_weight)
+    for i, article in enumerate(articles):
+        expected = reader.classify(
+            article["Headline"],
+            article["BodyHtml"],
+            threshold=threshold,
+            title_weight=title_weight,
+            body_weight=body_weight,
+        )
+        assert records.ids[i] == article["ArticleId"]
+        assert ret["scores"][i].tolist() == [expected.NN_SCORE, expected.ESG_SCORE]
+        assert ret["flags"][i].tolist() == [expected.NN, expected.ESG]
+
+        keywords = store.keywords(records.versions[records.version[i]])
+        for category, matched in (
+            ("Negative_News", expected.NN_KEYWORDS),
+            ("ESG_News", expected.ESG_KEYWORDS),
+        ):
+            ids = records.keyword_ids(i, category)
+            assert sorted(keywords[category][k] for k in ids) == sorted(matched)
+
+
+def test_sweep(store):
+    records = store.records()
+    labels = align_labels(
+        records,
+        {
+            articles[0]["ArticleId"]: {"NN": True},
+            articles[1]["ArticleId"]: {"NN": False, "ESG": True},
+        },
+    )
+    assert labels["Negative_News"][:3].tolist() == [1, 0, -1]
+    assert labels["ESG_News"][:3].tolist() == [-1, 1, -1]
+
+    thresholds = [0.0, 0.5, 0.9]
+    rows = sweep(records, thresholds, [0.3, 0.5], [0.1], labels=labels)
+    assert len(rows) == 2 * 3 * 2
+    for row in rows:
+        flags = rescore(
+            records, row["threshold"], row["title_weight"], row["body_weight"]
+        )["flags"][:, records.categories.index(row["category"])]
+        assert row["flagged"] == int(flags.sum())
+        assert row["flag_rate"] == flags.mean()
+
+        label = labels[row["category"]]
+        tp = int((flags & (label == 1)).sum())
+        predicted = int((flags & (label >= 0)).sum())
+        assert row["labelled"] == int((label >= 0).sum())
+        assert row["precision"] == (tp / predicted if predicted else 0.0)
+        assert row["recall"] == tp / int((label == 1).sum())
+
+
+def test_simple_comparator_and_latest(tmp_path):
+    reader = SimpleComparator(
+        "Negative_News", keywords=["詐欺"], load_default=False, keep_counts=True
+    )
+    with CountStore(str(tmp_path)) as store:
+        store.register(reader)
+        store.add("A", reader.classify("詐欺", "涉嫌詐欺。").counts)
+        store.add("B", reader.classify("標題", "內文。").counts)
+        store.add("A", reader.classify("標題", "再次詐欺。").counts)
+    assert reader.classify("標題", "內文。").counts is not None
+    assert SimpleComparator("Negative_News").classify("標題", "內文").counts is None
+
+    records = CountStore(str(tmp_path)).records()
+    assert records.ids.tolist() == ["A", "B", "A"]
+    assert records.title[:, 0].tolist() == [1, 0, 0]
+    assert records.body[:, 0].tolist() == [1, 0, 1]
+
+    latest = CountStore(str(tmp_path)).records(latest=True)
+    assert latest.ids.tolist() == ["B", "A"]
+    assert latest.body[:, 0].tolist() == [0, 1]
+    assert latest.keyword_ids(0, "Negative_News").tolist() == []
+    assert latest.keyword_ids(1, "Negative_News").tolist() == [0]
+    assert records.hit_counts.tolist() == [2, 1]
+    assert np.array_equal(latest.hit_start, [0, 0, 1])
+
+
+def test_cli(store, tmp_path):
+    labels = tmp_path / "labels.jsonl"
+    labels.write_text(
+        json.dumps({"ArticleId": articles[0]["ArticleId"], "NN": True}) + "\n",
+        encoding="utf-8",
+    )
+    output = tmp_path / "sweep.json"
+    main(
+        [
+            "sweep",
+            store.path,
+            "--thresholds",
+            "0.5",
+            "0.6",
+            "--labels",
+            str(labels),
+            "--output",
+            str(output),
+        ]
+    )
+    rows = json.loads(output.read_text(encoding="utf-8"))
+    assert [row["threshold"] for row in rows] == [0.5, 0.6, 0.5, 0.6]
+    assert "precision" in rows[0] and "precision" not in rows[2]
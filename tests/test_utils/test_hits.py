@@ -0,0 +1,201 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for sparse news x keyword count matrix
+
+import glob
+import json
+import logging
+
+import numpy as np
+import pytest
+
+from src.FusedComparator import FusedComparator
+from src.SimpleComparator import SimpleComparator
+from src.utils import hits as hi
+from src.utils.counts import CountStore
+
+logger = logging.getLogger(__name__)
+
+articles = [
+    json.load(open(fn, "r", encoding="utf-8"))
+    for fn in sorted(glob.glob("data/dowjones/*.json"))
+]
+
+
+def row(matrix: hi.HitMatrix, i: int):
+    cols = matrix.indices[matrix.indptr[i] : matrix.indptr[i + 1]]
+    data = matrix.data[matrix.indptr[i] : matrix.indptr[i + 1]]
+    return {matrix.keywords[col]: int(cnt) for col, cnt in zip(cols, data)}
+
+
+def expected_row(ret, tables):
+    expected = dict()
+    counts = ret.COUNTS
+    for cate, ids, cnts in zip(
+        counts.categories, counts.keyword_ids, counts.keyword_counts
+    ):
+        for kid, cnt in zip(ids, cnts):
+            keyword = tables[cate][kid]
+            assert expected.setdefault(keyword, cnt) == cnt
+    return expected
+
+
+def test_writer(tmp_path):
+    reader = FusedComparator(use_artifact=False, keep_counts=True)
+    _, tables = reader.keyword_tables()
+    rets = [reader.classify(a["Headline"], a["BodyHtml"]) for a in articles]
+
+    with hi.HitMatrixWriter(str(tmp_path), chunk_size=4) as writer:
+        writer.register(reader)
+        for article, ret in zip(articles, rets):
+            writer.add(article["ArticleId"], ret.COUNTS)
+
+    matrix = hi.load(str(tmp_path))
+    assert matrix.shape == (len(articles), len(reader.keywords))
+    assert matrix.articles.tolist() == [a["ArticleId"] for a in articles]
+    assert sorted(matrix.keywords) == sorted(reader.keywords)
+    for i, ret in enumerate(rets):
+        assert row(matrix, i) == expected_row(ret, tables)
+        assert set(row(matrix, i)) == set(ret.NN_KEYWORDS) | set(ret.ESG_KEYWORDS)
+        cols = matrix.indices[matrix.indptr[i] : matrix.indptr[i + 1]]
+        assert np.all(np.diff(cols) > 0)
+    for cate, keywords in tables.items():
+        assert {matrix.keywords[col] for col in matrix.categories[cate]} == set(
+            keywords
+        )
+    assert glob.glob(str(tmp_path / "hits_*.npz"))
+
+    ## After merge, matrix.npz alone is the whole matrix.
+    hi.HitMatrixWriter(str(tmp_path)).merge()
+    assert not glob.glob(str(tmp_path / "hits_*.npz"))
+    merged = hi.load(str(tmp_path))
+    assert merged.articles.tolist() == matrix.articles.tolist()
+    assert np.array_equal(merged.indptr, matrix.indptr)
+    assert np.array_equal(merged.indices, matrix.indices)
+    assert np.array_equal(merged.data, matrix.data)
+
+    sparse = pytest.importorskip("scipy.sparse")
+    loaded = sparse.load_npz(str(tmp_path / hi.MATRIX_NAME))
+    assert (loaded != matrix.to_scipy()).nnz == 0
+
+
+def test_append_and_export(tmp_path):
+    fused = FusedComparator(
+        keywords={"Negative_News": ["詐欺", "洗錢"], "ESG_News": ["詐欺", "環保"]},
+        load_default=False,
+        use_artifact=False,
+        keep_counts=True,
+    )
+    store = CountStore(str(tmp_path / "counts"))
+    store.register(fused)
+    with hi.HitMatrixWriter(str(tmp_path / "hits")) as writer:
+        writer.register(fused)
+        for id, (title, body) in enumerate(
+            [("詐欺", "涉嫌詐欺與洗錢。"), ("環保", "無關。"), ("標題", "內文。")]
+        ):
+            counts = fused.classify(title, body).COUNTS
+            writer.add(id, counts)
+            store.add(id, counts)
+    store.close()
+
+    matrix = hi.load(str(tmp_path / "hits"))
+    assert matrix.keywords == ["詐欺", "洗錢", "環保"]
+    assert [row(matrix, i) for i in range(3)] == [
+        {"詐欺": 2, "洗錢": 1},
+        {"環保": 1},
+        {},
+    ]
+
+    ## Append rows of another version. Columns of existing keywords are kept.
+    simple = SimpleComparator(
+        "Negative_News", keywords=["背信", "詐欺"], load_default=False, keep_counts=True
+    )
+    with hi.HitMatrixWriter(str(tmp_path / "hits")) as writer:
+        writer.register(simple)
+        writer.add("A", simple.classify("背信", "詐欺。").counts)
+    matrix = hi.load(str(tmp_path / "hits"))
+    assert matrix.keywords == ["詐欺", "洗錢", "環保", "背信"]
+    assert matrix.shape == (4, 4)
+    assert matrix.articles.tolist() == ["0", "1", "2", "A"]
+    assert row(matrix, 3) == {"背信": 1, "詐欺": 1}
+
+    ## A matrix exported from stored counts is the same as the one built by classify.
+    hi.main(["export", str(tmp_path / "counts"), str(tmp_path / "exported")])
+    exported = hi.load(str(tmp_path / "exported"))
+    assert exported.keywords == ["詐欺", "洗錢", "環保"]
+    assert [row(exported, i) for i in range(3)] == [row(matrix, i) for i in range(3)]
+
+
+def test_close_interrupted_after_matrix(tmp_path, monkeypatch):
+    fused = FusedComparator(
+        keywords={"Negative_News": ["詐欺", "洗錢"], "ESG_News": ["環保"]},
+        load_default=False,
+        use_artifact=False,
+        keep_counts=True,
+    )
+    texts = [("詐欺", "涉嫌詐欺與洗錢。"), ("環保", "無關。"), ("標題", "內文。")]
+    with hi.HitMatrixWriter(str(tmp_path), chunk_size=1) as writer:
+        writer.register(fused)
+        writer.add(0, fused.classify(*texts[0]).COUNTS)
+
+    ## The process dies after matrix.npz is saved, but before meta drops the chunks.
+    writer = hi.HitMatrixWriter(str(tmp_path), chunk_size=1)
+    writer.register(fused)
+    for id, (title, body) in enumerate(texts[1:], 1):
+        writer.add(id, fused.classify(title, body).COUNTS)
+
+    def killed():
+        raise OSError("killed")
+
+    with monkeypatch.context() as m:
+        m.setattr(writer, "_save_meta", killed)
+        with pytest.raises(OSError):
+            writer.merge()
+    assert len(glob.glob(str(tmp_path / "hits_*.npz"))) == 3
+    assert hi.load(str(tmp_path)).articles.tolist() == ["0", "1", "2"]
+
+    ## Chunks already merged aren't merged again, and new chunks get new names.
+    with hi.HitMatrixWriter(str(tmp_path), chunk_size=1) as writer:
+        writer.register(fused)
+        writer.add(3, fused.classify(*texts[0]).COUNTS)
+        writer.merge()
+    assert not glob.glob(str(tmp_path / "hits_*.npz"))
+    matrix = hi.load(str(tmp_path))
+    assert matrix.articles.tolist() == ["0", "1", "2", "3"]
+    assert [row(matrix, i) for i in range(4)] == [
+        {"詐欺": 2, "洗錢": 1},
+        {"環保": 1},
+        {},
+        {"詐欺": 2, "洗錢": 1},
+    ]
+
+
+def test_close_keeps_matrix(tmp_path):
+    fused = FusedComparator(
+        keywords={"Negative_News": ["詐欺", "洗錢"], "ESG_News": ["環保"]},
+        load_default=False,
+        use_artifact=False,
+        keep_counts=True,
+    )
+    texts = [("詐欺", "涉嫌詐欺與洗錢。"), ("環保", "無關。"), ("標題", "內文。")]
+    with hi.HitMatrixWriter(str(tmp_path)) as writer:
+        writer.register(fused)
+        writer.add(0, fused.classify(*texts[0]).COUNTS)
+        writer.merge()
+    saved = (tmp_path / hi.MATRIX_NAME).read_bytes()
+
+    ## A close writes only a new chunk, and rows of chunks follow rows of matrix.npz.
+    for id, (title, body) in enumerate(texts[1:], 1):
+        with hi.HitMatrixWriter(str(tmp_path)) as writer:
+            writer.register(fused)
+            writer.add(id, fused.classify(title, body).COUNTS)
+        assert (tmp_path / hi.MATRIX_NAME).read_bytes() == saved
+        assert len(glob.glob(str(tmp_path / "hits_*.npz"))) == id
+    matrix = hi.load(str(tmp_path))
+    assert matrix.shape == (3, 3)
+    assert matrix.articles.tolist() == ["0", "1", "2"]
+    assert [row(matrix, i) for i in range(3)] == [
+        {"詐欺": 2, "洗錢": 1},
+        {"環保": 1},
+        {},
+    ]
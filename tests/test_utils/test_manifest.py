@@ -0,0 +1,101 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for manifest of keyword sources
+
+import json
+import logging
+
+import pytest
+
+from src.utils.keywords import keywords as ke
+from src.utils.keywords.manifest import MANIFEST_NAME, KeywordsManifest, main
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def loader(tmp_path, monkeypatch):
+    (tmp_path / "NN_keywords.txt").write_text("詐欺\n洗錢\n", encoding="utf-8")
+    (tmp_path / "NN_keywords_20210101000000.txt").write_text(
+        "詐財\n掏空\n", encoding="utf-8"
+    )
+    ## Generated but not promoted.
+    (tmp_path / "NN_keywords_20220101000000.txt").write_text(
+        "詐財\n背信\n", encoding="utf-8"
+    )
+    KeywordsManifest(
+        str(tmp_path / MANIFEST_NAME),
+        "Negative_News",
+        sources=["NN_keywords.txt", "NN_keywords_20210101000000.txt"],
+    ).save()
+    monkeypatch.setattr(ke.NegativeNewsKeywordsLoader, "DEFAULT_DIR", str(tmp_path))
+    return ke.NegativeNewsKeywordsLoader
+
+
+def test_load_through_manifest(tmp_path, loader):
+    assert loader().keywords == ("詐欺", "洗錢", "詐財", "掏空")
+
+    manifest = loader.manifest()
+    manifest.include = ["內線交易"]
+    manifest.exclude = ["洗錢"]
+    version = loader.version()
+    manifest.save()
+    assert loader().keywords == ("詐欺", "詐財", "掏空", "內線交易")
+    assert loader.version() != version
+    assert str(tmp_path / MANIFEST_NAME) in loader.source_files()
+
+    ## Without a manifest, every .txt is loaded.
+    (tmp_path / MANIFEST_NAME).unlink()
+    assert "背信" in loader().keywords
+
+
+def test_promote_and_retire(tmp_path, loader):
+    manifest = loader.manifest()
+    before, after = manifest.promote(
+        "NN_keywords_20220101000000.txt",
+        retire=["NN_keywords_20210101000000.txt"],
+    )
+    assert (before, after) == (4, 4)
+    assert loader().keywords == ("詐欺", "洗錢", "詐財", "背信")
+
+    manifest = loader.manifest()
+    assert manifest.version == 1
+    assert manifest.history[-1]["retired"] == ["NN_keywords_20210101000000.txt"]
+
+    assert manifest.retire("NN_keywords_20220101000000.txt") == (4, 2)
+    assert loader.manifest().sources == ["NN_keywords.txt"]
+    with pytest.raises(ValueError):
+        manifest.retire("NN_keywords_20220101000000.txt")
+
+
+def test_promote_file_outside_directory(tmp_path, loader):
+    outside = tmp_path / "generated"
+    outside.mkdir()
+    (outside / "NN_keywords_20230101000000.txt").write_text(
+        "違約交割\n", encoding="utf-8"
+    )
+
+    manifest = loader.manifest()
+    manifest.max_keywords = 4
+    with pytest.raises(ValueError):
+        manifest.promote(str(outside / "NN_keywords_20230101000000.txt"))
+    assert not (tmp_path / "NN_keywords_20230101000000.txt").exists()
+
+    main(
+        [
+            "promote",
+            "Negative_News",
+            str(outside / "NN_keywords_20230101000000.txt"),
+        ]
+    )
+    assert (tmp_path / "NN_keywords_20230101000000.txt").exists()
+    assert "違約交割" in loader().keywords
+    data = json.loads((tmp_path / MANIFEST_NAME).read_text(encoding="utf-8"))
+    assert data["sources"][-1] == "NN_keywords_20230101000000.txt"
+
+
+def test_default_manifests():
+    for name, loader in ke.LOCALIZERS.items():
+        manifest = loader.manifest()
+        assert manifest.name == name
+        assert loader().keywords == tuple(manifest.keywords())
@@ -0,0 +1,53 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for AhoCorasickMatcher
+
+import logging
+
+import pytest
+
+from src.utils.matcher import AhoCorasickMatcher
+
+logger = logging.getLogger(__name__)
+
+keywords = ["詐欺", "詐欺犯", "欺犯", "哈哈", "違約", "違約", ""]
+
+test_data = [
+    ("TEST-0", "詐欺犯吳朱傳甫獲釋", {0: 1, 1: 1, 2: 1}),
+    ("TEST-1", "哈哈哈哈哈", {3: 2}),
+    ("TEST-2", "公司違約，債券違約。", {4: 2, 5: 2}),
+    ("TEST-3", "沒有關鍵字", {}),
+    ("TEST-4", "", {}),
+]
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return AhoCorasickMatcher(keywords)
+
+
+@pytest.mark.parametrize(
+    argnames=("name, text, expected_ans"),
+    argvalues=test_data,
+    ids=[f"{i[0]}" for i in test_data],
+)
+def test_count(matcher, name, text, expected_ans):
+    assert matcher.count(text) == expected_ans
+
+
+@pytest.mark.parametrize(
+    argnames=("name, text, expected_ans"),
+    argvalues=test_data,
+    ids=[f"{i[0]}" for i in test_data],
+)
+def test_count_same_as_str_count(matcher, name, text, expected_ans):
+    counts = matcher.count(text)
+    for kid, keyword in enumerate(keywords):
+        if keyword:
+            assert counts.get(kid, 0) == text.count(keyword)
+
+
+def test_finditer_offsets(matcher):
+    text = "詐欺犯吳朱傳甫獲釋"
+    for start, kid in matcher.finditer(text):
+        assert text[start : start + len(keywords[kid])] == keywords[kid]
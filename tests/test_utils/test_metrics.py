@@ -0,0 +1,88 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for histograms and metrics registry
+
+import json
+import logging
+
+import pytest
+
+from src.FusedComparator import FusedComparator
+from src.SimpleComparator import SimpleComparator
+from src.utils.metrics import ComparatorMetrics, Histogram, MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+
+def test_histogram():
+    h = Histogram("h", "help", buckets=(1, 10, 100))
+    for value in (0.5, 1, 5, 50, 500):
+        h.observe(value)
+    assert h.count == 5
+    assert h.sum == 556.5
+    assert h.max == 500
+    assert h.cumulative() == [(1, 2), (10, 3), (100, 4), (float("inf"), 5)]
+    assert h.quantile(0.5) == pytest.approx(1 + 9 * 0.5)
+    assert h.quantile(1.0) == 500
+
+    h.reset()
+    assert h.count == 0 and h.quantile(0.5) == 0.0
+
+
+def test_registry():
+    registry = MetricsRegistry(namespace="test")
+    a = registry.histogram("latency", "help of latency", (0.1, 1.0), stage="a")
+    b = registry.histogram("latency", "help of latency", (0.1, 1.0), stage="b")
+    assert registry.histogram("latency", "help of latency", stage="a") is a
+    a.observe(0.05)
+    b.observe(2.0)
+
+    text = registry.to_prometheus()
+    assert text.count("# TYPE test_latency histogram") == 1
+    assert 'test_latency_bucket{stage="a",le="0.1"} 1' in text
+    assert 'test_latency_bucket{stage="b",le="+Inf"} 1' in text
+    assert 'test_latency_count{stage="b"} 1' in text
+
+    ret = json.loads(registry.to_json())
+    assert [d["labels"] for d in ret["test_latency"]] == [
+        {"stage": "a"},
+        {"stage": "b"},
+    ]
+
+
+test_data = [
+    ("TEST-0", "詐欺犯獲釋", "詐欺犯獲釋。又詐財一百八十萬元！" * 3),
+    ("TEST-1", "", ""),
+]
+
+
+@pytest.mark.parametrize(
+    argnames=("name, title, body"),
+    argvalues=test_data,
+    ids=[f"{i[0]}" for i in test_data],
+)
+@pytest.mark.parametrize("debug", [False, True])
+def test_comparator_metrics(name, title, body, debug):
+    registry = MetricsRegistry()
+    readers = [
+        SimpleComparator("Negative_News", debug=debug, metrics=registry),
+        FusedComparator(debug=debug, metrics=registry),
+    ]
+    for reader in readers:
+        ## Results are the same with metrics
+        expected = type(reader)(
+            *(["Negative_News"] if isinstance(reader, SimpleComparator) else []),
+            debug=debug,
+        ).classify(title, body)
+        assert reader.classify(title, body) == expected
+
+        metrics = reader.metrics
+        assert isinstance(metrics, ComparatorMetrics)
+        assert [h.count for h in metrics.stages] == [1] * len(metrics.STAGES)
+        assert metrics.total.sum == pytest.approx(sum(h.sum for h in metrics.stages))
+        assert metrics.chars.sum == len(title) + len(body)
+
+    ## FusedComparator also counts hits of ESG keywords.
+    nn_hits, fused_hits = [reader.metrics.hits.sum for reader in readers]
+    assert nn_hits <= fused_hits
+    assert "news_classifier_classify_stage_seconds_bucket" in registry.to_prometheus()
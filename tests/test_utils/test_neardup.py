@@ -0,0 +1,108 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for near-duplicate detection by MinHash
+
+import glob
+import json
+import logging
+import os
+
+import pytest
+
+from src.FusedComparator import FusedComparator
+from src.SimpleComparator import SimpleComparator
+from src.utils.neardup import NearDuplicateIndex
+
+logger = logging.getLogger(__name__)
+
+test_data = [
+    (f"TEST-{i}", json.load(open(fn, "r", encoding="utf-8")))
+    for i, fn in enumerate(sorted(glob.glob("data/dowjones/*.json")))
+]
+
+
+def edit(body: str) -> str:
+    ## A lightly edited copy by another outlet: another byline and an added paragraph.
+    return "（中央社記者王小明台北電）" + body + "<p>（編輯：李大華）</p>"
+
+
+@pytest.mark.parametrize(
+    argnames=("name, data"),
+    argvalues=test_data,
+    ids=[f"{i[0]}" for i in test_data],
+)
+def test_signature(name, data):
+    index = NearDuplicateIndex(threshold=0.8)
+    body = data["BodyHtml"]
+    signature = index.signature(body)
+    if signature is None:
+        pytest.skip("Body is too short.")
+
+    index.add(signature, name, namespace="ns")
+    assert index.query(index.signature(body), namespace="ns") == (1.0, name)
+    assert index.query(index.signature(body), namespace="other") is None
+
+    if len(body) > 1000:
+        sim, value = index.query(index.signature(edit(body)), namespace="ns")
+        assert value == name and sim >= 0.8
+
+
+def test_index():
+    bodies = [data["BodyHtml"] for _, data in test_data if len(data["BodyHtml"]) > 500]
+    index = NearDuplicateIndex(max_entries=2)
+    signatures = [index.signature(body) for body in bodies]
+
+    ## Unrelated news are not near-duplicates.
+    for i, signature in enumerate(signatures):
+        assert index.query(signature) is None
+        index.add(signature, i)
+    assert len(index) == 2
+    assert index.query(signatures[0]) is None
+    assert index.query(signatures[-1]) == (1.0, len(signatures) - 1)
+    assert index.signature("太短") is None
+
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(num_perm=128, bands=30)
+
+
+def test_save_and_load(tmp_path):
+    path = os.path.join(tmp_path, "neardup.pkl")
+    body = test_data[0][1]["BodyHtml"] * 2
+    index = NearDuplicateIndex()
+    index.add(index.signature(body), "value")
+    index.save(path)
+
+    index = NearDuplicateIndex.load(path)
+    assert len(index) == 1
+    assert index.query(index.signature(body)) == (1.0, "value")
+
+
+@pytest.mark.parametrize(
+    argnames=("name, data"),
+    argvalues=test_data,
+    ids=[f"{i[0]}" for i in test_data],
+)
+def test_comparator_neardup(name, data):
+    title, body = data["Headline"], data["BodyHtml"]
+    index = NearDuplicateIndex(threshold=0.8)
+    readers = [
+        SimpleComparator("Negative_News", neardup=index),
+        SimpleComparator("ESG_News", neardup=index),
+        FusedComparator(neardup=index),
+    ]
+    expected_readers = [
+        SimpleComparator("Negative_News"),
+        SimpleComparator("ESG_News"),
+        FusedComparator(),
+    ]
+    for reader, expected_reader in zip(readers, expected_readers):
+        assert reader.classify(title, body) == expected_reader.classify(title, body)
+
+        ## Counts of sentences are reused by the near-duplicate, and its title and
+        ## sentences that aren't in the indexed body are scanned.
+        hits = index.hits
+        for edited in (edit(body), body + "<p>另涉嫌詐欺及洗錢，重視環保。</p>"):
+            ret = reader.classify("又詐欺了", edited)
+            assert ret == expected_reader.classify("又詐欺了", edited)
+        if len(body) > 1000:
+            assert index.hits == hits + 2
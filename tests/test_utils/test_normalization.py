@@ -0,0 +1,87 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for text normalization
+
+import logging
+
+import pytest
+
+from src.FusedComparator import FusedComparator
+from src.SimpleComparator import SimpleComparator
+from src.utils.normalization import TextNormalizer
+
+logger = logging.getLogger(__name__)
+
+test_data = [
+    (
+        "TEST-1",
+        "<p>　詐欺犯假冒檢警</p><p>詐財一百萬元</p>",
+        "詐欺犯假冒檢警\n\n詐財一百萬元",
+    ),
+    ("TEST-2", "向新營市黃姓\n婦人詐財", "向新營市黃姓婦人詐財"),
+    ("TEST-3", "ＡＢＣ１２３，Ｈｅｌｌｏ！＆", "ABC123，Hello！&"),
+    ("TEST-4", "A &amp; B &lt;b&gt; &#35408;&#x6B3A;&nbsp;x", "A & B <b> 詐欺 x"),
+    ("TEST-5", "a < b and c>d", "a < b and c>d"),
+    ("TEST-6", "x<script>var a = '<p>';</script>y<br/>z", "xy\nz"),
+    ("TEST-7", "first  line\n\n\nsecond\tline", "first line\nsecond line"),
+    ("TEST-8", "詐​欺 洗錢", "詐欺洗錢"),
+]
+
+
+@pytest.mark.parametrize(
+    argnames=("name, text, expected"),
+    argvalues=test_data,
+    ids=[f"{i[0]}" for i in test_data],
+)
+def test_normalize(name, text, expected):
+    assert TextNormalizer()(text) == expected
+
+
+def test_options():
+    text = "<p>ＡＢＣ &amp;</p>"
+    assert TextNormalizer(strip_html=False)(text) == "<p>ABC &</p>"
+    assert TextNormalizer(decode_entities=False)(text) == "ABC &amp;"
+    assert TextNormalizer(fold_width=False)(text) == "ＡＢＣ &"
+    assert TextNormalizer().signature != TextNormalizer(fold_width=False).signature
+
+
+def test_to_traditional(tmp_path):
+    table = tmp_path / "s2t.txt"
+    table.write_text("诈\t詐\n钱\t錢\n洗钱\t洗錢\n", encoding="utf-8")
+    normalizer = TextNormalizer(to_traditional=True, s2t_table=str(table))
+    assert normalizer("涉嫌诈欺与洗钱") == "涉嫌詐欺与洗錢"
+    assert normalizer.normalize_keywords(["诈欺", "詐欺", "ＡＢ"]) == ["詐欺", "AB"]
+
+
+def test_comparator_with_normalizer(tmp_path):
+    table = tmp_path / "s2t.txt"
+    table.write_text("诈\t詐\n", encoding="utf-8")
+    normalizer = TextNormalizer(to_traditional=True, s2t_table=str(table))
+    title = "<b>公司涉嫌</b>诈欺"
+    body = "<p>董事長涉嫌掏\n空公司資產，遭依詐&#27450;罪起訴。</p>"
+
+    plain = FusedComparator(
+        keywords={"Negative_News": ["詐欺", "掏空"]},
+        load_default=False,
+        use_artifact=False,
+    )
+    assert plain.classify(title, body).NN_KEYWORDS == []
+
+    reader = FusedComparator(
+        keywords={"Negative_News": ["詐欺", "掏空"]},
+        load_default=False,
+        use_artifact=False,
+        normalizer=normalizer,
+    )
+    ret = reader.classify(title, body)
+    assert sorted(ret.NN_KEYWORDS) == ["掏空", "詐欺"]
+    assert ret.KEYWORDS_VERSION != plain.keywords_version
+
+    simple = SimpleComparator(
+        "Negative_News",
+        keywords=["诈欺", "掏空"],
+        load_default=False,
+        normalizer=normalizer,
+    )
+    assert simple.keywords == ("詐欺", "掏空")
+    assert sorted(simple.classify(title, body).keywords) == ["掏空", "詐欺"]
@@ -0,0 +1,64 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for offset-based sentence segmentation
+
+import logging
+import re
+
+import pytest
+
+from src.utils import segmentation as sg
+from src.utils.matcher import AhoCorasickMatcher
+
+logger = logging.getLogger(__name__)
+
+keywords = ["詐欺", "詐財", "哈哈", "a.a", "。詐", "a!!"]
+
+test_data = [
+    ("TEST-0", "詐欺犯獲釋。又詐財一百八十萬元！詐欺"),
+    ("TEST-1", "哈哈哈。詐欺a.a.a!!a!!。。詐財"),
+    ("TEST-2", "。。。"),
+    ("TEST-3", ""),
+]
+
+
+@pytest.mark.parametrize(
+    argnames=("name, text"),
+    argvalues=test_data,
+    ids=[f"{i[0]}" for i in test_data],
+)
+def test_sentence_spans(name, text):
+    starts, ends = sg.sentence_spans(text)
+    assert [text[s:e] for s, e in zip(starts, ends)] == re.findall(
+        sg.SENTENCE_PATTERN, text
+    )
+
+
+@pytest.mark.parametrize(
+    argnames=("name, text"),
+    argvalues=test_data,
+    ids=[f"{i[0]}" for i in test_data],
+)
+def test_count_by_sentence(name, text):
+    matcher = AhoCorasickMatcher(keywords)
+    starts, ends = sg.sentence_spans(text)
+
+    expected = dict()
+    for i, (s, e) in enumerate(zip(starts, ends)):
+        counts = {
+            kid: text[s:e].count(keyword)
+            for kid, keyword in enumerate(keywords)
+            if text[s:e].count(keyword) > 0
+        }
+        if counts:
+            expected[i] = counts
+
+    assert sg.count_by_sentence(matcher, text, (starts, ends)) == expected
+
+    ## Sentences of a near-duplicate reuse known counts, and added sentences are scanned.
+    known = sg.sentence_table(text, (starts, ends), expected)
+    edited = "詐財又詐欺。" + text
+    spans = sg.sentence_spans(edited)
+    assert sg.count_by_sentence(
+        matcher, edited, spans, known=known
+    ) == sg.count_by_sentence(matcher, edited, spans)
@@ -0,0 +1,127 @@
+# encoding=utf-8
+# Author: Yu-Lun Chiang
+# Description: Test for data structure
+
+import logging
+import pickle
+
+from src.utils import struct as st
+
+logger = logging.getLogger(__name__)
+
+title = "假釋又使壞 詐財被活逮"
+body = "詐欺犯吳朱傳甫獲釋。又假冒檢警人員詐財。"
+keywords = ("無關", "詐欺", "獲釋", "假冒", "詐財")
+
+
+def debug_spans():
+    return st.DebugSpans(
+        title=title,
+        body=body,
+        keywords=keywords,
+        title_keyword_ids=(4,),
+        spans=[(0, 10, (1, 2)), (10, 20, (3, 4))],
+    )
+
+
+def test_debug_spans():
+    debug = debug_spans()
+    expected = [
+        {"keywords": ["詐財"], "text": title},
+        {"keywords": ["詐欺", "獲釋"], "text": "詐欺犯吳朱傳甫獲釋。"},
+        {"keywords": ["假冒", "詐財"], "text": "又假冒檢警人員詐財。"},
+    ]
+    assert len(debug) == 3
+    assert debug[0] == expected[0] and debug[-1] == expected[-1]
+    assert debug == expected and expected == debug
+    assert list(debug) == expected
+    assert repr(debug) == repr(expected)
+
+
+def test_debug_spans_without_title():
+    debug = st.DebugSpans(title, body, keywords, None, [(10, 20, (3,))])
+    assert list(debug) == [{"keywords": ["假冒"], "text": "又假冒檢警人員詐財。"}]
+    assert not st.DebugSpans(title, body, keywords)
+
+
+def test_debug_spans_pickle():
+    debug = debug_spans()
+    restored = pickle.loads(pickle.dumps(debug))
+    assert restored == debug
+    assert restored.keywords == ("詐欺", "獲釋", "假冒", "詐財")
+
+    ## Only sentences that contain keywords are pickled.
+    debug = st.DebugSpans(title, body, keywords, None, [(10, 20, (3,))])
+    restored = pickle.loads(pickle.dumps(debug))
+    assert restored == debug
+    assert restored.title == ""
+    assert restored.body == "又假冒檢警人員詐財。"
+    assert restored.spans == [(0, 10, (0,))]
+
+
+def test_compact_comparator_struct():
+    ret = st.CompactComparatorStruct(
+        id=0,
+        news_category=st.NewsCategory.NN,
+        score=0.82,
+        keyword_ids=[4, 1],
+        keyword_table=keywords,
+        debug=debug_spans(),
+        keywords_version="v1",
+    )
+    expected = st.SimpleComparatorStruct(
+        id=0,
+        news_category=st.NewsCategory.NN,
+        score=0.82,
+        keywords=["詐財", "詐欺"],
+        debug=debug_spans(),
+        keywords_version="v1",
+    )
+    assert not hasattr(ret, "__dict__")
+    ## Ids keep the order of keywords.
+    assert ret.keyword_ids.tolist() == [4, 1]
+    assert ret.keyword_table is keywords
+    assert ret.keywords == expected.keywords
+    assert repr(ret) == repr(expected)
+    assert ret.__2dict__() == expected.__2dict__()
+
+    ## Only matched keywords are pickled.
+    restored = pickle.loads(pickle.dumps(ret))
+    assert restored == ret
+    assert restored.keyword_table == ("詐財", "詐欺")
+
+
+def test_compact_spec_struct():
+    tables = (keywords, ("環保", "詐財"))
+    ret = st.CompactSpecStruct(
+        NN=True,
+        NN_SCORE=0.82,
+        ESG=False,
+        ESG_SCORE=0.24,
+        NN_KEYWORD_IDS=[3, 1],
+        ESG_KEYWORD_IDS=[1],
+        keyword_tables=tables,
+        DEBUG={"NN": debug_spans(), "ESG": list()},
+        KEYWORDS_VERSION="v1",
+    )
+    expected = st.SpecStruct(
+        NN=True,
+        NN_SCORE=0.82,
+        NN_KEYWORDS=["假冒", "詐欺"],
+        ESG=False,
+        ESG_SCORE=0.24,
+        ESG_KEYWORDS=["詐財"],
+        DEBUG={"NN": debug_spans(), "ESG": list()},
+        KEYWORDS_VERSION="v1",
+    )
+    assert not hasattr(ret, "__dict__")
+    assert ret.NN_KEYWORD_IDS.tolist() == [3, 1]
+    assert ret.ESG_KEYWORD_IDS.tolist() == [1]
+    assert ret.NN_KEYWORDS == expected.NN_KEYWORDS
+    assert ret.ESG_KEYWORDS == expected.ESG_KEYWORDS
+    assert repr(ret) == repr(expected)
+    assert ret.__2dict__() == expected.__2dict__()
+
+    restored = pickle.loads(pickle.dumps(ret))
+    assert restored == ret
+    assert restored.keyword_tables == (("假冒", "詐欺"), ("詐財",))